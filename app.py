@@ -1,82 +1,64 @@
 import os
-import re
+import html
 import json
-import requests
-from dotenv import load_dotenv
+import time
+import uuid
+import secrets
+import asyncio
+import logging
+import collections
 import gradio as gr
-import modelscope_studio.components.antd as antd
-import modelscope_studio.components.base as ms
-import modelscope_studio.components.pro as pro
-
-
-load_dotenv()
+from response_cache import ResponseCache, cache_key
+from history import HistoryManager, estimate_tokens, has_code_block
+from artifact_store import ArtifactStore
+from semantic_cache import SemanticCache
+from prewarm import Prewarmer, PromptLog
+from assets import ESMCache
+from downloads import code_files, download_route
+from ui_updates import SIZE_BUCKETS, UpdateFilter
+from import_map import prune_import_map
+from session_store import open_session_store
+from metrics import REGISTRY, Timer
+from scheduler import AdmissionError, FairScheduler
+from core import EDIT_PROMPT, FANOUT_MODELS, MODEL, REPAIR_PROMPT, STREAM, SYSTEM_PROMPTS, TEMPERATURE, \
+    FenceTokenizer, apply_edit_response, async_call_openrouter_chat, async_stream_openrouter_chat, edits_total, \
+    extract_assistant_content, fanout_openrouter_chat, generation_stage_seconds, generations_active, \
+    generations_total, get_generated_files, prompt_variant, react_imports, tokens_total, validate_artifact, \
+    validations_total
+
+
+logger = logging.getLogger(__name__)
+metrics_logger = logging.getLogger("metrics")
 
 # ---------- CONFIG ----------
-API_KEY=os.getenv("KEY") # <-- set this env var
-MODEL="z-ai/glm-4.5-air:free" # change if you have a specific model on OpenRouter
-ENDPOINT ="https://openrouter.ai/api/v1/chat/completions"
-
-
-SYSTEM_PROMPT = """You are an expert on frontend design, you will always respond to web design tasks.
-Your task is to create a website according to the user's request using either native HTML or React framework.
-When choosing implementation framework, you should follow these rules:
-[Implementation Rules]
-1. You should use HTML by default.
-2. When the user requires HTML, choose HTML to implement the request.
-3. If the user requires a library that is not installed in current react environment, please use HTML and tell the user the reason.
-4. After choosing the implementation framework, please follow the corresponding instruction.
-
-
-[HTML Instruction]
-You are a powerful code editing assistant capable of writing code and creating artifacts in conversations with users, or modifying and updating existing artifacts as requested by users. 
-All code is written in a single code block to form a complete code file for display, without separating HTML and JavaScript code. An artifact refers to a runnable complete code snippet, you prefer to integrate and output such complete runnable code rather than breaking it down into several code blocks. For certain types of code, they can render graphical interfaces in a UI window. After generation, please check the code execution again to ensure there are no errors in the output.
-Do not use localStorage as it is not supported by current environment.
-Output only the HTML, without any additional descriptive text.
-use cdn links for external libraries.
-
-
-[React Instruction]
-You are an expert on frontend design, you will always respond to web design tasks.
-Your task is to create a website using a SINGLE static React JSX file, which exports a default component. This code will go directly into the App.jsx file and will be used to render the website.
-
-## Common Design Principles
-
-Regardless of the technology used, follow these principles for all designs:
-
-### General Design Guidelines:
-- Create a stunning, contemporary, and highly functional website based on the user's request
-- Implement a cohesive design language throughout the entire website/application
-- Choose a carefully selected, harmonious color palette that enhances the overall aesthetic
-- Create a clear visual hierarchy with proper typography to improve readability
-- Incorporate subtle animations and transitions to add polish and improve user experience
-- Ensure proper spacing and alignment using appropriate layout techniques
-- Implement responsive design principles to ensure the website looks great on all device sizes
-- Use modern UI patterns like cards, gradients, and subtle shadows to add depth and visual interest
-- Incorporate whitespace effectively to create a clean, uncluttered design
-- For images, use placeholder images from services like https://placehold.co/     
-    
-## React Design Guidelines
-
-### Implementation Requirements:
-- Ensure the React app is a single page application
-- DO NOT include any external libraries, frameworks, or dependencies outside of what is already installed
-- Utilize TailwindCSS for styling, focusing on creating a visually appealing and responsive layout
-- Avoid using arbitrary values (e.g., `h-[600px]`). Stick to Tailwind's predefined classes for consistency
-- Use mock data instead of making HTTP requests or API calls to external services
-- Utilize Tailwind's typography classes to create a clear visual hierarchy and improve readability
-- Ensure proper spacing and alignment using Tailwind's margin, padding, and flexbox/grid classes
-- Do not use localStorage as it is not supported by current environment.
-
-### Installed Libraries:
-You can use these installed libraries if required.
-- **lucide-react**: Lightweight SVG icon library with 1000+ icons. Import as `import { IconName } from "lucide-react"`. Perfect for buttons, navigation, status indicators, and decorative elements.
-- **recharts**: Declarative charting library built on D3. Import components like `import { LineChart, BarChart } from "recharts"`. Use for data visualization, analytics dashboards, and statistical displays.
-- **framer-motion**: Production-ready motion library for React. Import as `import { motion } from "framer-motion"`. Use for animations, page transitions, hover effects, and interactive micro-interactions.
-- **p5.js** : JavaScript library for creative coding and generative art. Usage: import p5 from "p5". Create interactive visuals, animations, sound-driven experiences, and artistic simulations.
-- **three, @react-three/fiber, @react-three/drei**: 3D graphics library with React renderer and helpers. Import as `import { Canvas } from "@react-three/fiber"` and `import { OrbitControls } from "@react-three/drei"`. Use for 3D scenes, visualizations, and immersive experiences.
-
-Remember to only return code for the App.jsx file and nothing else. The resulting application should be visually impressive, highly functional, and something users would be proud to showcase.
-"""
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256")) # responses kept in memory
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400")) # seconds
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH") # optional SQLite file, e.g. response_cache.sqlite3
+ARTIFACT_STORE_MB = int(os.getenv("ARTIFACT_STORE_MB", "256")) # compressed artifacts kept in memory for all sessions
+ARTIFACT_STORE_PATH = os.getenv("ARTIFACT_STORE_PATH") # optional SQLite file, e.g. artifacts.sqlite3
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "10000")) # first-turn prompts indexed for near-duplicate reuse, 0 = off
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8")) # cosine similarity to offer a cached design
+PREWARM_EXAMPLES = os.getenv("PREWARM_EXAMPLES", "1") != "0" # generate the example cards in the background at startup
+PREWARM_TOP_PROMPTS = int(os.getenv("PREWARM_TOP_PROMPTS", "0")) # also prewarm the most frequent recent first prompts
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2")) # prewarm generations running at once
+PREWARM_INTERVAL = float(os.getenv("PREWARM_INTERVAL", "21600")) # seconds between prewarm runs, 0 = only at startup
+PREWARM_WEIGHT = 0.25 # scheduler weight of prewarm requests, so live sessions go first
+ESM_SELF_HOST = os.getenv("ESM_SELF_HOST", "1") != "0" # serve sandbox modules from this app instead of esm.sh
+ESM_CACHE_DIR = os.getenv("ESM_CACHE_DIR", "esm_cache") # where downloaded modules are pinned
+ESM_PUBLIC_URL = os.getenv("ESM_PUBLIC_URL") # public base URL of this app, derived from the request if unset
+EDIT_MODE = os.getenv("EDIT_MODE", "1") != "0" # ask for SEARCH/REPLACE edits to the latest artifact on follow-ups
+VALIDATE_ARTIFACTS = os.getenv("VALIDATE_ARTIFACTS", "1") != "0" # check artifacts and ask once for a repair if broken
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "16000")) # history tokens sent upstream per request
+GENERATION_CONCURRENCY = int(os.getenv("GENERATION_CONCURRENCY", "100")) # generations calling the upstream at once
+SESSION_MAX_INFLIGHT = int(os.getenv("SESSION_MAX_INFLIGHT", "1")) # concurrent generations per session
+SESSION_MAX_QUEUED = int(os.getenv("SESSION_MAX_QUEUED", "2")) # waiting generations per session before rejecting
+QUEUE_UPDATE_INTERVAL = 1.0 # seconds between queue position updates
+UI_UPDATE_FPS = float(os.getenv("UI_UPDATE_FPS", "10")) # streamed code view refreshes per second, 0 = every chunk
+METRICS_JSON_LOG = os.getenv("METRICS_JSON_LOG", "0") != "0" # log one JSON line per generation
+SESSION_STORE = os.getenv("SESSION_STORE", "sqlite:///sessions.sqlite3") # or "memory://"
+SESSION_SECRET_FILE = os.getenv("SESSION_SECRET_FILE", ".session_secret") # used when SESSION_SECRET is unset
+SESSION_RESTORE_MESSAGES = 40 # messages replayed into a reloaded tab
+HISTORY_DRAWER_MESSAGES = 200 # messages shown in the history drawer
 
 EXAMPLES = [
     {
@@ -112,178 +94,645 @@ DEFAULT_THEME = {
     }
 }
 
-react_imports = {
-    "react": "https://esm.sh/react@18.2.0",
-    "react/": "https://esm.sh/react@18.2.0/",
-    "react-dom": "https://esm.sh/react-dom@18.2.0",
-    "react-dom/": "https://esm.sh/react-dom@18.2.0/",
-    
-    # UI and Animation Libraries
-    "lucide-react": "https://esm.sh/lucide-react@0.294.0",
-    "framer-motion": "https://esm.sh/framer-motion@10.16.4",
-    "@heroicons/react": "https://esm.sh/@heroicons/react@2.0.18",
-    "tailwind-merge": "https://esm.sh/tailwind-merge@1.14.0",
-    "class-variance-authority": "https://esm.sh/class-variance-authority@0.7.0",
-    "clsx": "https://esm.sh/clsx@2.0.0",
-    
-    # Data Visualization
-    "recharts": "https://esm.sh/recharts@2.9.0",
-    "d3": "https://esm.sh/d3@7.8.5",
-    
-    # Creative and 3D Libraries
-    "p5": "https://esm.sh/p5@1.7.0",
-    "three": "https://esm.sh/three@0.158.0",
-    "@react-three/fiber": "https://esm.sh/@react-three/fiber@8.15.11",
-    "@react-three/drei": "https://esm.sh/@react-three/drei@9.88.7",
-    
-    # Canvas and Graphics
-    "konva": "https://esm.sh/konva@9.2.3",
-    "react-konva": "https://esm.sh/react-konva@18.2.10",
-    
-    # Physics and Simulation
-    "matter-js": "https://esm.sh/matter-js@0.19.0",
-    
-    # Styling and UI Utils
-    "@tailwindcss/browser": "https://esm.sh/@tailwindcss/browser@0.4.0",
-    "tailwindcss": "https://esm.sh/tailwindcss@3.3.5",
-    "@tailwindcss/typography": "https://esm.sh/@tailwindcss/typography@0.5.10",
-    
-    # State Management
-    "zustand": "https://esm.sh/zustand@4.4.6",
-    "jotai": "https://esm.sh/jotai@2.5.1",
-    
-    # Utils and Helpers
-    "date-fns": "https://esm.sh/date-fns@2.30.0",
-    "lodash": "https://esm.sh/lodash@4.17.21",
-    "uuid": "https://esm.sh/uuid@9.0.1",
-    
-    # Form Handling
-    "react-hook-form": "https://esm.sh/react-hook-form@7.48.2",
-    "zod": "https://esm.sh/zod@3.22.4"
-}
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE,
+                               ttl=RESPONSE_CACHE_TTL,
+                               path=RESPONSE_CACHE_PATH)
+artifact_store = ArtifactStore(max_bytes=ARTIFACT_STORE_MB * 1024 * 1024, path=ARTIFACT_STORE_PATH)
+history_manager = HistoryManager(token_budget=HISTORY_TOKEN_BUDGET, store=artifact_store)
+semantic_cache = SemanticCache(max_entries=SEMANTIC_CACHE_SIZE,
+                               threshold=SEMANTIC_CACHE_THRESHOLD) if SEMANTIC_CACHE_SIZE > 0 else None
+session_store = open_session_store(SESSION_STORE)
+scheduler = FairScheduler(concurrency=GENERATION_CONCURRENCY,
+                          per_session=SESSION_MAX_INFLIGHT,
+                          max_queued_per_session=SESSION_MAX_QUEUED)
+
+
+def session_secret():
+    # the browser keeps the session ID encrypted with this key; it has to
+    # be stable across restarts and identical on every app process
+    secret = os.getenv("SESSION_SECRET")
+    if secret:
+        return secret
+    # created when the UI is built, not when the module is imported
+    if not os.path.exists(SESSION_SECRET_FILE):
+        with open(os.open(SESSION_SECRET_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+            f.write(secrets.token_hex(32))
+    with open(SESSION_SECRET_FILE) as f:
+        return f.read().strip()
+
+
+# ---------- METRICS ----------
+REGISTRY.gauge("response_cache_events", "Response cache lookups and writes",
+               callback=lambda: {(("event", event), ): count for event, count in response_cache.stats.items()})
+REGISTRY.gauge("artifact_store_bytes", "Artifact store size in memory, compressed and uncompressed",
+               callback=lambda: {(("kind", "compressed"), ): artifact_store.size,
+                                 (("kind", "raw"), ): artifact_store.raw_size})
+semantic_cache_total = REGISTRY.counter("semantic_cache_total", "Near-duplicate prompt lookups by result")
+REGISTRY.gauge("semantic_cache_entries", "First-turn prompts in the near-duplicate index",
+               callback=lambda: {(): semantic_cache.size if semantic_cache else 0})
+ui_update_bytes = REGISTRY.histogram("ui_update_bytes", "Estimated bytes sent to the browser per UI update",
+                                     buckets=SIZE_BUCKETS)
+REGISTRY.gauge("prewarm_prompts", "Prompts handled by the prewarmer since startup, by result",
+               callback=lambda: {(("result", result), ): count for result, count in dict(prewarmer.stats).items()})
+REGISTRY.gauge("prewarm_last_run_timestamp_seconds", "Unix time the last prewarm run finished, 0 before the first",
+               callback=lambda: {(): prewarmer.last_run or 0})
+
+# submit clicks that have not reached generate_code yet, by session
+_submitted_at = collections.OrderedDict()
+REGISTRY.gauge("generations_queued", "Submitted generations waiting in the queue",
+               callback=lambda: {(): len(_submitted_at)})
+REGISTRY.gauge("scheduler_requests", "Generations held by the fair scheduler",
+               callback=lambda: {(("state", state), ): count for state, count in scheduler.stats().items()})
+
+
+# ---------- ASSETS ----------
+esm_cache = ESMCache(ESM_CACHE_DIR, react_imports) if ESM_SELF_HOST else None
+
+# extra HTTP routes served next to the Gradio app
+extra_routes = ([esm_cache.route()] if esm_cache else []) + [REGISTRY.route(), download_route(artifact_store)]
+
+
+def sandbox_imports(request=None):
+    if esm_cache is None:
+        return react_imports
+    base_url = ESM_PUBLIC_URL
+    if not base_url and request is not None:
+        base_url = str(request.base_url)
+        proto = request.headers.get("x-forwarded-proto")
+        if proto:
+            base_url = proto + base_url[base_url.index(":"):]
+    return esm_cache.import_map(react_imports, base_url or "")
+
+
+
+def sandbox_entry(imports):
+    # entry module of the React sandbox; with self-hosted modules the
+    # transitive dependencies are imported up front as preload hints
+    preloads = esm_cache.preload_urls(imports.values()) if esm_cache else []
+    return "".join(f'import "{url}"\n' for url in preloads) + """import Demo from './demo.tsx'
+import "@tailwindcss/browser"
 
-# ---------- UTIL ----------
-def get_generated_files(text):
-    patterns = {
-        'html': r'```html\n(.+?)\n```',
-        'jsx': r'```jsx\n(.+?)\n```',
-        'tsx': r'```tsx\n(.+?)\n```',
-        'ts': r'```ts\n(.+?)\n```',
-        'js': r'```js\n(.+?)\n```',
-    }
-    result = {}
-    for ext, pattern in patterns.items():
-        matches = re.findall(pattern, text, re.DOTALL)
-        if matches:
-            content = '\n'.join(matches).strip()
-            # pick canonical filename
-            filename = "index." + ("tsx" if ext in ["tsx", "jsx"] else ext)
-            result[filename] = content
-    if len(result) == 0:
-        result["index.html"] = text.strip()
-    return result
-
-
-def call_openrouter_chat(messages, model=MODEL, endpoint=ENDPOINT, api_key=API_KEY):
-    if not api_key:
-        raise RuntimeError("OPENROUTER_API_KEY environment variable is not set.")
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "model": model,
-        "messages": messages,
-        # you can tune max_tokens, temperature, etc. if needed
-        # "max_tokens": 1600,
-        "temperature": 0.9,
-    }
-    resp = requests.post(endpoint, headers=headers, json=payload, timeout=60)
-    resp.raise_for_status()
-    return resp.json()
+export default Demo
+"""
+
+
+def missing_imports_page(missing):
+    available = ", ".join(key for key in react_imports if not key.endswith("/"))
+    items = "".join(f"<li><code>{html.escape(name)}</code></li>" for name in missing)
+    return f"""<!DOCTYPE html>
+<html>
+<body style="font-family: sans-serif; padding: 24px; color: #444">
+  <h3>This code imports modules that are not available in the sandbox</h3>
+  <ul>{items}</ul>
+  <p>Available modules: {html.escape(available)}</p>
+</body>
+</html>"""
+
+
+# ---------- CANCELLATION ----------
+class GenerationCancelled(Exception):
+    pass
+
+
+class Cancellation:
+    # Handle for one running generation. Its upstream work runs in tasks
+    # owned by this handle, so Stop or a closed tab can abort it even while
+    # Gradio is not iterating the event handler: after a disconnect Gradio
+    # stops pulling from the generator but never closes it.
+
+    def __init__(self):
+        self.cancelled = False
+        self.tasks = set()
+        self.callbacks = []
+
+    def cancel(self):
+        # The callbacks (releasing the scheduler slot) run once every task
+        # has been torn down, so a slot is never handed to the next request
+        # while this one still holds its upstream connection.
+        self.cancelled = True
+        tasks = set(self.tasks)
+        if not tasks:
+            self._finish()
+            return
+
+        def done(task):
+            tasks.discard(task)
+            if not tasks:
+                self._finish()
+
+        for task in list(tasks):
+            task.get_loop().call_soon_threadsafe(task.add_done_callback, done)
+            task.get_loop().call_soon_threadsafe(task.cancel)
+
+    def _finish(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def _raise_if_cancelled(self, task):
+        if task.cancelled() and self.cancelled:
+            raise GenerationCancelled()
+
+    async def run(self, awaitable):
+        if self.cancelled:
+            raise GenerationCancelled()
+        task = asyncio.ensure_future(awaitable)
+        self.tasks.add(task)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            self._raise_if_cancelled(task)
+            raise
+        finally:
+            self.tasks.discard(task)
+
+    async def stream(self, source):
+        # Consumes an async iterator in a separate task, so cancelling the
+        # task closes the upstream response, and yields lists of the items
+        # that arrived since the previous step; a consumer that falls
+        # behind gets fewer, larger batches instead of a growing backlog.
+        if self.cancelled:
+            raise GenerationCancelled()
+        queue = asyncio.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in source:
+                    queue.put_nowait(item)
+                    # buffered input would otherwise be read without ever
+                    # letting the consumer run
+                    await asyncio.sleep(0)
+            finally:
+                try:
+                    # cancelled between items, the source is suspended at a
+                    # yield and would keep its response open until collected
+                    if hasattr(source, "aclose"):
+                        await source.aclose()
+                finally:
+                    queue.put_nowait(done)
+
+        task = asyncio.ensure_future(pump())
+        self.tasks.add(task)
+        try:
+            finished = False
+            while not finished:
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                finished = batch[-1] is done
+                if finished:
+                    batch.pop()
+                if batch:
+                    yield batch
+            self._raise_if_cancelled(task)
+            # re-raises upstream errors
+            await task
+        finally:
+            task.cancel()
+            self.tasks.discard(task)
+
+
+# session hash -> Cancellation handles of its running generations
+_running_generations = collections.defaultdict(set)
+
+
+def cancel_generations(session):
+    for cancellation in list(_running_generations.get(session, ())):
+        cancellation.cancel()
+
+
+# ---------- PREWARM ----------
+# first prompts sent with the default system prompt, for PREWARM_TOP_PROMPTS
+prompt_log = PromptLog()
+
+
+def first_turn_messages(prompt):
+    # the messages _generate sends for a first prompt with the default system prompt
+    return [{
+        "role": "system",
+        "content": SYSTEM_PROMPTS[prompt_variant(prompt, {"history": []})]
+    }, {
+        "role": "user",
+        "content": prompt
+    }]
+
+
+async def prewarm_prompt(prompt):
+    messages = first_turn_messages(prompt)
+    key = cache_key(",".join(FANOUT_MODELS) or MODEL, messages, TEMPERATURE)
+    if response_cache.contains(key):
+        return "cached"
+    ticket = scheduler.submit("prewarm:" + key[:16],
+                              sum(estimate_tokens(m["content"]) for m in messages),
+                              key=key,
+                              weight=PREWARM_WEIGHT)
+    try:
+        await scheduler.wait(ticket)
+        if FANOUT_MODELS:
+            _, content = await fanout_openrouter_chat(messages)
+        else:
+            content = extract_assistant_content(await async_call_openrouter_chat(messages))
+    finally:
+        scheduler.release(ticket)
+    # a broken page would be served to everyone who picks the example
+    if VALIDATE_ARTIFACTS and await validate_artifact(content):
+        return "invalid"
+    response_cache.set(key, content)
+    if semantic_cache is not None and has_code_block(content):
+        semantic_cache.add(prompt, artifact_store.put(content), namespace=messages[0]["content"])
+    return "generated"
+
+
+def prewarm_prompts():
+    prompts = [example["description"] for example in EXAMPLES] if PREWARM_EXAMPLES else []
+    return prompts + prompt_log.top(PREWARM_TOP_PROMPTS) if PREWARM_TOP_PROMPTS > 0 else prompts
+
+
+prewarmer = Prewarmer(prewarm_prompt, prewarm_prompts, concurrency=PREWARM_CONCURRENCY, interval=PREWARM_INTERVAL)
 
 
 # ---------- EVENTS CLASS ----------
 class GradioEvents:
 
     @staticmethod
-    def generate_code(input_value, system_prompt_input_value, state_value):
+    def mark_submitted(request: gr.Request):
+        # runs outside the queue, so the gap until generate_code starts is
+        # the time spent waiting in it
+        if request is not None and request.session_hash:
+            _submitted_at[request.session_hash] = time.perf_counter()
+            _submitted_at.move_to_end(request.session_hash)
+            while len(_submitted_at) > 1024:
+                _submitted_at.popitem(last=False)
 
-        # initial UI state while we call the API
-        yield {
-            output_loading: gr.update(spinning=True),
-            state_tab: gr.update(active_key="loading"),
-            output: gr.update(value=None)
-        }
+    @staticmethod
+    async def generate_code(input_value, system_prompt_input_value, state_value, force_regenerate=False,
+                            use_cached=False, request: gr.Request = None):
+        timer = Timer(generation_stage_seconds)
+        report = {"outcome": "error"}
+        submitted_at = _submitted_at.pop(request.session_hash, None) if request is not None else None
+        if submitted_at is not None:
+            timer.add("queue_wait", time.perf_counter() - submitted_at)
+        session = request.session_hash if request is not None else id(state_value)
+        cancellation = Cancellation()
+        # the code view and the sandbox are only sent when they change
+        updates = UpdateFilter({output: "output", sandbox: "sandbox"}, state_value.setdefault("ui_digests", {}),
+                               ui_update_bytes)
+        _running_generations[session].add(cancellation)
+        generations_active.inc()
+
+        def finish():
+            # runs once, when the handler ends or is cancelled; the handler
+            # of a closed tab is never resumed
+            if report.get("finished"):
+                return
+            report["finished"] = True
+            _running_generations[session].discard(cancellation)
+            if not _running_generations[session]:
+                _running_generations.pop(session, None)
+            outcome = "cancelled" if cancellation.cancelled else report["outcome"]
+            generations_active.dec()
+            timer.add("total", timer.total())
+            generations_total.inc(outcome=outcome)
+            if METRICS_JSON_LOG:
+                metrics_logger.info(json.dumps({
+                    "event": "generation",
+                    "outcome": outcome,
+                    "model": report.get("model", MODEL),
+                    "ui_bytes": updates.bytes_sent,
+                    "stages": {stage: round(seconds, 4) for stage, seconds in timer.stages.items()},
+                }))
+
+        cancellation.callbacks.append(finish)
+        try:
+            async for update in GradioEvents._generate(input_value, system_prompt_input_value, state_value,
+                                                       force_regenerate, use_cached, request, timer, report,
+                                                       cancellation):
+                yield updates.filter(update)
+            yield updates.close()
+        finally:
+            finish()
+
+    @staticmethod
+    async def stop_generation(request: gr.Request):
+        # Stop button and tab close (unload)
+        if request is not None:
+            cancel_generations(request.session_hash)
 
+    @staticmethod
+    async def _generate(input_value, system_prompt_input_value, state_value, force_regenerate, use_cached, request,
+                        timer, report, cancellation):
+
+        prompt_start = time.perf_counter()
         if input_value is None:
             input_value = ""
+        imports = sandbox_imports(request)
 
         # Build messages: keep history, ensure system prompt presence
+        history_tokens = history_manager.history_tokens(state_value)
+        system_content = system_prompt_input_value or SYSTEM_PROMPTS[prompt_variant(input_value, state_value)]
         messages = [{
             "role": "system",
-            "content": SYSTEM_PROMPT+" always use html if user not specifies any thing make sure u dont use black as background color" if not system_prompt_input_value else system_prompt_input_value
-        }] + state_value.get("history", [])
+            "content": system_content
+        }] + history_manager.messages(state_value)
 
         messages.append({"role": "user", "content": input_value})
+        prompt_tokens = estimate_tokens(system_content) + history_tokens + estimate_tokens(input_value)
+        logger.info("Prompt: %d messages, ~%d tokens (%d from history)", len(messages), prompt_tokens,
+                    history_tokens)
+
+        # identical requests (e.g. the example cards) are served from cache
+        key = cache_key(",".join(FANOUT_MODELS) or MODEL, messages, TEMPERATURE)
+        assistant_content = None if force_regenerate else response_cache.get(key)
+        if not state_value["history"] and not system_prompt_input_value:
+            prompt_log.record(input_value)
+        # reworded first prompts can reuse an earlier design, if asked to
+        first_turn = semantic_cache is not None and not state_value["history"]
+        similar = None
+        if assistant_content is None and first_turn and not force_regenerate:
+            # a scan of the whole index, ~20 ms at 100k entries; numpy
+            # releases the GIL, so it runs off the event loop
+            similar = await asyncio.to_thread(semantic_cache.lookup, input_value, namespace=system_content)
+            cached = artifact_store.get(similar[2]) if similar is not None else None
+            if cached is None:
+                semantic_cache_total.inc(result="miss")
+            elif use_cached:
+                semantic_cache_total.inc(result="hit")
+                assistant_content = cached
+            else:
+                semantic_cache_total.inc(result="offered")
+                gr.Info(f'A similar design was generated for "{similar[1][:80]}". '
+                        'Tick "Reuse similar designs" to get it instantly.')
+        timer.add("prompt", time.perf_counter() - prompt_start)
+        ticket = None
+        if assistant_content is None:
+            # only requests that go upstream need a slot; a second Submit of
+            # the same request is dropped while the first one runs
+            session = state_value.get("session_id") or (request.session_hash if request is not None else id(state_value))
+            try:
+                ticket = scheduler.submit(session, prompt_tokens, key=key)
+            except AdmissionError as e:
+                report["outcome"] = "rejected"
+                gr.Warning(str(e))
+                yield {}
+                return
+            cancellation.callbacks.append(lambda: scheduler.release(ticket))
 
+        # initial UI state while we call the API
         try:
-            data = call_openrouter_chat(messages=messages)
-        except Exception as e:
-            err_text = f"Error contacting OpenRouter API: {str(e)}"
-            # set state and show error
-            state_value["history"] = messages + [{"role": "assistant", "content": err_text}]
             yield {
-                output: gr.update(value=err_text),
-                state_tab: gr.update(active_key="render"),
-                output_loading: gr.update(spinning=False),
-                state: gr.update(value=state_value)
+                output_loading: gr.update(spinning=True),
+                state_tab: gr.update(active_key="loading"),
+                output: gr.update(value=None),
+                loading_spin: gr.update(tip="Generating code..."),
+                stop_btn: gr.update(disabled=ticket is None)
             }
-            return
-
-        # Attempt to extract assistant content robustly
-        assistant_content = None
-        try:
-            # Common OpenRouter shape: choices[0].message.content
-            if "choices" in data and isinstance(data["choices"], list) and len(data["choices"]) > 0:
-                choice = data["choices"][0]
-                if isinstance(choice, dict) and "message" in choice and isinstance(choice["message"], dict):
-                    assistant_content = choice["message"].get("content") or choice["message"].get("text")
-                # fallback: direct 'text' or 'content' fields
-                if not assistant_content:
-                    assistant_content = choice.get("text") or choice.get("content")
-            # final fallback: top-level 'text' or 'generated_text'
-            if not assistant_content:
-                assistant_content = data.get("text") or data.get("generated_text") or json.dumps(data)
-        except Exception:
-            assistant_content = json.dumps(data)
+        except BaseException:
+            # closed at the first yield, before the request started
+            if ticket is not None:
+                scheduler.release(ticket)
+            raise
+
+        if ticket is not None:
+            result = {}
+            try:
+                # follow-ups on an existing artifact ask for an edit first
+                edit_files = None
+                if EDIT_MODE and not FANOUT_MODELS and state_value.get("artifact_index") is not None:
+                    edit_files = get_generated_files(history_manager.latest_artifact(state_value))
+                admission_start = time.perf_counter()
+                queued = False
+                while not await cancellation.run(scheduler.wait(ticket, QUEUE_UPDATE_INTERVAL)):
+                    queued = True
+                    yield {loading_spin: gr.update(tip=f"Waiting in queue, position {scheduler.position(ticket)}...")}
+                timer.add("admission", time.perf_counter() - admission_start)
+                if queued:
+                    yield {loading_spin: gr.update(tip="Generating code...")}
+
+                tokens_total.inc(prompt_tokens, kind="prompt")
+                upstream_start = time.perf_counter()
+                try:
+                    if edit_files is not None:
+                        edit_messages = messages[:-1] + [{
+                            "role": "user",
+                            "content": input_value + EDIT_PROMPT.format(filenames=" and ".join(edit_files),
+                                                                        filename=next(iter(edit_files)))
+                        }]
+                        async for update in GradioEvents._complete(edit_messages, imports, cancellation, report,
+                                                                   result, render=False):
+                            yield update
+                        assistant_content = apply_edit_response(edit_files, result["content"])
+                        report["edit"] = "fallback" if assistant_content is None else (
+                            "full" if assistant_content is result["content"] else "applied")
+                        edits_total.inc(result=report["edit"])
+                        if assistant_content is None:
+                            yield {loading_spin: gr.update(tip="Regenerating the full page...")}
+                            tokens_total.inc(prompt_tokens, kind="prompt")
+                    if assistant_content is None:
+                        async for update in GradioEvents._complete(messages, imports, cancellation, report, result,
+                                                                   render=True):
+                            yield update
+                        assistant_content = result["content"]
+                    # a truncated response is shown, but not cached
+                    complete = result["complete"]
+                    if VALIDATE_ARTIFACTS:
+                        with timer.span("validate"):
+                            errors = await validate_artifact(assistant_content)
+                        validations_total.inc(result="invalid" if errors else "ok")
+                        if errors:
+                            yield {loading_spin: gr.update(tip="Fixing the generated code...")}
+                            repair_start = time.perf_counter()
+                            async for update in GradioEvents._repair(messages, assistant_content, errors, imports,
+                                                                     cancellation, report, result):
+                                yield update
+                            assistant_content = result.get("repaired") or assistant_content
+                            timer.add("repair", time.perf_counter() - repair_start)
+                except GenerationCancelled:
+                    raise
+                except Exception as e:
+                    timer.add("upstream", time.perf_counter() - upstream_start)
+                    err_text = f"Error contacting OpenRouter API: {str(e)}"
+                    # set state and show error
+                    history_manager.append_turn(state_value, input_value, err_text)
+                    await GradioEvents.persist_turn(state_value, input_value, err_text)
+                    yield {
+                        output: gr.update(value=err_text),
+                        state_tab: gr.update(active_key="render"),
+                        output_loading: gr.update(spinning=False),
+                        state: gr.update(value=state_value),
+                        stop_btn: gr.update(disabled=True),
+                        download_content: gr.update(value="")
+                    }
+                    return
+            except GenerationCancelled:
+                # keep whatever streamed so far on screen, but out of the history
+                report["outcome"] = "cancelled"
+                yield {
+                    output: gr.update(value=result.get("content", "") + "\n\n*Generation stopped.*"),
+                    state_tab: gr.update(active_key="render" if result.get("rendered") else "empty"),
+                    output_loading: gr.update(spinning=False),
+                    stop_btn: gr.update(disabled=True)
+                }
+                return
+            finally:
+                scheduler.release(ticket)
+
+            timer.add("upstream", time.perf_counter() - upstream_start)
+            if complete:
+                response_cache.set(key, assistant_content)
+                if first_turn and has_code_block(assistant_content):
+                    semantic_cache.add(input_value, artifact_store.put(assistant_content), namespace=system_content)
+            report["outcome"] = "ok" if complete else "truncated"
+        elif similar is not None and use_cached:
+            logger.info("Near-duplicate of %r (similarity %.2f)", similar[1][:80], similar[0])
+            report["outcome"] = "semantic_hit"
+        else:
+            logger.info("Response cache hit %s", key[:12])
+            report["outcome"] = "cache_hit"
 
         # update history
-        state_value["history"] = messages + [{"role": "assistant", "content": assistant_content}]
-
-        generated_files = get_generated_files(assistant_content)
-        react_code = generated_files.get("index.tsx") or generated_files.get("index.jsx") or generated_files.get("index.js")
-        html_code = generated_files.get("index.html")
+        with timer.span("persist"):
+            history_manager.append_turn(state_value, input_value, assistant_content)
+            await GradioEvents.persist_turn(state_value, input_value, assistant_content)
+
+        with timer.span("extract"):
+            generated_files = get_generated_files(assistant_content)
+        with timer.span("sandbox"):
+            sandbox_update = GradioEvents.render_sandbox(generated_files, imports)
+        # the download is built by /download from the artifact store; a
+        # reply without code has nothing to download
+        download_ref = artifact_store.put(assistant_content) if code_files(assistant_content) else ""
 
         # Completed - return UI update
         yield {
             output: gr.update(value=assistant_content),
-            download_content: gr.update(value=react_code or html_code),
             state_tab: gr.update(active_key="render"),
             output_loading: gr.update(spinning=False),
+            state: gr.update(value=state_value),
+            stop_btn: gr.update(disabled=True),
+            download_content: gr.update(value=download_ref),
+            **sandbox_update
+        }
+
+    @staticmethod
+    async def _complete(messages, imports, cancellation, report, result, render=True):
+        # Calls the model, yielding UI updates while the response streams
+        # in; the full response is left in result["content"], and
+        # result["complete"] is False if the stream was cut off.
+        if FANOUT_MODELS:
+            report["model"], result["content"] = await cancellation.run(fanout_openrouter_chat(messages=messages))
+        elif not STREAM:
+            result["content"] = extract_assistant_content(
+                await cancellation.run(async_call_openrouter_chat(messages=messages)))
+        if FANOUT_MODELS or not STREAM:
+            result["complete"] = True
+            tokens_total.inc(estimate_tokens(result["content"]), kind="completion")
+            return
+        result["content"] = ""
+        tokenizer = FenceTokenizer()
+        last_update = 0.0
+        status = {}
+        async for deltas in cancellation.stream(async_stream_openrouter_chat(messages=messages, status=status)):
+            delta = "".join(deltas)
+            result["content"] += delta
+            closed_blocks = len(tokenizer.blocks)
+            closed = render and len(tokenizer.feed(delta).blocks) > closed_blocks
+            # the code view refreshes at most UI_UPDATE_FPS times a second;
+            # the rest arrives with the next update or the final one
+            if not closed and UI_UPDATE_FPS > 0 and time.perf_counter() - last_update < 1 / UI_UPDATE_FPS:
+                continue
+            last_update = time.perf_counter()
+            update = {output: gr.update(value=result["content"])}
+            # a code block has just closed, so the sandbox can already
+            # render it
+            if closed:
+                update.update(GradioEvents.render_sandbox(tokenizer.files(), imports))
+                update[state_tab] = gr.update(active_key="render")
+                result["rendered"] = True
+            yield update
+        result["complete"] = status.get("finished", False)
+        if not result["complete"]:
+            logger.warning("OpenRouter stream ended without [DONE] after %d characters", len(result["content"]))
+        tokens_total.inc(estimate_tokens(result["content"]), kind="completion")
+
+    @staticmethod
+    async def _repair(messages, assistant_content, errors, imports, cancellation, report, result):
+        # One repair request for an artifact that failed validation. The
+        # model sees the request, its reply and the problems, not the whole
+        # history again; result["repaired"] is left unset if it does not help.
+        logger.info("Artifact failed validation: %s", "; ".join(errors))
+        files = get_generated_files(assistant_content)
+        repair_messages = [messages[0], messages[-1], {"role": "assistant", "content": assistant_content}, {
+            "role": "user",
+            "content": REPAIR_PROMPT.format(errors="\n".join(f"- {error}" for error in errors),
+                                            filename=next(iter(files)))
+        }]
+        tokens_total.inc(sum(estimate_tokens(m["content"]) for m in repair_messages), kind="prompt")
+        try:
+            async for update in GradioEvents._complete(repair_messages, imports, cancellation, report, result,
+                                                       render=False):
+                yield update
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.warning("Repair request failed: %s", e)
+            validations_total.inc(result="repair_failed")
+            return
+        if not result["complete"]:
+            validations_total.inc(result="repair_failed")
+            return
+        repaired = apply_edit_response(files, result["content"], note="")
+        if repaired is None or "```" not in repaired:
+            validations_total.inc(result="repair_failed")
+            return
+        result["repaired"] = repaired
+        remaining = await validate_artifact(repaired)
+        validations_total.inc(result="still_invalid" if remaining else "repaired")
+        if remaining:
+            logger.info("Repaired artifact still fails validation: %s", "; ".join(remaining))
+
+    @staticmethod
+    async def persist_turn(state_value, input_value, assistant_content):
+        if state_value.get("session_id"):
+            await asyncio.to_thread(session_store.append, state_value["session_id"], [
+                {"role": "user", "content": input_value},
+                {"role": "assistant", "content": assistant_content},
+            ])
+
+    @staticmethod
+    def load_session(session_id_value, state_value):
+        if not session_id_value:
+            session_id_value = uuid.uuid4().hex
+        state_value["session_id"] = session_id_value
+        history_manager.clear(state_value)
+        # replay the latest exchanges so compaction and the budget apply
+        messages = session_store.history(session_id_value, limit=SESSION_RESTORE_MESSAGES)
+        if messages and messages[0]["role"] != "user":
+            messages = messages[1:]
+        for user_message, assistant_message in zip(messages[::2], messages[1::2]):
+            history_manager.append_turn(state_value, user_message["content"], assistant_message["content"])
+        return session_id_value, gr.update(value=state_value)
+
+    @staticmethod
+    def render_sandbox(generated_files, imports=react_imports):
+        react_code = generated_files.get("index.tsx") or generated_files.get("index.jsx") or generated_files.get("index.js")
+        html_code = generated_files.get("index.html")
+        if react_code:
+            # send only the modules the artifact imports, and catch unknown
+            # ones here rather than as a broken iframe
+            imports, missing = prune_import_map(react_code, imports)
+            if missing:
+                logger.info("Artifact imports modules outside the import map: %s", ", ".join(missing))
+                react_code = None
+                html_code = missing_imports_page(missing)
+        return {
             sandbox: gr.update(
                 template="react" if react_code else "html",
-                imports=react_imports if react_code else {},
+                imports=imports if react_code else {},
                 value={
-                    "./index.tsx": """import Demo from './demo.tsx'
-import "@tailwindcss/browser"
-
-export default Demo
-""",
+                    "./index.tsx": sandbox_entry(imports),
                     "./demo.tsx": react_code
                 } if react_code else {"./index.html": html_code}),
-            state: gr.update(value=state_value)
         }
 
     @staticmethod
@@ -317,16 +766,23 @@ export default Demo
 
     @staticmethod
     def render_history(statue_value):
-        return gr.update(value=statue_value["history"])
+        # the full conversation is only read from the store when asked for
+        if statue_value.get("session_id"):
+            return gr.update(value=session_store.history(statue_value["session_id"],
+                                                         limit=HISTORY_DRAWER_MESSAGES))
+        return gr.update(value=history_manager.messages(statue_value))
 
     @staticmethod
     def clear_history(state_value):
         # modelscope_studio may have a toast; if not, this still works
         try:
+            import modelscope_studio.components.antd as antd
             antd.message.success("History Cleared.")
         except Exception:
             pass
-        state_value["history"] = []
+        history_manager.clear(state_value)
+        if state_value.get("session_id"):
+            session_store.clear(state_value["session_id"])
         return gr.update(value=state_value)
 
 
@@ -361,267 +817,334 @@ css = """
 }
 """
 
-with gr.Blocks(css=css) as demo:
-    # Global State
-    state = gr.State({"system_prompt": "", "history": []})
-    with ms.Application(elem_id="coder-artifacts") as app:
-        with antd.ConfigProvider(theme=DEFAULT_THEME, locale=DEFAULT_LOCALE):
-
-            with ms.AutoLoading():
-                with antd.Row(gutter=[32, 12],
-                              elem_style=dict(marginTop=20),
-                              align="stretch"):
-                    # Left Column
-                    with antd.Col(span=24, md=8):
-                        with antd.Flex(vertical=True, gap="middle", wrap=True):
-                            with antd.Flex(justify="center",
-                                           align="center",
-                                           vertical=True,
-                                           gap="middle"):
-                                # antd.Image(
-                                #     "https://img.alicdn.com/imgextra/i2/O1CN01KDhOma1DUo8oa7OIU_!!6000000000220-1-tps-240-240.gif",
-                                #     width=200,
-                                #     height=200,
-                                #     preview=False)
-                                antd.Typography.Title(
-                                    "My-v0.dev",
-                                    level=1,
-                                    elem_style=dict(fontSize=24))
-                            # Input
-                            input = antd.Input.Textarea(
+
+# ---------- UI ----------
+def create_app():
+    # Builds the Blocks app. The UI packages are imported here rather than
+    # at module import, so the handlers and the generation core load fast.
+    # Handlers update the components of the most recently built app.
+    global input, system_prompt_input, force_regenerate_checkbox, submit_btn, output, state_tab, sandbox, \
+        download_content, output_loading, state, loading_spin, stop_btn
+    import modelscope_studio.components.antd as antd
+    import modelscope_studio.components.base as ms
+    import modelscope_studio.components.pro as pro
+
+    with gr.Blocks(css=css) as demo:
+        # Global State
+        state = gr.State({"system_prompt": "", "history": []})
+        session_id = gr.BrowserState("",
+                                     storage_key="coder-artifacts-session-id",
+                                     secret=session_secret())
+        with ms.Application(elem_id="coder-artifacts") as app:
+            with antd.ConfigProvider(theme=DEFAULT_THEME, locale=DEFAULT_LOCALE):
+
+                with ms.AutoLoading():
+                    with antd.Row(gutter=[32, 12],
+                                  elem_style=dict(marginTop=20),
+                                  align="stretch"):
+                        # Left Column
+                        with antd.Col(span=24, md=8):
+                            with antd.Flex(vertical=True, gap="middle", wrap=True):
+                                with antd.Flex(justify="center",
+                                               align="center",
+                                               vertical=True,
+                                               gap="middle"):
+                                    # antd.Image(
+                                    #     "https://img.alicdn.com/imgextra/i2/O1CN01KDhOma1DUo8oa7OIU_!!6000000000220-1-tps-240-240.gif",
+                                    #     width=200,
+                                    #     height=200,
+                                    #     preview=False)
+                                    antd.Typography.Title(
+                                        "My-v0.dev",
+                                        level=1,
+                                        elem_style=dict(fontSize=24))
+                                # Input
+                                input = antd.Input.Textarea(
+                                    size="large",
+                                    allow_clear=True,
+                                    auto_size=dict(minRows=2, maxRows=6),
+                                    placeholder=
+                                    "Describe the web application you want to create",
+                                    elem_id="input-container")
+                                # Input Notes
+                                with antd.Flex(justify="space-between"):
+                                    antd.Typography.Text(
+                                        "Note: The model supports multi-round dialogue, you can make the model generate interfaces by returning React or HTML code.",
+                                        strong=True,
+                                        type="warning")
+
+                                    tour_btn = antd.Button("Usage Tour",
+                                                           variant="filled",
+                                                           color="default")
+                                # Submit Button
+                                with antd.Flex(gap="small"):
+                                    submit_btn = antd.Button("Submit",
+                                                             type="primary",
+                                                             block=True,
+                                                             size="large",
+                                                             elem_id="submit-btn")
+                                    stop_btn = antd.Button("Stop",
+                                                           danger=True,
+                                                           size="large",
+                                                           disabled=True,
+                                                           elem_id="stop-btn")
+
+                                antd.Divider("Settings")
+
+                                # Settings Area
+                                with antd.Space(size="small",
+                                                wrap=True,
+                                                elem_id="settings-area"):
+                                    # system_prompt_btn = antd.Button(
+                                    #     "⚙️ Set System Prompt", type="default")
+                                    history_btn = antd.Button(
+                                        "📜 History",
+                                        type="default",
+                                        elem_id="history-btn",
+                                    )
+                                    cleat_history_btn = antd.Button(
+                                        "🧹 Clear History", danger=True)
+                                    with antd.Checkbox(
+                                            False) as force_regenerate_checkbox:
+                                        ms.Text("Force regenerate")
+                                    with antd.Checkbox(
+                                            False) as use_cached_checkbox:
+                                        ms.Text("Reuse similar designs")
+
+                                antd.Divider("Examples")
+
+                                # Examples
+                                with antd.Flex(gap="small", wrap=True):
+                                    for example in EXAMPLES:
+                                        with antd.Card(
+                                                elem_style=dict(
+                                                    flex="1 1 fit-content"),
+                                                hoverable=True) as example_card:
+                                            antd.Card.Meta(
+                                                title=example['title'],
+                                                description=example['description'])
+
+                                        example_card.click(
+                                            fn=GradioEvents.select_example(
+                                                example),
+                                            outputs=[input])
+
+                        # Right Column
+                        with antd.Col(span=24, md=16):
+                            with antd.Card(
+                                    title="Output",
+                                    elem_style=dict(height="100%",
+                                                    display="flex",
+                                                    flexDirection="column"),
+                                    styles=dict(body=dict(height=0, flex=1)),
+                                    elem_id="output-container"):
+                                # Output Container Extra
+                                with ms.Slot("extra"):
+                                    with ms.Div(elem_id="output-container-extra"):
+                                        with antd.Button(
+                                                "Download Code",
+                                                type="link",
+                                                href_target="_blank",
+                                                disabled=True,
+                                        ) as download_btn:
+                                            with ms.Slot("icon"):
+                                                antd.Icon("DownloadOutlined")
+                                        download_content = gr.Text(visible=False)
+
+                                        view_code_btn = antd.Button(
+                                            "🧑‍💻 View Code", type="primary")
+                                # Output Content
+                                with antd.Tabs(
+                                        elem_style=dict(height="100%"),
+                                        active_key="empty",
+                                        render_tab_bar="() => null") as state_tab:
+                                    with antd.Tabs.Item(key="empty"):
+                                        antd.Empty(
+                                            description=
+                                            "Enter your request to generate code",
+                                            elem_classes="output-empty")
+                                    with antd.Tabs.Item(key="loading"):
+                                        with antd.Spin(
+                                                tip="Generating code...",
+                                                size="large",
+                                                elem_classes="output-loading") as loading_spin:
+                                            # placeholder
+                                            ms.Div()
+                                    with antd.Tabs.Item(key="render"):
+                                        sandbox = pro.WebSandbox(
+                                            height="100%",
+                                            elem_classes="output-html",
+                                            template="html",
+                                        )
+
+                        # Modals and Drawers
+                        with antd.Modal(open=False,
+                                        title="System Prompt",
+                                        width="800px") as system_prompt_modal:
+                            system_prompt_input = antd.Input.Textarea(
+                                # SYSTEM_PROMPT,
+                                value="",
                                 size="large",
+                                placeholder="Enter your system prompt here",
                                 allow_clear=True,
-                                auto_size=dict(minRows=2, maxRows=6),
-                                placeholder=
-                                "Describe the web application you want to create",
-                                elem_id="input-container")
-                            # Input Notes
-                            with antd.Flex(justify="space-between"):
-                                antd.Typography.Text(
-                                    "Note: The model supports multi-round dialogue, you can make the model generate interfaces by returning React or HTML code.",
-                                    strong=True,
-                                    type="warning")
-
-                                tour_btn = antd.Button("Usage Tour",
-                                                       variant="filled",
-                                                       color="default")
-                            # Submit Button
-                            submit_btn = antd.Button("Submit",
-                                                     type="primary",
-                                                     block=True,
-                                                     size="large",
-                                                     elem_id="submit-btn")
-
-                            antd.Divider("Settings")
-
-                            # Settings Area
-                            with antd.Space(size="small",
-                                            wrap=True,
-                                            elem_id="settings-area"):
-                                # system_prompt_btn = antd.Button(
-                                #     "⚙️ Set System Prompt", type="default")
-                                history_btn = antd.Button(
-                                    "📜 History",
-                                    type="default",
-                                    elem_id="history-btn",
-                                )
-                                cleat_history_btn = antd.Button(
-                                    "🧹 Clear History", danger=True)
-
-                            antd.Divider("Examples")
-
-                            # Examples
-                            with antd.Flex(gap="small", wrap=True):
-                                for example in EXAMPLES:
-                                    with antd.Card(
-                                            elem_style=dict(
-                                                flex="1 1 fit-content"),
-                                            hoverable=True) as example_card:
-                                        antd.Card.Meta(
-                                            title=example['title'],
-                                            description=example['description'])
-
-                                    example_card.click(
-                                        fn=GradioEvents.select_example(
-                                            example),
-                                        outputs=[input])
-
-                    # Right Column
-                    with antd.Col(span=24, md=16):
-                        with antd.Card(
-                                title="Output",
-                                elem_style=dict(height="100%",
-                                                display="flex",
-                                                flexDirection="column"),
-                                styles=dict(body=dict(height=0, flex=1)),
-                                elem_id="output-container"):
-                            # Output Container Extra
-                            with ms.Slot("extra"):
-                                with ms.Div(elem_id="output-container-extra"):
-                                    with antd.Button(
-                                            "Download Code",
-                                            type="link",
-                                            href_target="_blank",
-                                            disabled=True,
-                                    ) as download_btn:
-                                        with ms.Slot("icon"):
-                                            antd.Icon("DownloadOutlined")
-                                    download_content = gr.Text(visible=False)
-
-                                    view_code_btn = antd.Button(
-                                        "🧑‍💻 View Code", type="primary")
-                            # Output Content
-                            with antd.Tabs(
-                                    elem_style=dict(height="100%"),
-                                    active_key="empty",
-                                    render_tab_bar="() => null") as state_tab:
-                                with antd.Tabs.Item(key="empty"):
-                                    antd.Empty(
-                                        description=
-                                        "Enter your request to generate code",
-                                        elem_classes="output-empty")
-                                with antd.Tabs.Item(key="loading"):
-                                    with antd.Spin(
-                                            tip="Generating code...",
-                                            size="large",
-                                            elem_classes="output-loading"):
-                                        # placeholder
-                                        ms.Div()
-                                with antd.Tabs.Item(key="render"):
-                                    sandbox = pro.WebSandbox(
-                                        height="100%",
-                                        elem_classes="output-html",
-                                        template="html",
-                                    )
-
-                    # Modals and Drawers
-                    with antd.Modal(open=False,
-                                    title="System Prompt",
-                                    width="800px") as system_prompt_modal:
-                        system_prompt_input = antd.Input.Textarea(
-                            # SYSTEM_PROMPT,
-                            value="",
-                            size="large",
-                            placeholder="Enter your system prompt here",
-                            allow_clear=True,
-                            auto_size=dict(minRows=4, maxRows=14))
-
-                    with antd.Drawer(
-                            open=False,
-                            title="Output Code",
-                            placement="right",
-                            get_container=
-                            "() => document.querySelector('.gradio-container')",
-                            elem_id="coder-artifacts-code-drawer",
-                            styles=dict(
-                                body=dict(display="flex",
-                                          flexDirection="column-reverse")),
-                            width="750px") as output_code_drawer:
-                        with ms.Div(elem_classes="output-code"):
-                            with antd.Spin(spinning=False) as output_loading:
-                                output = ms.Markdown()
-
-                    with antd.Drawer(
-                            open=False,
-                            title="Chat History",
-                            placement="left",
-                            get_container=
-                            "() => document.querySelector('.gradio-container')",
-                            width="750px") as history_drawer:
-                        history_output = gr.Chatbot(
-                            show_label=False,
-                            type="messages",
-                            height='100%',
-                            elem_classes="history_chatbot")
-                    # Tour
-                    with antd.Tour(open=False) as usage_tour:
-                        antd.Tour.Step(
-                            title="Step 1",
-                            description=
-                            "Describe the web application you want to create.",
-                            get_target=
-                            "() => document.querySelector('#input-container')")
-                        antd.Tour.Step(
-                            title="Step 2",
-                            description="Click the submit button.",
-                            get_target=
-                            "() => document.querySelector('#submit-btn')")
-                        antd.Tour.Step(
-                            title="Step 3",
-                            description="Wait for the result.",
-                            get_target=
-                            "() => document.querySelector('#output-container')"
-                        )
-                        antd.Tour.Step(
-                            title="Step 4",
-                            description=
-                            "Download the generated HTML here or view the code.",
-                            get_target=
-                            "() => document.querySelector('#output-container-extra')"
-                        )
-                        antd.Tour.Step(
-                            title="Additional Settings",
-                            description="You can change chat history here.",
-                            get_target=
-                            "() => document.querySelector('#settings-area')")
-    # Event Handler
-    gr.on(fn=GradioEvents.close_modal,
-          triggers=[usage_tour.close, usage_tour.finish],
-          outputs=[usage_tour])
-    tour_btn.click(fn=GradioEvents.open_modal, outputs=[usage_tour])
-
-    # system_prompt_btn.click(fn=GradioEvents.open_modal,
-    #                         outputs=[system_prompt_modal])
-
-    system_prompt_modal.ok(GradioEvents.update_system_prompt,
-                           inputs=[system_prompt_input, state],
-                           outputs=[state]).then(fn=GradioEvents.close_modal,
-                                                 outputs=[system_prompt_modal])
-
-    system_prompt_modal.cancel(GradioEvents.close_modal,
-                               outputs=[system_prompt_modal]).then(
-                                   fn=GradioEvents.reset_system_prompt,
-                                   inputs=[state],
-                                   outputs=[system_prompt_input])
-    output_code_drawer.close(fn=GradioEvents.close_modal,
-                             outputs=[output_code_drawer])
-    cleat_history_btn.click(fn=GradioEvents.clear_history,
-                            inputs=[state],
-                            outputs=[state])
-    history_btn.click(fn=GradioEvents.open_modal,
-                      outputs=[history_drawer
-                               ]).then(fn=GradioEvents.render_history,
+                                auto_size=dict(minRows=4, maxRows=14))
+
+                        with antd.Drawer(
+                                open=False,
+                                title="Output Code",
+                                placement="right",
+                                get_container=
+                                "() => document.querySelector('.gradio-container')",
+                                elem_id="coder-artifacts-code-drawer",
+                                styles=dict(
+                                    body=dict(display="flex",
+                                              flexDirection="column-reverse")),
+                                width="750px") as output_code_drawer:
+                            with ms.Div(elem_classes="output-code"):
+                                with antd.Spin(spinning=False) as output_loading:
+                                    output = ms.Markdown()
+
+                        with antd.Drawer(
+                                open=False,
+                                title="Chat History",
+                                placement="left",
+                                get_container=
+                                "() => document.querySelector('.gradio-container')",
+                                width="750px") as history_drawer:
+                            history_output = gr.Chatbot(
+                                show_label=False,
+                                type="messages",
+                                height='100%',
+                                elem_classes="history_chatbot")
+                        # Tour
+                        with antd.Tour(open=False) as usage_tour:
+                            antd.Tour.Step(
+                                title="Step 1",
+                                description=
+                                "Describe the web application you want to create.",
+                                get_target=
+                                "() => document.querySelector('#input-container')")
+                            antd.Tour.Step(
+                                title="Step 2",
+                                description="Click the submit button.",
+                                get_target=
+                                "() => document.querySelector('#submit-btn')")
+                            antd.Tour.Step(
+                                title="Step 3",
+                                description="Wait for the result.",
+                                get_target=
+                                "() => document.querySelector('#output-container')"
+                            )
+                            antd.Tour.Step(
+                                title="Step 4",
+                                description=
+                                "Download the generated HTML here or view the code.",
+                                get_target=
+                                "() => document.querySelector('#output-container-extra')"
+                            )
+                            antd.Tour.Step(
+                                title="Additional Settings",
+                                description="You can change chat history here.",
+                                get_target=
+                                "() => document.querySelector('#settings-area')")
+        # Event Handler
+        demo.load(fn=GradioEvents.load_session,
+                  inputs=[session_id, state],
+                  outputs=[session_id, state])
+        gr.on(fn=GradioEvents.close_modal,
+              triggers=[usage_tour.close, usage_tour.finish],
+              outputs=[usage_tour])
+        tour_btn.click(fn=GradioEvents.open_modal, outputs=[usage_tour])
+
+        # system_prompt_btn.click(fn=GradioEvents.open_modal,
+        #                         outputs=[system_prompt_modal])
+
+        system_prompt_modal.ok(GradioEvents.update_system_prompt,
+                               inputs=[system_prompt_input, state],
+                               outputs=[state]).then(fn=GradioEvents.close_modal,
+                                                     outputs=[system_prompt_modal])
+
+        system_prompt_modal.cancel(GradioEvents.close_modal,
+                                   outputs=[system_prompt_modal]).then(
+                                       fn=GradioEvents.reset_system_prompt,
                                        inputs=[state],
-                                       outputs=[history_output])
-    history_drawer.close(fn=GradioEvents.close_modal, outputs=[history_drawer])
-
-    download_btn.click(fn=None,
-                       inputs=[download_content],
-                       js="""(content) => {
-        const blob = new Blob([content], { type: 'text/plain' })
-        const url = URL.createObjectURL(blob)
-        const a = document.createElement('a')
-        a.href = url
-        a.download = 'output.txt'
-        a.click()
-}""")
-    view_code_btn.click(fn=GradioEvents.open_modal,
-                        outputs=[output_code_drawer])
-    submit_btn.click(
-        fn=GradioEvents.open_modal,
-        outputs=[output_code_drawer],
-    ).then(fn=GradioEvents.disable_btns([submit_btn, download_btn]),
-           outputs=[submit_btn, download_btn]).then(
-               fn=GradioEvents.generate_code,
-               inputs=[input, system_prompt_input, state],
-               outputs=[
-                   output, state_tab, sandbox, download_content,
-                   output_loading, state
-               ]).then(fn=GradioEvents.enable_btns([submit_btn, download_btn]),
-                       outputs=[submit_btn, download_btn
-                                ]).then(fn=GradioEvents.close_modal,
-                                        outputs=[output_code_drawer])
+                                       outputs=[system_prompt_input])
+        output_code_drawer.close(fn=GradioEvents.close_modal,
+                                 outputs=[output_code_drawer])
+        cleat_history_btn.click(fn=GradioEvents.clear_history,
+                                inputs=[state],
+                                outputs=[state])
+        history_btn.click(fn=GradioEvents.open_modal,
+                          outputs=[history_drawer
+                                   ]).then(fn=GradioEvents.render_history,
+                                           inputs=[state],
+                                           outputs=[history_output])
+        history_drawer.close(fn=GradioEvents.close_modal, outputs=[history_drawer])
+
+        download_btn.click(fn=None,
+                           inputs=[download_content],
+                           js="""async (ref) => {
+            if (!ref) return
+            // fetched rather than followed, so an error does not navigate
+            // the app away
+            const resp = await fetch('download/' + ref)
+            if (!resp.ok) {
+                alert(await resp.text())
+                return
+            }
+            const filename = /filename="([^"]+)"/.exec(resp.headers.get('Content-Disposition') || '')
+            const url = URL.createObjectURL(await resp.blob())
+            const a = document.createElement('a')
+            a.href = url
+            a.download = filename ? filename[1] : 'download'
+            a.click()
+            setTimeout(() => URL.revokeObjectURL(url), 1000)
+    }""")
+        view_code_btn.click(fn=GradioEvents.open_modal,
+                            outputs=[output_code_drawer])
+        submit_btn.click(fn=GradioEvents.mark_submitted, queue=False)
+        stop_btn.click(fn=GradioEvents.stop_generation, queue=False)
+        # closing the tab aborts its generations too
+        demo.unload(GradioEvents.stop_generation)
+        submit_btn.click(
+            fn=GradioEvents.open_modal,
+            outputs=[output_code_drawer],
+        ).then(fn=GradioEvents.disable_btns([submit_btn, download_btn]),
+               outputs=[submit_btn, download_btn]).then(
+                   fn=GradioEvents.generate_code,
+                   inputs=[
+                       input, system_prompt_input, state,
+                       force_regenerate_checkbox, use_cached_checkbox
+                   ],
+                   outputs=[
+                       output, state_tab, sandbox, download_content,
+                       output_loading, state, loading_spin, stop_btn
+                   ],
+                   # admission is handled by the fair scheduler, so Gradio's own
+                   # queue must not hold generations back
+                   concurrency_limit=None).then(fn=GradioEvents.enable_btns([submit_btn, download_btn]),
+                           outputs=[submit_btn, download_btn
+                                    ]).then(fn=GradioEvents.close_modal,
+                                            outputs=[output_code_drawer])
+    return demo
+
+
+def __getattr__(name):
+    # `app.demo`, as used by `gradio app.py` and Spaces, builds the UI on
+    # first access
+    if name == "demo":
+        globals()["demo"] = create_app()
+        return globals()["demo"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
-    demo.queue(default_concurrency_limit=100,
-               max_size=100).launch(ssr_mode=False, max_threads=100, debug=True)
\ No newline at end of file
+    if esm_cache:
+        esm_cache.prefetch_in_background(react_imports)
+    if PREWARM_EXAMPLES or PREWARM_TOP_PROMPTS > 0:
+        prewarmer.start_in_background()
+    create_app().queue(default_concurrency_limit=100,
+                       max_size=100).launch(ssr_mode=False,
+                                            max_threads=100,
+                                            debug=True,
+                                            app_kwargs={"routes": extra_routes})
\ No newline at end of file
@@ -0,0 +1,77 @@
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# Shared, content-addressed store for generated artifacts. Session history
+# keeps only the hash of its latest artifact, so the Gradio state that is
+# serialized on every event stays small, and identical artifacts (cached
+# responses, example cards) are kept once for all sessions. Artifacts are
+# zlib compressed in memory, bounded by size, with an optional SQLite file
+# behind it.
+
+def artifact_ref(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ArtifactStore:
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, path=None):
+        self.max_bytes = max_bytes
+        self.path = path
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self.size = 0
+        self.raw_size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS artifacts (
+                ref TEXT PRIMARY KEY,
+                content BLOB NOT NULL)""")
+            self._db.commit()
+
+    def put(self, text):
+        ref = artifact_ref(text)
+        with self._lock:
+            if ref in self._entries:
+                self._entries.move_to_end(ref)
+                return ref
+            blob = zlib.compress(text.encode("utf-8"))
+            self._remember(ref, blob, len(text))
+            self.stats["writes"] += 1
+            if self._db is not None:
+                self._db.execute("INSERT OR IGNORE INTO artifacts (ref, content) VALUES (?, ?)", (ref, blob))
+                self._db.commit()
+        return ref
+
+    def get(self, ref):
+        # the artifact text, or None if it was evicted and not on disk
+        with self._lock:
+            entry = self._entries.get(ref)
+            if entry is not None:
+                self._entries.move_to_end(ref)
+                self.stats["hits"] += 1
+                return zlib.decompress(entry[0]).decode("utf-8")
+            if self._db is not None:
+                row = self._db.execute("SELECT content FROM artifacts WHERE ref = ?", (ref, )).fetchone()
+                if row is not None:
+                    text = zlib.decompress(row[0]).decode("utf-8")
+                    self._remember(ref, row[0], len(text))
+                    self.stats["disk_hits"] += 1
+                    return text
+            self.stats["misses"] += 1
+            return None
+
+    def _remember(self, ref, blob, raw_size):
+        self._entries[ref] = (blob, raw_size)
+        self.size += len(blob)
+        self.raw_size += raw_size
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            _, (old_blob, old_raw_size) = self._entries.popitem(last=False)
+            self.size -= len(old_blob)
+            self.raw_size -= old_raw_size
@@ -0,0 +1,219 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+from starlette.responses import Response
+from starlette.routing import Route
+
+
+logger = logging.getLogger(__name__)
+
+# Local mirror of the esm.sh modules used by the React sandbox. Modules
+# are fetched once, their absolute esm.sh imports are rewritten to the
+# local prefix, and they are served with immutable cache headers. Every
+# URL in the import map is pinned to a version, so cached files never go
+# stale. Only modules the import map leads to are mirrored: its entries,
+# files under its "name/" entries and the modules those import; anything
+# else is a 404, so the route is not an open proxy to esm.sh.
+
+ESM_ORIGIN = "https://esm.sh"
+# esm.sh picks the build target from the User-Agent; ask for browser builds
+FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+# static and dynamic imports of root-relative or absolute origin URLs
+IMPORT_PATTERN = r"""((?:\bfrom|\bimport)\s*\(?\s*)(["'])((?:%s)?/(?!/)[^"']*)\2"""
+# downloads of the same path are serialized on one of these locks
+LOCK_STRIPES = 64
+
+
+class ESMCache:
+
+    def __init__(self, cache_dir, imports, prefix="/esm", origin=ESM_ORIGIN):
+        self.cache_dir = cache_dir
+        self.prefix = prefix.rstrip("/")
+        self.origin = origin
+        self.import_pattern = re.compile(IMPORT_PATTERN % re.escape(origin))
+        paths = [url[len(origin):] for url in imports.values() if url.startswith(origin + "/")]
+        self._roots = [path for path in paths if not path.endswith("/")]
+        self._prefixes = tuple(path for path in paths if path.endswith("/"))
+        # roots and every import recorded for a module fetched from them
+        self._reachable = set(self._roots)
+        self._graph_loaded = False
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._dependencies = {}
+        self._lock = threading.Lock()
+
+    def local_url(self, url, base_url=""):
+        # the sandbox document may live at a blob: URL, so the import map
+        # needs absolute URLs; imports inside the modules resolve against
+        # the module URL and can stay root-relative
+        if not url.startswith(self.origin + "/"):
+            return url
+        return base_url.rstrip("/") + self.prefix + url[len(self.origin):]
+
+    def import_map(self, imports, base_url=""):
+        return {name: self.local_url(url, base_url) for name, url in imports.items()}
+
+    def _paths(self, path):
+        digest = hashlib.sha256(path.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, digest[:2], digest)
+        return base + ".body", base + ".json"
+
+    def _rewrite(self, source):
+        def local(match):
+            specifier = match.group(3)
+            if specifier.startswith(self.origin):
+                specifier = specifier[len(self.origin):]
+            return f"{match.group(1)}{match.group(2)}{self.prefix}{specifier}{match.group(2)}"
+
+        return self.import_pattern.sub(local, source)
+
+    def allows(self, path):
+        # True if the import map leads to path; other paths are not fetched
+        if path in self._reachable:
+            return True
+        # files under a "name/" entry, e.g. "react/jsx-runtime"
+        if "?" not in path and path.startswith(self._prefixes):
+            return True
+        if not self._graph_loaded:
+            # after a restart, the imports recorded in the cache
+            self._graph_loaded = True
+            pending = list(self._roots)
+            seen = set()
+            while pending:
+                dependency = pending.pop()
+                if dependency not in seen:
+                    seen.add(dependency)
+                    pending.extend(self._cached_dependencies(dependency))
+        return path in self._reachable
+
+    def _reach(self, dependencies):
+        with self._lock:
+            self._reachable.update(dependencies)
+
+    def get(self, path):
+        # path is the esm.sh path plus query, e.g. "/react@18.2.0?dev".
+        # Returns (body, content_type, dependencies), downloading on a miss.
+        # Callers check allows(path) first.
+        body_path, meta_path = self._paths(path)
+        if not os.path.exists(meta_path):
+            with self._locks[hash(path) % LOCK_STRIPES]:
+                if not os.path.exists(meta_path):
+                    self._download(path, body_path, meta_path)
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+        self._reach(meta["dependencies"])
+        return body, meta["content_type"], meta["dependencies"]
+
+    def _download(self, path, body_path, meta_path):
+        resp = httpx.get(self.origin + path, headers=FETCH_HEADERS, follow_redirects=True, timeout=30)
+        resp.raise_for_status()
+        content_type = resp.headers.get("content-type", "application/javascript")
+        body = resp.content
+        dependencies = []
+        if "javascript" in content_type or "typescript" in content_type:
+            source = self._rewrite(resp.text)
+            dependencies = sorted({m.group(3)[len(self.prefix):] for m in self.import_pattern.finditer(source)
+                                   if m.group(3).startswith(self.prefix + "/")})
+            body = source.encode("utf-8")
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        # write the body first; the metadata file marks the entry complete
+        with open(body_path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(body_path + ".tmp", body_path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"url": self.origin + path, "content_type": content_type, "dependencies": dependencies}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        logger.info("Cached %s%s (%d bytes)", self.origin, path, len(body))
+
+    def _cached_dependencies(self, path):
+        if path not in self._dependencies:
+            _, meta_path = self._paths(path)
+            try:
+                with open(meta_path, encoding="utf-8") as f:
+                    self._dependencies[path] = json.load(f)["dependencies"]
+            except OSError:
+                # not cached yet; look again next time
+                return []
+            self._reach(self._dependencies[path])
+        return self._dependencies[path]
+
+    def preload_urls(self, urls, limit=64):
+        # Transitive dependencies of the given local module URLs, taken from
+        # the cache only, so the sandbox can request them all up front
+        # instead of discovering them one import level at a time.
+        found = {}
+        pending = []
+        for url in urls:
+            parts = urlsplit(url)
+            if parts.path.startswith(self.prefix + "/"):
+                base_url = url[:url.index(parts.path)]
+                pending.append((base_url, parts.path[len(self.prefix):] + (f"?{parts.query}" if parts.query else "")))
+        roots = {path for _, path in pending}
+        while pending and len(found) < limit:
+            base_url, path = pending.pop(0)
+            for dependency in self._cached_dependencies(path):
+                if dependency not in found and dependency not in roots:
+                    found[dependency] = base_url + self.prefix + dependency
+                    pending.append((base_url, dependency))
+        return list(found.values())[:limit]
+
+    def prefetch(self, imports, max_workers=4):
+        # Downloads every pinned module and its static imports. Prefix
+        # entries such as "react/" are fetched lazily when first requested.
+        roots = [urlsplit(url) for url in imports.values()
+                 if url.startswith(self.origin + "/") and not url.endswith("/")]
+        seen = set()
+        pending = [p.path + (f"?{p.query}" if p.query else "") for p in roots]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while pending:
+                batch = [path for path in pending if path not in seen]
+                seen.update(batch)
+                pending = []
+                for path, result in zip(batch, pool.map(self._try_get, batch)):
+                    if result is not None:
+                        pending.extend(result[2])
+        logger.info("ESM cache warm: %d modules", len(seen))
+
+    def _try_get(self, path):
+        try:
+            return self.get(path)
+        except Exception as e:
+            logger.warning("Could not cache %s%s: %s", self.origin, path, e)
+            return None
+
+    def prefetch_in_background(self, imports):
+        threading.Thread(target=self.prefetch, args=(imports, ), daemon=True).start()
+
+    def route(self):
+        def serve(request):
+            path = "/" + request.path_params["path"]
+            if request.url.query:
+                path += "?" + request.url.query
+            if not self.allows(path):
+                return Response(status_code=404)
+            try:
+                body, content_type, _ = self.get(path)
+            except httpx.HTTPStatusError as e:
+                return Response(status_code=e.response.status_code)
+            except httpx.HTTPError:
+                return Response(status_code=502)
+            return Response(body,
+                            media_type=content_type,
+                            headers={
+                                "Cache-Control": IMMUTABLE,
+                                "Access-Control-Allow-Origin": "*",
+                            })
+
+        return Route(self.prefix + "/{path:path}", serve, methods=["GET"])
@@ -0,0 +1,207 @@
+import os
+import re
+import csv
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from core import MODEL, SYSTEM_PROMPTS, call_openrouter_chat, extract_assistant_content, get_generated_files, \
+    prompt_variant
+
+
+# Headless bulk generation without the UI: prompts from a JSONL or CSV file,
+# one directory of extracted files per prompt.
+#
+#   python batch.py prompts.csv --output sites --concurrency 8
+#
+# Each JSONL line is an object (or a bare string) and each CSV row has a
+# header; "prompt" is required, "id" names the output directory and
+# "system_prompt" overrides the default. Lines that cannot be used are
+# logged with their line number and skipped, and a repeated id gets the
+# prompt number appended instead of overwriting the earlier output. The
+# input is read lazily and at most 2 x concurrency prompts are in flight,
+# so memory only grows by the output names. Progress is checkpointed, so a
+# rerun skips finished prompts; failed prompts go to failures.jsonl, which
+# can be moved and passed back as the input to retry them.
+
+logger = logging.getLogger("batch")
+
+REPORT_INTERVAL = 10 # seconds between progress lines
+
+
+def _jsonl_rows(f):
+    # (line number, parsed row) for every non-blank line; None for a line
+    # that is not valid JSON
+    for number, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping line %d, invalid JSON: %s", number, e)
+            yield number, None
+
+
+def read_prompts(path):
+    # yields (index, record) without loading the file, where index counts
+    # the non-blank lines; record is None for a line without a usable
+    # prompt, which is logged with its line number
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            reader = csv.DictReader(f)
+            rows = ((reader.line_num, row) for row in reader)
+        else:
+            rows = _jsonl_rows(f)
+        for index, (number, row) in enumerate(rows):
+            record = {"prompt": row} if isinstance(row, str) else row
+            if isinstance(record, dict):
+                prompt = record.get("prompt")
+                if not isinstance(prompt, str) or not prompt.strip():
+                    logger.warning("Skipping line %d without a prompt", number)
+                    record = None
+            elif record is not None:
+                logger.warning("Skipping line %d, expected an object or a string, got %s", number,
+                               type(record).__name__)
+                record = None
+            yield index, record
+
+
+class Checkpoint:
+    # Finished line indices as a watermark (every index below `next` is
+    # done) plus the few finished out of order, so the file stays small.
+
+    def __init__(self, path):
+        self.path = path
+        self.next = 0
+        self.done = set()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.next = data["next"]
+            self.done = set(data["done"])
+
+    def is_done(self, index):
+        return index < self.next or index in self.done
+
+    def mark(self, index):
+        self.done.add(index)
+        while self.next in self.done:
+            self.done.remove(self.next)
+            self.next += 1
+        if self.path:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"next": self.next, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+
+def artifact_name(index, record):
+    name = re.sub(r"[^\w.-]+", "-", str(record.get("id") or "")).strip("-.")
+    return name or f"{index + 1:06d}"
+
+
+def generate_artifact(prompt, system_prompt=None, model=MODEL):
+    # the same messages as the first turn of a UI session
+    messages = [
+        {"role": "system", "content": system_prompt or SYSTEM_PROMPTS[prompt_variant(prompt, {"history": []})]},
+        {"role": "user", "content": prompt},
+    ]
+    content = extract_assistant_content(call_openrouter_chat(messages, model=model))
+    return content, get_generated_files(content)
+
+
+def write_artifact(directory, content, files):
+    os.makedirs(directory, exist_ok=True)
+    for filename, code in files.items():
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            f.write(code)
+    with open(os.path.join(directory, "response.md"), "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def run_batch(input_path, output_dir, concurrency=4, checkpoint_path=None, model=MODEL, report=None):
+    # Generates every prompt in input_path into output_dir and returns the
+    # totals; report(stats) is called every REPORT_INTERVAL seconds.
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint = Checkpoint(checkpoint_path or os.path.join(output_dir, ".checkpoint.json"))
+    failures_path = os.path.join(output_dir, "failures.jsonl")
+    if os.path.abspath(input_path) == os.path.abspath(failures_path):
+        raise ValueError(f"Move {failures_path} elsewhere before retrying it, failures are appended to it")
+    stats = {"done": 0, "failed": 0, "skipped": 0, "elapsed_s": 0.0, "per_minute": 0.0}
+    start = last_report = time.perf_counter()
+
+    def run(name, record):
+        content, files = generate_artifact(record["prompt"], record.get("system_prompt"), model)
+        write_artifact(os.path.join(output_dir, name), content, files)
+
+    def collect(finished):
+        for future in finished:
+            index, record = pending.pop(future)
+            try:
+                future.result()
+                stats["done"] += 1
+            except Exception as e:
+                logger.warning("Prompt %d failed: %s", index + 1, e)
+                stats["failed"] += 1
+                with open(failures_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**record, "error": str(e)}) + "\n")
+            checkpoint.mark(index)
+
+    def update():
+        nonlocal last_report
+        elapsed = time.perf_counter() - start
+        stats["elapsed_s"] = round(elapsed, 2)
+        stats["per_minute"] = round((stats["done"] + stats["failed"]) / elapsed * 60, 1)
+        if report is not None and time.perf_counter() - last_report >= REPORT_INTERVAL:
+            last_report = time.perf_counter()
+            report(dict(stats))
+
+    pending = {}
+    names = set()
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="batch") as pool:
+        for index, record in read_prompts(input_path):
+            if record is not None:
+                # finished prompts are named too, so a rerun picks the same
+                # directories
+                name = artifact_name(index, record)
+                if name in names:
+                    name = f"{name}-{index + 1:06d}"
+                    logger.warning("Prompt %d repeats id %r, writing it to %s", index + 1, record.get("id"), name)
+                names.add(name)
+            if checkpoint.is_done(index):
+                stats["skipped"] += 1
+                continue
+            if record is None:
+                # nothing to generate, but the watermark has to move past it
+                stats["skipped"] += 1
+                checkpoint.mark(index)
+                continue
+            while len(pending) >= concurrency * 2:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+                update()
+            pending[pool.submit(run, name, record)] = (index, record)
+        while pending:
+            collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            update()
+    update()
+    return stats
+
+
+def print_stats(stats):
+    print(f"{stats['done']} done, {stats['failed']} failed, {stats['skipped']} skipped in {stats['elapsed_s']}s "
+          f"({stats['per_minute']} prompts/min)", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate one artifact per prompt in a JSONL or CSV file")
+    parser.add_argument("input", help="prompts, .jsonl or .csv")
+    parser.add_argument("--output", default="batch_output", help="directory for the generated artifacts")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--checkpoint", help="checkpoint file, default <output>/.checkpoint.json")
+    parser.add_argument("--model", default=MODEL)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    print_stats(run_batch(args.input, args.output, args.concurrency, args.checkpoint, args.model, report=print_stats))
@@ -0,0 +1,90 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openrouter import start_mock_server  # noqa: E402
+import core  # noqa: E402
+
+
+# Threads vs asyncio against a local stub endpoint:
+#
+#   python benchmarks/bench_client.py --requests 500 --concurrency 200 --latency 0.5
+#
+# Each side first sends `concurrency` untimed requests, so both are
+# measured with warm keep-alive pools rather than timing connection setup.
+
+MESSAGES = [{"role": "user", "content": "benchmark"}]
+
+
+def serve_stub(latency, conn):
+    # the stub runs in its own process so it does not compete for the GIL
+    server, endpoint = start_mock_server(latency=latency)
+    conn.send(endpoint)
+    multiprocessing.Event().wait()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(name, latencies, elapsed):
+    print(f"{name:>8}: {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.1f} ms")
+
+
+def run_threads(endpoint, total, concurrency):
+    def one(_):
+        start = time.perf_counter()
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="bench")
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(concurrency)))
+        start = time.perf_counter()
+        latencies = list(pool.map(one, range(total)))
+        return latencies, time.perf_counter() - start
+
+
+async def run_async(endpoint, total, concurrency):
+    limit = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with limit:
+            start = time.perf_counter()
+            await core.async_call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="bench")
+            return time.perf_counter() - start
+
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    await core.aclose_async_clients()
+    return latencies, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Threads vs asyncio OpenRouter client benchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub server latency in seconds")
+    args = parser.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    stub = multiprocessing.Process(target=serve_stub, args=(args.latency, child_conn), daemon=True)
+    stub.start()
+    endpoint = parent_conn.recv()
+    try:
+        print(f"{args.requests} requests, concurrency {args.concurrency}, "
+              f"stub latency {args.latency * 1000:.0f} ms")
+        report("threads", *run_threads(endpoint, args.requests, args.concurrency))
+        report("async", *asyncio.run(run_async(endpoint, args.requests, args.concurrency)))
+    finally:
+        stub.terminate()
@@ -0,0 +1,66 @@
+import os
+import re
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import FenceTokenizer, get_generated_files  # noqa: E402
+
+
+# Single-pass FenceTokenizer vs the previous five-regex extractor on
+# large responses:
+#
+#   python benchmarks/bench_extract.py --sizes 100 300 800
+
+
+def legacy_get_generated_files(text):
+    patterns = {
+        'html': r'```html\n(.+?)\n```',
+        'jsx': r'```jsx\n(.+?)\n```',
+        'tsx': r'```tsx\n(.+?)\n```',
+        'ts': r'```ts\n(.+?)\n```',
+        'js': r'```js\n(.+?)\n```',
+    }
+    result = {}
+    for ext, pattern in patterns.items():
+        matches = re.findall(pattern, text, re.DOTALL)
+        if matches:
+            content = '\n'.join(matches).strip()
+            filename = "index." + ("tsx" if ext in ["tsx", "jsx"] else ext)
+            result[filename] = content
+    if len(result) == 0:
+        result["index.html"] = text.strip()
+    return result
+
+
+def make_response(kb):
+    line = '    <div class="card p-4 shadow rounded-lg">Item with `inline` code</div>\n'
+    body = line * (kb * 1024 // len(line))
+    return ("Here is the page you asked for.\n\n```html\n<!DOCTYPE html>\n<html>\n<body>\n"
+            + body + "</body>\n</html>\n```\n\nAnd a helper script:\n\n```js\nconsole.log('ready')\n```\n")
+
+
+def streamed(text, chunk=64):
+    tokenizer = FenceTokenizer()
+    for i in range(0, len(text), chunk):
+        tokenizer.feed(text[i:i + chunk])
+    return tokenizer.finish().files()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Code block extraction benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 300, 800], help="response sizes in KB")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for kb in args.sizes:
+        text = make_response(kb)
+        assert get_generated_files(text) == legacy_get_generated_files(text)
+        print(f"{kb:>5} KB", end="")
+        for name, fn in (("regex x5", legacy_get_generated_files), ("tokenizer", get_generated_files),
+                         ("streamed", streamed)):
+            seconds = min(timeit.repeat(lambda: fn(text), number=1, repeat=args.repeat))
+            print(f"  {name} {seconds * 1000:7.2f} ms", end="")
+        print()
@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache  # noqa: E402
+
+
+# Lookup latency of the near-duplicate prompt index once it is full; every
+# first-turn generation pays one lookup:
+#
+#   python benchmarks/bench_semantic_cache.py --entries 10000 100000
+
+SUBJECTS = ["todo app", "landing page", "dashboard", "portfolio", "calculator", "chat window", "weather widget",
+            "music player", "kanban board", "pricing table", "login form", "blog", "snake game", "photo gallery"]
+DETAILS = ["purple", "dark mode", "glassmorphism", "minimal", "retro", "animated", "responsive", "for a coffee shop",
+           "for a dentist", "with charts", "with a sidebar", "with drag and drop", "with tailwind", "pastel colors",
+           "with a timer", "with dark neon", "for kids", "with a map", "with a search bar", "with tabs"]
+
+
+def synthetic_prompt(rng):
+    return f"Make a {rng.choice(SUBJECTS)} {' '.join(rng.sample(DETAILS, 3))} #{rng.randrange(10 ** 6)}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Semantic cache benchmark")
+    parser.add_argument("--entries", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    for entries in args.entries:
+        cache = SemanticCache(max_entries=entries)
+        start = time.perf_counter()
+        for i in range(entries):
+            cache.add(synthetic_prompt(rng), i)
+        insert_us = (time.perf_counter() - start) / entries * 1e6
+        samples = []
+        for _ in range(args.lookups):
+            prompt = synthetic_prompt(rng)
+            start = time.perf_counter()
+            cache.lookup(prompt)
+            samples.append(time.perf_counter() - start)
+        samples.sort()
+        print(f"{entries:>7} entries: insert {insert_us:6.1f} us, "
+              f"lookup p50 {statistics.median(samples) * 1000:6.2f} ms, "
+              f"p95 {samples[int(len(samples) * 0.95)] * 1000:6.2f} ms, "
+              f"matrix {cache.matrix.nbytes / 2 ** 20:.0f} MB", flush=True)
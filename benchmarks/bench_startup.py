@@ -0,0 +1,78 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+from load_test import ROOT, git_revision
+
+
+# Cold start: import times of the generation core and the app, building the
+# UI, and the time from `python app.py` to the first served page. Each
+# number is the median over fresh interpreters:
+#
+#   python benchmarks/bench_startup.py --repeat 5 --output results/startup.json
+
+ENV = {**os.environ, "KEY": "bench", "SESSION_STORE": "memory://", "ESM_SELF_HOST": "0"}
+
+STEPS = {
+    "import_core_s": "import core",
+    "import_app_s": "import app",
+    "create_app_s": "import app; app.create_app()",
+}
+
+
+def time_code(code):
+    script = f"import time; start = time.perf_counter(); {code}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=ENV, capture_output=True, text=True,
+                            check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_first_request(timeout=120):
+    # from starting the process to the first 200 on the index page
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env={**ENV, "GRADIO_SERVER_PORT": str(port)},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"app.py did not serve a page within {timeout}s")
+    finally:
+        process.kill()
+        process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-serve", action="store_true", help="only measure imports")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {"revision": git_revision()}
+    steps = dict(STEPS) if args.skip_serve else {**STEPS, "first_request_s": None}
+    for name, code in steps.items():
+        samples = [time_code(code) if code else time_first_request() for _ in range(args.repeat)]
+        results[name] = round(statistics.median(samples), 3)
+        print(f"{name:>16}: {results[name]:.3f}s (min {min(samples):.3f}s, max {max(samples):.3f}s)", flush=True)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,33 @@
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import get_generated_files, react_imports  # noqa: E402
+from mock_openrouter import CANNED_ARTIFACTS, pad_response  # noqa: E402
+from validation import validate_files  # noqa: E402
+
+
+# Time the artifact validator takes per artifact; it runs on every
+# generation, so it should stay within a few milliseconds:
+#
+#   python benchmarks/bench_validate.py --sizes 5 20 50
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Artifact validation benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50], help="artifact sizes in KB")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    for kb in args.sizes:
+        print(f"{kb:>5} KB", end="")
+        for name, response in CANNED_ARTIFACTS.items():
+            files = get_generated_files(pad_response(response, kb * 1024))
+            errors, _ = validate_files(files, react_imports)
+            assert not errors, errors
+            seconds = min(timeit.repeat(lambda: validate_files(files, react_imports), number=1, repeat=args.repeat))
+            print(f"  {name} {seconds * 1000:7.2f} ms", end="")
+        print()
@@ -0,0 +1,312 @@
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import platform
+import resource
+import subprocess
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openrouter import CANNED_ARTIFACTS, start_mock_server  # noqa: E402
+
+
+# Offline load test: N simulated users against the mock OpenRouter server,
+# either calling GradioEvents.generate_code directly or going through the
+# whole queued Submit chain of a running app, the way the browser does.
+#
+#   python benchmarks/load_test.py --mode generate --users 50 --turns 3
+#   python benchmarks/load_test.py --mode queue --users 50 --latency 0.5 --chunk-delay 0.01
+#   python benchmarks/load_test.py --compare results/before.json results/after.json
+#
+# Results are written as JSON (--output) so runs can be compared.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve_mock(options, conn):
+    # the mock runs in its own process so it does not compete for the GIL
+    server, endpoint = start_mock_server(**options)
+    conn.send(endpoint)
+    multiprocessing.Event().wait()
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def summarize(samples):
+    summary = {"count": len(samples)}
+    for p in (50, 95, 99):
+        value = percentile(samples, p)
+        summary[f"p{p}_ms"] = None if value is None else round(value * 1000, 1)
+    return summary
+
+
+def prompt(user, turn):
+    # distinct prompts, so the response cache does not short-circuit the run
+    return f"Load test user {user} turn {turn}: build a landing page"
+
+
+# ---------- generate_code ----------
+async def run_generate(app, users, turns):
+    latencies, first_updates, errors = [], [], 0
+
+    async def user(index):
+        nonlocal errors
+        state = {"system_prompt": "", "history": []}
+        for turn in range(turns):
+            start = time.perf_counter()
+            first = None
+            last = None
+            value = None
+            async for update in app.GradioEvents.generate_code(prompt(index, turn), "", state):
+                # the first update only shows the spinner
+                if first is None and last is not None:
+                    first = time.perf_counter() - start
+                last = update
+                value = update.get(app.output, {}).get("value", value)
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                first_updates.append(first)
+            if not value or str(value).startswith("Error contacting"):
+                errors += 1
+
+    await asyncio.gather(*(user(i) for i in range(users)))
+    from core import aclose_async_clients
+    await aclose_async_clients()
+    return latencies, first_updates, errors, 0, []
+
+
+# ---------- queued Gradio chain ----------
+def submit_chain(app):
+    # The dependencies the browser runs for one click on Submit: the
+    # listeners on the button, each followed by its .then() chain.
+    dependencies = app.demo.get_config_file()["dependencies"]
+    button = app.submit_btn._id
+    chain = []
+    for dependency in dependencies:
+        if (button, "click") in [tuple(target) for target in dependency["targets"]]:
+            chain.append(dependency)
+            follow = dependency["id"]
+            while True:
+                nxt = next((d for d in dependencies if d.get("trigger_after") == follow), None)
+                if nxt is None:
+                    break
+                chain.append(nxt)
+                follow = nxt["id"]
+    return chain
+
+
+async def run_queue(app, users, turns, port):
+    import httpx
+
+    base = f"http://127.0.0.1:{port}/gradio_api"
+    chain = submit_chain(app)
+    latencies, first_updates, errors, rejected = [], [], 0, 0
+    # (bytes, messages) the browser receives per generate_code event
+    event_sizes = []
+    limits = httpx.Limits(max_connections=users * 2, max_keepalive_connections=users * 2)
+
+    async def run_event(client, dependency, session_hash, text):
+        values = {app.input._id: text, app.system_prompt_input._id: "", app.force_regenerate_checkbox._id: False}
+        body = {
+            "data": [values.get(component) for component in dependency["inputs"]],
+            "fn_index": dependency["id"],
+            "session_hash": session_hash,
+            "event_data": None,
+            "trigger_id": app.submit_btn._id,
+        }
+        if not dependency["queue"]:
+            resp = await client.post(f"{base}/run/predict", json=body)
+            return resp.status_code == 200, None
+        resp = await client.post(f"{base}/queue/join", json=body)
+        if resp.status_code != 200:
+            return None, None
+        event_id = resp.json()["event_id"]
+        start = time.perf_counter()
+        first = None
+        size = [0, 0]
+        async with client.stream("GET", f"{base}/queue/data", params={"session_hash": session_hash}) as stream:
+            async for line in stream.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                message = json.loads(line[len("data:"):])
+                if message.get("event_id") != event_id:
+                    continue
+                size[0] += len(line.encode("utf-8"))
+                size[1] += 1
+                if message["msg"] == "process_generating" and first is None:
+                    first = time.perf_counter() - start
+                if message["msg"] == "process_completed":
+                    if dependency["api_name"] == "generate_code":
+                        event_sizes.append(tuple(size))
+                    return message.get("success", False), first
+        return False, first
+
+    async def user(index, client):
+        nonlocal errors, rejected
+        session_hash = uuid.uuid4().hex
+        for turn in range(turns):
+            start = time.perf_counter()
+            first = None
+            ok = True
+            for dependency in chain:
+                event_start = time.perf_counter()
+                success, event_first = await run_event(client, dependency, session_hash, prompt(index, turn))
+                if success is None:
+                    rejected += 1
+                    ok = False
+                    break
+                ok = ok and success
+                if dependency["api_name"] == "generate_code" and event_first is not None:
+                    first = event_start - start + event_first
+            latencies.append(time.perf_counter() - start)
+            if first is not None:
+                first_updates.append(first)
+            if not ok:
+                errors += 1
+
+    async with httpx.AsyncClient(timeout=300, limits=limits) as client:
+        await asyncio.gather(*(user(i, client) for i in range(users)))
+    return latencies, first_updates, errors, rejected, event_sizes
+
+
+# ---------- results ----------
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(after_path, encoding="utf-8") as f:
+        after = json.load(f)
+    print(f"{before_path} ({before.get('revision')}) -> {after_path} ({after.get('revision')})")
+    rows = [("throughput_rps", "throughput")] + [(f"latency.p{p}_ms", f"p{p} latency ms") for p in (50, 95, 99)]
+    rows += [(f"first_update.p{p}_ms", f"p{p} first update ms") for p in (50, 95)] + [("peak_rss_mb", "peak RSS MB")]
+    rows += [("update_kb.p50", "p50 KB per generation"), ("update_kb.messages_p50", "p50 messages")]
+    for key, label in rows:
+        old, new = before, after
+        for part in key.split("."):
+            old, new = (old or {}).get(part), (new or {}).get(part)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ""
+        print(f"{label:>20}: {old!s:>10} -> {new!s:>10} {change}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline load test against a mock OpenRouter server")
+    parser.add_argument("--mode", choices=["generate", "queue"], default="generate",
+                        help="call generate_code directly, or drive the queued Submit chain over HTTP")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="generations per user, as one conversation")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock latency before the first byte")
+    parser.add_argument("--chunk-size", type=int, default=64, help="characters per SSE delta")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="seconds between SSE deltas")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of mock requests that fail")
+    parser.add_argument("--response-size", type=int, default=4000, help="characters per canned artifact")
+    parser.add_argument("--artifacts", default="html,react", help="canned artifacts to replay")
+    parser.add_argument("--no-stream", action="store_true", help="use non-streaming completions")
+    parser.add_argument("--concurrency-limit", type=int, default=100, help="queue concurrency (queue mode)")
+    parser.add_argument("--max-size", type=int, default=100, help="queue size (queue mode)")
+    parser.add_argument("--port", type=int, default=7899, help="app port (queue mode)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    mock_options = {
+        "response": [CANNED_ARTIFACTS[name] for name in args.artifacts.split(",")],
+        "response_size": args.response_size,
+        "latency": args.latency,
+        "chunk_size": args.chunk_size,
+        "chunk_delay": args.chunk_delay,
+        "error_rate": args.error_rate,
+    }
+    parent_conn, child_conn = multiprocessing.Pipe()
+    mock = multiprocessing.Process(target=serve_mock, args=(mock_options, child_conn), daemon=True)
+    mock.start()
+    endpoint = parent_conn.recv()
+
+    # the app reads its settings at import time
+    os.environ.update(OPENROUTER_ENDPOINT=endpoint, KEY="load-test", OPENROUTER_STREAM="0" if args.no_stream else "1")
+    os.environ.setdefault("SESSION_STORE", "memory://")
+    os.environ.setdefault("ESM_SELF_HOST", "0")
+    import app  # noqa: E402
+    # builds the UI; the handlers update its components
+    app.demo
+
+    rss_before = peak_rss_mb()
+    try:
+        start = time.perf_counter()
+        if args.mode == "generate":
+            results = asyncio.run(run_generate(app, args.users, args.turns))
+        else:
+            app.demo.queue(default_concurrency_limit=args.concurrency_limit, max_size=args.max_size).launch(
+                server_port=args.port, prevent_thread_lock=True, quiet=True, ssr_mode=False,
+                app_kwargs={"routes": app.extra_routes})
+            start = time.perf_counter()
+            results = asyncio.run(run_queue(app, args.users, args.turns, args.port))
+        elapsed = time.perf_counter() - start
+    finally:
+        mock.terminate()
+    latencies, first_updates, errors, rejected, event_sizes = results
+
+    report = {
+        "mode": args.mode,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "generations": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency": summarize(latencies),
+        "first_update": summarize(first_updates),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "rss_at_start_mb": round(rss_before, 1),
+    }
+    if event_sizes:
+        report["update_kb"] = {
+            "p50": round(percentile([b for b, _ in event_sizes], 50) / 1024, 1),
+            "p95": round(percentile([b for b, _ in event_sizes], 95) / 1024, 1),
+            "messages_p50": percentile([m for _, m in event_sizes], 50),
+        }
+    print(f"{args.mode}: {args.users} users x {args.turns} turns, {report['generations']} generations "
+          f"in {elapsed:.2f}s ({report['throughput_rps']} gen/s), {errors} errors, {rejected} rejected")
+    print(f"  latency      p50 {report['latency']['p50_ms']} ms  p95 {report['latency']['p95_ms']} ms  "
+          f"p99 {report['latency']['p99_ms']} ms")
+    print(f"  first update p50 {report['first_update']['p50_ms']} ms  p95 {report['first_update']['p95_ms']} ms")
+    if event_sizes:
+        print(f"  sent to the browser per generation p50 {report['update_kb']['p50']} KB  "
+              f"p95 {report['update_kb']['p95']} KB in {report['update_kb']['messages_p50']} messages")
+    print(f"  peak RSS {report['peak_rss_mb']} MB (at start {report['rss_at_start_mb']} MB)")
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"  results written to {args.output}")
+    if args.mode == "queue":
+        os._exit(0)
@@ -0,0 +1,906 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import itertools
+import contextlib
+import collections
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from metrics import REGISTRY
+from patches import PatchError, apply_edits, parse_edits
+from validation import validate_files
+from resilience import CircuitBreaker, TokenBucket, backoff_delay, parse_retry_after
+from key_pool import REJECTED_STATUS, KeyPool
+
+
+# Generation core shared by the Gradio app and the headless tools: prompts,
+# the OpenRouter client, streaming and artifact extraction. It does not
+# import gradio, so batch jobs, benchmarks and tests start quickly; the UI
+# lives in app.py.
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# ---------- CONFIG ----------
+API_KEY=os.getenv("KEY") # <-- set this env var
+API_KEYS = [k.strip() for k in os.getenv("KEYS", "").split(",") if k.strip()] or ([API_KEY] if API_KEY else []) # several keys, comma separated, to spread the load
+KEY_QUARANTINE = float(os.getenv("OPENROUTER_KEY_QUARANTINE", "30")) # seconds a throttled key is skipped, doubled while it keeps being throttled
+MODEL="z-ai/glm-4.5-air:free" # change if you have a specific model on OpenRouter
+TEMPERATURE = 0.9
+ENDPOINT = os.getenv("OPENROUTER_ENDPOINT", "https://openrouter.ai/api/v1/chat/completions")
+STREAM = os.getenv("OPENROUTER_STREAM", "1") != "0" # set to 0 to fall back to a single blocking POST
+POOL_SIZE = int(os.getenv("OPENROUTER_POOL_SIZE", "512")) # keep-alive connections shared by all sessions, opened on demand
+POOL_SHARD_SIZE = min(32, int(os.getenv("OPENROUTER_POOL_SHARD_SIZE", "8"))) # connections per httpx pool shard, at most 32
+MAX_PER_HOST = int(os.getenv("OPENROUTER_MAX_PER_HOST", "0")) # concurrent requests per upstream host, 0 = no cap
+MAX_RETRIES = int(os.getenv("OPENROUTER_MAX_RETRIES", "3")) # retries on 429/5xx/timeouts
+BREAKER_THRESHOLD = int(os.getenv("OPENROUTER_BREAKER_THRESHOLD", "5")) # consecutive failures that open the circuit
+BREAKER_RESET = float(os.getenv("OPENROUTER_BREAKER_RESET", "30")) # seconds before a trial request is let through
+RATE_LIMIT = float(os.getenv("OPENROUTER_RATE_LIMIT", "0")) # requests per second for all sessions, 0 = unlimited
+FANOUT_MODELS = [m.strip() for m in os.getenv("OPENROUTER_FANOUT_MODELS", "").split(",") if m.strip()] # race these models instead of MODEL
+FANOUT_MODE = os.getenv("OPENROUTER_FANOUT_MODE", "first") # "first" valid artifact wins, or "best" of N
+FANOUT_DEADLINE = float(os.getenv("OPENROUTER_FANOUT_DEADLINE", "45")) # seconds to wait for best-of-N
+PROMPT_CACHE_CONTROL = os.getenv("PROMPT_CACHE_CONTROL", "auto") # cache_control markers on the system prompt: auto, 1 or 0
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", "2")) # validator threads, 0 = validate in the event loop
+
+
+SYSTEM_PROMPT = """You are an expert on frontend design, you will always respond to web design tasks.
+Your task is to create a website according to the user's request using either native HTML or React framework.
+When choosing implementation framework, you should follow these rules:
+[Implementation Rules]
+1. You should use HTML by default.
+2. When the user requires HTML, choose HTML to implement the request.
+3. If the user requires a library that is not installed in current react environment, please use HTML and tell the user the reason.
+4. After choosing the implementation framework, please follow the corresponding instruction.
+
+
+[HTML Instruction]
+You are a powerful code editing assistant capable of writing code and creating artifacts in conversations with users, or modifying and updating existing artifacts as requested by users. 
+All code is written in a single code block to form a complete code file for display, without separating HTML and JavaScript code. An artifact refers to a runnable complete code snippet, you prefer to integrate and output such complete runnable code rather than breaking it down into several code blocks. For certain types of code, they can render graphical interfaces in a UI window. After generation, please check the code execution again to ensure there are no errors in the output.
+Do not use localStorage as it is not supported by current environment.
+Output only the HTML, without any additional descriptive text.
+use cdn links for external libraries.
+
+
+[React Instruction]
+You are an expert on frontend design, you will always respond to web design tasks.
+Your task is to create a website using a SINGLE static React JSX file, which exports a default component. This code will go directly into the App.jsx file and will be used to render the website.
+
+## Common Design Principles
+
+Regardless of the technology used, follow these principles for all designs:
+
+### General Design Guidelines:
+- Create a stunning, contemporary, and highly functional website based on the user's request
+- Implement a cohesive design language throughout the entire website/application
+- Choose a carefully selected, harmonious color palette that enhances the overall aesthetic
+- Create a clear visual hierarchy with proper typography to improve readability
+- Incorporate subtle animations and transitions to add polish and improve user experience
+- Ensure proper spacing and alignment using appropriate layout techniques
+- Implement responsive design principles to ensure the website looks great on all device sizes
+- Use modern UI patterns like cards, gradients, and subtle shadows to add depth and visual interest
+- Incorporate whitespace effectively to create a clean, uncluttered design
+- For images, use placeholder images from services like https://placehold.co/     
+    
+## React Design Guidelines
+
+### Implementation Requirements:
+- Ensure the React app is a single page application
+- DO NOT include any external libraries, frameworks, or dependencies outside of what is already installed
+- Utilize TailwindCSS for styling, focusing on creating a visually appealing and responsive layout
+- Avoid using arbitrary values (e.g., `h-[600px]`). Stick to Tailwind's predefined classes for consistency
+- Use mock data instead of making HTTP requests or API calls to external services
+- Utilize Tailwind's typography classes to create a clear visual hierarchy and improve readability
+- Ensure proper spacing and alignment using Tailwind's margin, padding, and flexbox/grid classes
+- Do not use localStorage as it is not supported by current environment.
+
+### Installed Libraries:
+You can use these installed libraries if required.
+- **lucide-react**: Lightweight SVG icon library with 1000+ icons. Import as `import { IconName } from "lucide-react"`. Perfect for buttons, navigation, status indicators, and decorative elements.
+- **recharts**: Declarative charting library built on D3. Import components like `import { LineChart, BarChart } from "recharts"`. Use for data visualization, analytics dashboards, and statistical displays.
+- **framer-motion**: Production-ready motion library for React. Import as `import { motion } from "framer-motion"`. Use for animations, page transitions, hover effects, and interactive micro-interactions.
+- **p5.js** : JavaScript library for creative coding and generative art. Usage: import p5 from "p5". Create interactive visuals, animations, sound-driven experiences, and artistic simulations.
+- **three, @react-three/fiber, @react-three/drei**: 3D graphics library with React renderer and helpers. Import as `import { Canvas } from "@react-three/fiber"` and `import { OrbitControls } from "@react-three/drei"`. Use for 3D scenes, visualizations, and immersive experiences.
+
+Remember to only return code for the App.jsx file and nothing else. The resulting application should be visually impressive, highly functional, and something users would be proud to showcase.
+"""
+
+# Assembled once, so every request starts with a byte-identical prefix
+# that upstream prompt caching can reuse. React is used when asked for
+# and kept for follow-ups on a React artifact.
+SYSTEM_PROMPTS = {
+    "html": SYSTEM_PROMPT + " always use html if user not specifies any thing make sure u dont use black as background color",
+    "react": SYSTEM_PROMPT + " the user asked for React, so use the React instruction and make sure u dont use black as background color",
+}
+REACT_REQUEST_PATTERN = re.compile(r"\breact\b|\bjsx\b|\btsx\b", re.IGNORECASE)
+REACT_ARTIFACT_PATTERN = re.compile(r"^`{3,}\s*(?:jsx|tsx)\b", re.MULTILINE)
+# providers that only cache prompts with explicit cache_control breakpoints;
+# the others on OpenRouter cache repeated prefixes automatically
+CACHE_CONTROL_MODELS = ("anthropic/", "google/gemini")
+
+# appended to follow-up requests when the conversation already has an artifact
+EDIT_PROMPT = """
+
+Apply this request as an edit to the current {filenames} from your last reply. Reply only with SEARCH/REPLACE blocks, without code fences:
+
+{filename}
+<<<<<<< SEARCH
+exact lines copied from the current file
+=======
+the new lines
+>>>>>>> REPLACE
+
+Each SEARCH section must match the current file exactly and only once; use several blocks for several changes. If the request rewrites most of the page, reply with the complete file in a code block instead."""
+
+# sent once when the finished artifact fails validation
+REPAIR_PROMPT = """The code in your last reply has these problems:
+{errors}
+
+Fix only these problems. Reply with SEARCH/REPLACE blocks against {filename} as before, or with the complete corrected file in a code block."""
+react_imports = {
+    "react": "https://esm.sh/react@18.2.0",
+    "react/": "https://esm.sh/react@18.2.0/",
+    "react-dom": "https://esm.sh/react-dom@18.2.0",
+    "react-dom/": "https://esm.sh/react-dom@18.2.0/",
+    
+    # UI and Animation Libraries
+    "lucide-react": "https://esm.sh/lucide-react@0.294.0",
+    "framer-motion": "https://esm.sh/framer-motion@10.16.4",
+    "@heroicons/react": "https://esm.sh/@heroicons/react@2.0.18",
+    "tailwind-merge": "https://esm.sh/tailwind-merge@1.14.0",
+    "class-variance-authority": "https://esm.sh/class-variance-authority@0.7.0",
+    "clsx": "https://esm.sh/clsx@2.0.0",
+    
+    # Data Visualization
+    "recharts": "https://esm.sh/recharts@2.9.0",
+    "d3": "https://esm.sh/d3@7.8.5",
+    
+    # Creative and 3D Libraries
+    "p5": "https://esm.sh/p5@1.7.0",
+    "three": "https://esm.sh/three@0.158.0",
+    "@react-three/fiber": "https://esm.sh/@react-three/fiber@8.15.11",
+    "@react-three/drei": "https://esm.sh/@react-three/drei@9.88.7",
+    
+    # Canvas and Graphics
+    "konva": "https://esm.sh/konva@9.2.3",
+    "react-konva": "https://esm.sh/react-konva@18.2.10",
+    
+    # Physics and Simulation
+    "matter-js": "https://esm.sh/matter-js@0.19.0",
+    
+    # Styling and UI Utils
+    "@tailwindcss/browser": "https://esm.sh/@tailwindcss/browser@0.4.0",
+    "tailwindcss": "https://esm.sh/tailwindcss@3.3.5",
+    "@tailwindcss/typography": "https://esm.sh/@tailwindcss/typography@0.5.10",
+    
+    # State Management
+    "zustand": "https://esm.sh/zustand@4.4.6",
+    "jotai": "https://esm.sh/jotai@2.5.1",
+    
+    # Utils and Helpers
+    "date-fns": "https://esm.sh/date-fns@2.30.0",
+    "lodash": "https://esm.sh/lodash@4.17.21",
+    "uuid": "https://esm.sh/uuid@9.0.1",
+    
+    # Form Handling
+    "react-hook-form": "https://esm.sh/react-hook-form@7.48.2",
+    "zod": "https://esm.sh/zod@3.22.4"
+}
+
+
+# ---------- UTIL ----------
+# language tags we extract, in the order the files are assembled
+FENCE_LANGUAGES = {
+    "html": "html",
+    "htm": "html",
+    "jsx": "jsx",
+    "tsx": "tsx",
+    "ts": "ts",
+    "typescript": "ts",
+    "js": "js",
+    "javascript": "js",
+    "mjs": "js",
+}
+FENCE_EXTENSIONS = ["html", "jsx", "tsx", "ts", "js"]
+
+
+class FenceTokenizer:
+    # Single-pass scanner for Markdown code fences. Text can be fed in
+    # chunks as it streams in; only complete lines are scanned, and an
+    # unterminated final block is kept once finish() is called.
+
+    def __init__(self):
+        self.blocks = []  # (lang, content) of every closed block
+        self._pending = ""  # trailing partial line
+        self._open = None  # (lang, fence length, content parts)
+
+    def feed(self, chunk):
+        text = self._pending + chunk
+        cut = text.rfind("\n") + 1
+        self._pending = text[cut:]
+        if cut:
+            self._scan(text, cut)
+        return self
+
+    def finish(self):
+        if self._pending:
+            text = self._pending + "\n"
+            self._pending = ""
+            self._scan(text, len(text))
+        if self._open is not None:
+            lang, _, parts = self._open
+            self._add_block(lang, "".join(parts))
+            self._open = None
+        return self
+
+    def files(self):
+        contents = {}
+        for lang, content in self.blocks:
+            contents.setdefault(FENCE_LANGUAGES[lang], []).append(content)
+        result = {}
+        for ext in FENCE_EXTENSIONS:
+            if ext in contents:
+                # pick canonical filename
+                filename = "index." + ("tsx" if ext in ["tsx", "jsx"] else ext)
+                result[filename] = "\n".join(contents[ext]).strip()
+        return result
+
+    def _add_block(self, lang, content):
+        content = content.rstrip("\r\n")
+        if lang in FENCE_LANGUAGES and content:
+            self.blocks.append((lang, content))
+
+    def _scan(self, text, end):
+        # text[:end] holds whole lines only; jump from one ``` to the next
+        pos = 0
+        content_start = 0
+        while True:
+            i = text.find("```", pos, end)
+            if i < 0:
+                break
+            line_start = text.rfind("\n", 0, i) + 1
+            line_end = text.find("\n", i, end)
+            pos = line_end + 1
+            if text[line_start:i].strip(" \t"):
+                # backticks in the middle of a line
+                continue
+            run = i + 3
+            while run < line_end and text[run] == "`":
+                run += 1
+            info = text[run:line_end].strip()
+            if self._open is None:
+                if "`" in info:
+                    continue
+                lang = info.split()[0].lower() if info else ""
+                self._open = (lang, run - i, [])
+                content_start = pos
+            elif not info and run - i >= self._open[1]:
+                lang, _, parts = self._open
+                parts.append(text[content_start:line_start])
+                self._add_block(lang, "".join(parts))
+                self._open = None
+        if self._open is not None and content_start < end:
+            self._open[2].append(text[content_start:end])
+
+
+def get_generated_files(text):
+    result = FenceTokenizer().feed(text).finish().files()
+    if len(result) == 0:
+        result["index.html"] = text.strip()
+    return result
+
+
+def format_artifact(files, note=""):
+    # the inverse of get_generated_files, so a patched artifact is stored
+    # in the history like a freshly generated one
+    blocks = []
+    for filename, code in files.items():
+        fence = "````" if "```" in code else "```"
+        blocks.append(f"{fence}{filename.rsplit('.', 1)[-1]}\n{code}\n{fence}")
+    return "\n\n".join(([note] if note else []) + blocks)
+
+
+def apply_edit_response(files, response, note=None):
+    # Returns what to keep for an edit request: the patched artifact, the
+    # response itself if the model answered without edits (e.g. with a
+    # complete new file), or None if its edits do not apply.
+    edits = parse_edits(response)
+    if not edits:
+        return response
+    try:
+        patched = apply_edits(files, edits)
+    except PatchError as e:
+        logger.info("Edit did not apply: %s", e)
+        return None
+    if note is None:
+        note = f"Applied {len(edits)} edit{'s' if len(edits) != 1 else ''}:"
+    return format_artifact(patched, note)
+
+
+def prompt_variant(input_value, state_value):
+    index = state_value.get("artifact_index")
+    if index is not None:
+        return "react" if REACT_ARTIFACT_PATTERN.search(state_value["history"][index]["content"]) else "html"
+    return "react" if REACT_REQUEST_PATTERN.search(input_value or "") else "html"
+
+
+def _with_cache_control(messages, model):
+    # marks the system prompt as a cache breakpoint where the provider needs it
+    if PROMPT_CACHE_CONTROL == "0" or not messages or messages[0]["role"] != "system":
+        return messages
+    if PROMPT_CACHE_CONTROL == "auto" and not model.startswith(CACHE_CONTROL_MODELS):
+        return messages
+    system = {
+        "role": "system",
+        "content": [{"type": "text", "text": messages[0]["content"], "cache_control": {"type": "ephemeral"}}],
+    }
+    return [system] + messages[1:]
+
+
+def _openrouter_request(messages, model, api_key, stream=False):
+    if not (api_key or key_pool.keys):
+        raise RuntimeError("OPENROUTER_API_KEY environment variable is not set.")
+
+    # the Authorization header is added per attempt, see _with_key
+    headers = {
+        "Content-Type": "application/json",
+    }
+    payload = {
+        "model": model,
+        "messages": _with_cache_control(messages, model),
+        # you can tune max_tokens, temperature, etc. if needed
+        # "max_tokens": 1600,
+        "temperature": TEMPERATURE,
+        # token counts, including cached prompt tokens, in the response
+        "usage": {"include": True},
+    }
+    if stream:
+        payload["stream"] = True
+    # serialized once, so the request size can be counted for free
+    body = json.dumps(payload).encode("utf-8")
+    upstream_bytes_total.inc(len(body), direction="sent")
+    return headers, body
+
+
+# ---------- METRICS ----------
+generation_stage_seconds = REGISTRY.histogram(
+    "generation_stage_seconds", "Time spent in each stage of a generation")
+generations_total = REGISTRY.counter("generations_total", "Finished generations by outcome")
+generations_active = REGISTRY.gauge("generations_active", "Generations currently running")
+upstream_responses_total = REGISTRY.counter("upstream_responses_total", "OpenRouter responses by status code")
+upstream_bytes_total = REGISTRY.counter("upstream_bytes_total", "Bytes sent to and received from OpenRouter")
+upstream_first_token_seconds = REGISTRY.histogram(
+    "upstream_first_token_seconds", "Time from sending a streamed request to its first token")
+edits_total = REGISTRY.counter("edits_total", "Follow-up requests answered with edits, by result")
+validations_total = REGISTRY.counter("validations_total", "Artifact validations by result")
+validation_check_seconds = REGISTRY.histogram(
+    "validation_check_seconds", "Time the validator spends checking one artifact",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+upstream_tokens_total = REGISTRY.counter("upstream_tokens_total", "Prompt (cached and uncached) and completion tokens reported by OpenRouter")
+tokens_total = REGISTRY.counter("tokens_total", "Estimated prompt and completion tokens")
+
+
+def _observe_stage(stage, seconds):
+    generation_stage_seconds.observe(seconds, stage=stage)
+
+
+def _decode_json(resp):
+    start = time.perf_counter()
+    upstream_bytes_total.inc(len(resp.content), direction="received")
+    data = resp.json()
+    _observe_stage("decode", time.perf_counter() - start)
+    record_usage(data.get("usage"))
+    return data
+
+
+def record_usage(usage):
+    if not usage:
+        return
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    upstream_tokens_total.inc(cached_tokens, kind="prompt_cached")
+    upstream_tokens_total.inc(prompt_tokens - cached_tokens, kind="prompt_uncached")
+    upstream_tokens_total.inc(completion_tokens, kind="completion")
+    logger.info("Usage: %d prompt tokens (%d cached), %d completion tokens", prompt_tokens, cached_tokens,
+                completion_tokens)
+
+
+# ---------- HTTP CLIENTS ----------
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# blocking callers share one keep-alive pool instead of a new TCP+TLS
+# handshake per request
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=POOL_SIZE))
+_session.mount("http://", HTTPAdapter(pool_maxsize=POOL_SIZE))
+
+# httpx clients and semaphores are bound to the event loop that created them
+_async_clients = weakref.WeakKeyDictionary()
+_host_slots = weakref.WeakKeyDictionary()
+_ssl_context = None
+
+
+def _new_async_client(size):
+    # loading the CA bundle takes ~40ms of CPU, which would block the event
+    # loop for every new shard, so all shards share one SSL context
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = httpx.create_ssl_context()
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        verify=_ssl_context,
+        limits=httpx.Limits(max_connections=size,
+                            max_keepalive_connections=size,
+                            keepalive_expiry=60),
+        timeout=httpx.Timeout(60, connect=10))
+
+
+def get_async_client():
+    # httpcore rescans every pooled connection whenever a request finishes,
+    # which is quadratic in the pool size (one client with 200 connections
+    # manages ~25 req/s), so the pool is split into small shards that are
+    # handed out round-robin and open their connections on demand
+    loop = asyncio.get_running_loop()
+    pool = _async_clients.get(loop)
+    if pool is None:
+        shard_count = max(1, -(-POOL_SIZE // POOL_SHARD_SIZE))
+        pool = _async_clients[loop] = {
+            "clients": [None] * shard_count,
+            "next": itertools.count(),
+        }
+    index = next(pool["next"]) % len(pool["clients"])
+    client = pool["clients"][index]
+    if client is None or client.is_closed:
+        client = pool["clients"][index] = _new_async_client(min(POOL_SIZE, POOL_SHARD_SIZE))
+    return client
+
+
+async def aclose_async_clients():
+    pool = _async_clients.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        for client in pool["clients"]:
+            if client is not None:
+                await client.aclose()
+
+
+def _host_slot(endpoint):
+    # an optional cap on requests per upstream host, independent of the
+    # pool size; requests over the cap wait here
+    if MAX_PER_HOST <= 0:
+        return contextlib.nullcontext()
+    slots = _host_slots.setdefault(asyncio.get_running_loop(), {})
+    host = urlsplit(endpoint).netloc
+    if host not in slots:
+        slots[host] = asyncio.Semaphore(MAX_PER_HOST)
+    return slots[host]
+
+
+# ---------- RESILIENCE ----------
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+
+rate_limiter = TokenBucket(RATE_LIMIT)
+key_pool = KeyPool(API_KEYS, quarantine=KEY_QUARANTINE)
+_circuit_breakers = {}
+REGISTRY.gauge("api_key_requests", "Requests per API key: in flight, sent, throttled (429) and rejected",
+               callback=lambda: {(("key", k["key"]), ("state", state)): k[state]
+                                 for k in key_pool.stats()
+                                 for state in ("in_flight", "requests", "throttled", "rejected")})
+REGISTRY.gauge("api_key_available_in_seconds", "Seconds until a quarantined or exhausted API key is used again",
+               callback=lambda: {(("key", k["key"]), ): k["available_in"] for k in key_pool.stats()})
+
+
+def get_circuit_breaker(endpoint):
+    host = urlsplit(endpoint).netloc
+    if host not in _circuit_breakers:
+        _circuit_breakers[host] = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_RESET)
+    return _circuit_breakers[host]
+
+
+def _record_status(breaker, status_code):
+    upstream_responses_total.inc(status=status_code)
+    # 429 and other 4xx mean the upstream is alive, only 5xx trips the breaker
+    if status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def _log_retry(attempt, reason, delay):
+    logger.warning("OpenRouter request failed (%s), retry %d/%d in %.1fs", reason, attempt + 1, MAX_RETRIES, delay)
+
+
+def _lease(api_key):
+    # an explicit api_key bypasses the pool
+    return key_pool.acquire() if api_key is None else KeyPool([api_key]).acquire()
+
+
+def _with_key(headers, key):
+    return {**headers, "Authorization": f"Bearer {key}"}
+
+
+def _should_retry(status_code, api_key):
+    # a pooled key that was rejected is parked, so another key is tried;
+    # other 4xx, e.g. 402 and 403, go back to the caller
+    if status_code == REJECTED_STATUS:
+        return api_key is None and key_pool.has_available()
+    return status_code in RETRY_STATUSES
+
+
+def _retry_delay(attempt, reason, retry_after, api_key):
+    # the throttled or rejected key is parked, so a healthy one can go at once
+    if reason in (429, REJECTED_STATUS) and api_key is None and key_pool.has_available():
+        return 0.0
+    return backoff_delay(attempt, retry_after=retry_after)
+
+
+def _send_with_retries(endpoint, send, api_key=None):
+    # send(key) makes one attempt; returns (response, key lease), and the
+    # lease is released by the caller once the response has been read
+    breaker = get_circuit_breaker(endpoint)
+    for attempt in range(MAX_RETRIES + 1):
+        trial = breaker.check()
+        retry_after = None
+        lease = None
+        try:
+            time.sleep(rate_limiter.reserve())
+            lease = _lease(api_key)
+            resp = send(lease.key)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            lease.release()
+            upstream_responses_total.inc(status="transport_error")
+            breaker.record_failure()
+            if attempt == MAX_RETRIES:
+                raise
+            reason = type(e).__name__
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            # a cancelled trial must not leave the breaker waiting for it
+            if trial:
+                breaker.abandon_trial()
+            raise
+        else:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            lease.record(resp.status_code, resp.headers, retry_after)
+            _record_status(breaker, resp.status_code)
+            if not _should_retry(resp.status_code, api_key) or attempt == MAX_RETRIES:
+                return resp, lease
+            reason = resp.status_code
+            resp.close()
+            lease.release()
+        delay = _retry_delay(attempt, reason, retry_after, api_key)
+        _log_retry(attempt, reason, delay)
+        time.sleep(delay)
+
+
+async def _async_send_with_retries(endpoint, send, api_key=None):
+    breaker = get_circuit_breaker(endpoint)
+    for attempt in range(MAX_RETRIES + 1):
+        trial = breaker.check()
+        retry_after = None
+        lease = None
+        try:
+            await asyncio.sleep(rate_limiter.reserve())
+            lease = _lease(api_key)
+            resp = await send(lease.key)
+        except httpx.TransportError as e:
+            lease.release()
+            upstream_responses_total.inc(status="transport_error")
+            breaker.record_failure()
+            if attempt == MAX_RETRIES:
+                raise
+            reason = type(e).__name__
+        except BaseException:
+            if lease is not None:
+                lease.release()
+            # a cancelled trial must not leave the breaker waiting for it
+            if trial:
+                breaker.abandon_trial()
+            raise
+        else:
+            retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+            lease.record(resp.status_code, resp.headers, retry_after)
+            _record_status(breaker, resp.status_code)
+            if not _should_retry(resp.status_code, api_key) or attempt == MAX_RETRIES:
+                return resp, lease
+            reason = resp.status_code
+            await resp.aclose()
+            lease.release()
+        delay = _retry_delay(attempt, reason, retry_after, api_key)
+        _log_retry(attempt, reason, delay)
+        await asyncio.sleep(delay)
+
+
+def call_openrouter_chat(messages, model=MODEL, endpoint=ENDPOINT, api_key=None):
+    headers, body = _openrouter_request(messages, model, api_key)
+    resp, lease = _send_with_retries(
+        endpoint, lambda key: _session.post(endpoint, headers=_with_key(headers, key), data=body, timeout=60), api_key)
+    lease.release()
+    resp.raise_for_status()
+    return _decode_json(resp)
+
+
+async def async_call_openrouter_chat(messages, model=MODEL, endpoint=ENDPOINT, api_key=None):
+    headers, body = _openrouter_request(messages, model, api_key)
+    client = get_async_client()
+    async with _host_slot(endpoint):
+        resp, lease = await _async_send_with_retries(
+            endpoint, lambda key: client.post(endpoint, headers=_with_key(headers, key), content=body), api_key)
+    lease.release()
+    resp.raise_for_status()
+    return _decode_json(resp)
+
+
+def parse_sse_line(line, usage=None):
+    # Returns the content deltas carried by one server-sent event line, or
+    # None once the stream is finished. The token counts sent with the last
+    # chunk are copied into `usage`.
+    if isinstance(line, bytes):
+        line = line.decode("utf-8")
+    line = line.strip()
+    # blank lines separate events, ":" lines are keep-alive comments
+    # such as ": OPENROUTER PROCESSING"
+    if not line.startswith("data:"):
+        return []
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    chunk = json.loads(data)
+    if chunk.get("error"):
+        error = chunk["error"]
+        raise RuntimeError(error.get("message", str(error)) if isinstance(error, dict) else str(error))
+    if usage is not None and chunk.get("usage"):
+        usage.update(chunk["usage"])
+    deltas = []
+    for choice in chunk.get("choices") or []:
+        delta = choice.get("delta") or {}
+        if delta.get("content"):
+            deltas.append(delta["content"])
+    return deltas
+
+
+def iter_sse_deltas(lines):
+    # Parses OpenRouter's server-sent events and yields the content deltas.
+    for line in lines:
+        deltas = parse_sse_line(line)
+        if deltas is None:
+            return
+        yield from deltas
+
+
+class _StreamStats:
+    # byte, decode-time and first-token accounting for one SSE stream
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.received = 0
+        self.decode_seconds = 0.0
+        self.usage = {}
+
+    def parse(self, line):
+        start = time.perf_counter()
+        self.received += len(line) + 1
+        deltas = parse_sse_line(line, self.usage)
+        self.decode_seconds += time.perf_counter() - start
+        if deltas and self.first_token is None:
+            self.first_token = start - self.start
+            upstream_first_token_seconds.observe(self.first_token)
+            logger.info("OpenRouter time to first token: %.3fs", self.first_token)
+        return deltas
+
+    def close(self):
+        upstream_bytes_total.inc(self.received, direction="received")
+        _observe_stage("decode", self.decode_seconds)
+        record_usage(self.usage)
+
+
+def stream_openrouter_chat(messages, model=MODEL, endpoint=ENDPOINT, api_key=None, status=None):
+    # status["finished"] is set once the stream ends with [DONE]; without
+    # it the connection was closed early and the response is truncated
+    headers, body = _openrouter_request(messages, model, api_key, stream=True)
+    stats = _StreamStats()
+    # (connect, read) timeout: the read timeout applies between chunks, so
+    # long generations are no longer cut off after 60s in total
+    resp, lease = _send_with_retries(
+        endpoint,
+        lambda key: _session.post(endpoint, headers=_with_key(headers, key), data=body, stream=True, timeout=(10, 60)),
+        api_key)
+    # the key counts as in flight until the stream ends
+    with resp:
+        try:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                deltas = stats.parse(line)
+                if deltas is None:
+                    if status is not None:
+                        status["finished"] = True
+                    return
+                yield from deltas
+        finally:
+            stats.close()
+            lease.release()
+
+
+async def async_stream_openrouter_chat(messages, model=MODEL, endpoint=ENDPOINT, api_key=None, status=None):
+    headers, body = _openrouter_request(messages, model, api_key, stream=True)
+    stats = _StreamStats()
+    client = get_async_client()
+    async with _host_slot(endpoint):
+        # only the request itself is retried; once deltas have been shown a
+        # dropped stream is reported as an error
+        resp, lease = await _async_send_with_retries(
+            endpoint,
+            lambda key: client.send(client.build_request("POST", endpoint, headers=_with_key(headers, key),
+                                                         content=body),
+                                    stream=True),
+            api_key)
+        try:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                deltas = stats.parse(line)
+                if deltas is None:
+                    if status is not None:
+                        status["finished"] = True
+                    return
+                for delta in deltas:
+                    yield delta
+        finally:
+            stats.close()
+            lease.release()
+            await resp.aclose()
+
+
+def extract_assistant_content(data):
+    # Attempt to extract assistant content robustly
+    assistant_content = None
+    try:
+        # Common OpenRouter shape: choices[0].message.content
+        if "choices" in data and isinstance(data["choices"], list) and len(data["choices"]) > 0:
+            choice = data["choices"][0]
+            if isinstance(choice, dict) and "message" in choice and isinstance(choice["message"], dict):
+                assistant_content = choice["message"].get("content") or choice["message"].get("text")
+            # fallback: direct 'text' or 'content' fields
+            if not assistant_content:
+                assistant_content = choice.get("text") or choice.get("content")
+        # final fallback: top-level 'text' or 'generated_text'
+        if not assistant_content:
+            assistant_content = data.get("text") or data.get("generated_text") or json.dumps(data)
+    except Exception:
+        assistant_content = json.dumps(data)
+    return assistant_content
+
+
+# ---------- MODEL FAN-OUT ----------
+# per-model latency samples, used to spot slow free-tier queues
+model_latency_stats = {}
+
+
+def record_model_latency(model, seconds, ok=True):
+    stats = model_latency_stats.setdefault(model, {
+        "requests": 0,
+        "errors": 0,
+        "samples": collections.deque(maxlen=200),
+    })
+    stats["requests"] += 1
+    if ok:
+        stats["samples"].append(seconds)
+    else:
+        stats["errors"] += 1
+
+
+def model_latency_summary():
+    summary = {}
+    for model, stats in model_latency_stats.items():
+        samples = sorted(stats["samples"])
+        summary[model] = {
+            "requests": stats["requests"],
+            "errors": stats["errors"],
+            "p50": samples[len(samples) // 2] if samples else None,
+            "p95": samples[int(len(samples) * 0.95)] if samples else None,
+        }
+    return summary
+
+
+REGISTRY.gauge("model_latency_seconds", "Median and 95th percentile latency of recent successful responses per model",
+               callback=lambda: {(("model", model), ("quantile", quantile)): stats[key]
+                                 for model, stats in model_latency_summary().items()
+                                 for quantile, key in (("0.5", "p50"), ("0.95", "p95"))
+                                 if stats[key] is not None})
+REGISTRY.gauge("model_requests", "Fan-out requests per model: sent and failed",
+               callback=lambda: {(("model", model), ("state", state)): stats[state]
+                                 for model, stats in model_latency_summary().items()
+                                 for state in ("requests", "errors")})
+
+
+def score_artifact(text):
+    # cheap validity check for racing models: 0 = no code, 1 = code that
+    # looks truncated, 2 = looks complete
+    if not text or "```" not in text:
+        return 0
+    files = get_generated_files(text)
+    react_code = files.get("index.tsx") or files.get("index.js")
+    if react_code:
+        complete = "export default" in react_code and react_code.count("{") == react_code.count("}")
+        return 2 if complete else 1
+    html_code = files.get("index.html") or ""
+    return 2 if re.search(r"</(html|body|svg)>\s*$", html_code, re.IGNORECASE) else 1
+
+
+async def _timed_chat(messages, model, endpoint, api_key):
+    start = time.perf_counter()
+    try:
+        content = extract_assistant_content(await async_call_openrouter_chat(messages, model, endpoint, api_key))
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        record_model_latency(model, time.perf_counter() - start, ok=False)
+        raise
+    record_model_latency(model, time.perf_counter() - start)
+    return model, content
+
+
+async def fanout_openrouter_chat(messages, models=FANOUT_MODELS, mode=FANOUT_MODE,
+                                 deadline=FANOUT_DEADLINE, endpoint=ENDPOINT, api_key=None):
+    # Sends the same request to every model. In "first" mode the first
+    # complete artifact wins and the other requests are cancelled; in
+    # "best" mode responses are collected until the deadline and the best
+    # scoring one (earliest on ties) is returned.
+    tasks = [asyncio.create_task(_timed_chat(messages, model, endpoint, api_key)) for model in models]
+    best = None
+    error = None
+    try:
+        for next_done in asyncio.as_completed(tasks, timeout=deadline if mode == "best" else None):
+            try:
+                model, content = await next_done
+            except asyncio.TimeoutError:
+                break
+            except Exception as e:
+                error = e
+                continue
+            score = score_artifact(content)
+            if best is None or score > best[0]:
+                best = (score, model, content)
+            if mode != "best" and score == 2:
+                break
+    finally:
+        for task in tasks:
+            task.cancel()
+    if best is None:
+        raise error or RuntimeError("No model answered before the deadline.")
+    logger.info("Fan-out picked %s (score %d)", best[1], best[0])
+    return best[1], best[2]
+
+
+# ---------- VALIDATION ----------
+# the checks take a few milliseconds; a small pool keeps them off the
+# event loop without the cost of shipping artifacts to other processes
+validation_pool = ThreadPoolExecutor(VALIDATION_WORKERS, thread_name_prefix="validate") if VALIDATION_WORKERS > 0 else None
+
+
+async def validate_artifact(text):
+    # Returns the problems found in the code blocks of a response, or an
+    # empty list; responses without code are not checked.
+    if not text or "```" not in text:
+        return []
+    files = get_generated_files(text)
+    if validation_pool is None:
+        errors, seconds = validate_files(files, react_imports)
+    else:
+        errors, seconds = await asyncio.get_running_loop().run_in_executor(
+            validation_pool, validate_files, files, react_imports)
+    validation_check_seconds.observe(seconds)
+    return errors
@@ -0,0 +1,128 @@
+import io
+import gzip
+import json
+import zipfile
+
+from starlette.responses import Response
+from starlette.routing import Route
+
+from assets import IMMUTABLE
+from core import FenceTokenizer, react_imports
+from import_map import prune_import_map
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# "Download Code" without shipping the code to the browser again: the page
+# only gets the artifact's ref, and this route builds the download from the
+# artifact store. HTML artifacts are served as index.html, React artifacts
+# as a zip with App.jsx and an index.html that runs it from esm.sh through
+# an import map. Artifacts are content addressed, so the ref is a strong
+# ETag and responses can be cached for good.
+
+COMPRESS_MIN_BYTES = 1024
+ENCODINGS = ("br", "gzip")
+BABEL_URL = "https://esm.sh/@babel/standalone@7.23.5"
+
+REACT_INDEX = """<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="UTF-8" />
+  <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+  <title>App</title>
+  <!-- serve this folder over HTTP (e.g. python -m http.server), browsers do not fetch App.jsx from file:// -->
+  <script type="importmap">
+{import_map}
+  </script>
+  <script type="module">
+    import "@tailwindcss/browser"
+    import Babel from "{babel_url}"
+    import React from "react"
+    import {{ createRoot }} from "react-dom/client"
+
+    const source = await (await fetch("./App.jsx")).text()
+    const {{ code }} = Babel.transform(source, {{
+      filename: "App.tsx",
+      presets: [["react", {{ runtime: "automatic" }}], "typescript"],
+    }})
+    const {{ default: App }} = await import(URL.createObjectURL(new Blob([code], {{ type: "text/javascript" }})))
+    createRoot(document.getElementById("root")).render(React.createElement(App))
+  </script>
+</head>
+<body>
+  <div id="root"></div>
+</body>
+</html>
+"""
+
+
+def code_files(text):
+    # the code blocks of a response; unlike get_generated_files, a reply
+    # without any is not taken as a page
+    return FenceTokenizer().feed(text or "").finish().files()
+
+
+def package_artifact(text, imports=react_imports):
+    # Returns (filename, media type, body) for an assistant response, or
+    # None if it has no code.
+    files = code_files(text)
+    react_code = files.get("index.tsx") or files.get("index.jsx") or files.get("index.js")
+    if react_code:
+        used, _ = prune_import_map(react_code, imports)
+        index = REACT_INDEX.format(import_map=json.dumps({"imports": used}, indent=2), babel_url=BABEL_URL)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("App.jsx", react_code)
+            archive.writestr("index.html", index)
+        return "app.zip", "application/zip", buffer.getvalue()
+    if files.get("index.html"):
+        return "index.html", "text/html; charset=utf-8", files["index.html"].encode("utf-8")
+    return None
+
+
+def encode_body(body, accept_encoding):
+    # picks brotli, then gzip, if the client takes them; returns (encoding, body)
+    accepted = {part.split(";")[0].strip() for part in (accept_encoding or "").split(",")}
+    if len(body) < COMPRESS_MIN_BYTES:
+        return None, body
+    if brotli is not None and "br" in accepted:
+        return "br", brotli.compress(body, quality=5)
+    if "gzip" in accepted:
+        return "gzip", gzip.compress(body, compresslevel=6)
+    return None, body
+
+
+def download_route(store, path="/download"):
+    def serve(request):
+        ref = request.path_params["ref"]
+        # any encoding of this ref is the same download
+        etags = {f'"{ref}"', *(f'"{ref}-{encoding}"' for encoding in ENCODINGS)}
+        for tag in request.headers.get("if-none-match", "").split(","):
+            tag = tag.strip().removeprefix("W/")
+            if tag in etags:
+                return Response(status_code=304, headers={"ETag": tag, "Cache-Control": IMMUTABLE})
+        text = store.get(ref)
+        if text is None:
+            return Response("This artifact is no longer available, generate it again.", status_code=404)
+        package = package_artifact(text)
+        if package is None:
+            return Response("This response has no code to download.", status_code=404)
+        filename, media_type, body = package
+        # the zip is already compressed
+        encoding, body = encode_body(body, None if filename.endswith(".zip") else
+                                     request.headers.get("accept-encoding"))
+        etag = f'"{ref}{"-" + encoding if encoding else ""}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE,
+            "Vary": "Accept-Encoding",
+            "Content-Disposition": f'attachment; filename="{filename}"',
+        }
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=media_type, headers=headers)
+
+    return Route(path + "/{ref:str}", serve, methods=["GET"])
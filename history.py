@@ -0,0 +1,113 @@
+import re
+
+
+# Keeps the conversation sent upstream within a token budget. Only the
+# latest artifact is kept verbatim; older assistant code blocks are
+# replaced with short stubs. Token counts are cached next to the history
+# in the session state, so the budget check does not rescan old turns.
+#
+# With an artifact store, even the latest artifact is stored as its stub
+# plus an "artifact" reference into the store, and messages() inlines the
+# full text only for the request sent upstream.
+
+CODE_BLOCK_PATTERN = re.compile(r"```([\w+-]*)[^\n]*\n(.*?)(?:```|$)", re.DOTALL)
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for budgeting
+    return (len(text or "") + 3) // 4
+
+
+def has_code_block(text):
+    return "```" in (text or "")
+
+
+def compact_artifact(text):
+    def stub(match):
+        lang = match.group(1) or "code"
+        lines = match.group(2).count("\n") + 1
+        return f"```{lang}\n// earlier version omitted ({lines} lines), see the latest artifact\n```"
+
+    return CODE_BLOCK_PATTERN.sub(stub, text)
+
+
+class HistoryManager:
+
+    def __init__(self, token_budget, store=None):
+        self.token_budget = token_budget
+        self.store = store
+
+    def content(self, message):
+        # full text of a history message; falls back to the stub if the
+        # artifact is no longer in the store
+        ref = message.get("artifact")
+        if ref is not None and self.store is not None:
+            text = self.store.get(ref)
+            if text is not None:
+                return text
+        return message.get("content")
+
+    def messages(self, state_value):
+        # the history as sent upstream, artifacts inlined
+        return [{"role": m["role"], "content": self.content(m)} for m in self._sync(state_value)]
+
+    def latest_artifact(self, state_value):
+        history = self._sync(state_value)
+        index = state_value["artifact_index"]
+        return None if index is None else self.content(history[index])
+
+    def _sync(self, state_value):
+        history = state_value.setdefault("history", [])
+        counts = state_value.get("token_counts")
+        # state created before the manager existed, or edited elsewhere
+        if counts is None or len(counts) != len(history):
+            state_value["token_counts"] = [estimate_tokens(self.content(m)) for m in history]
+            state_value["history_tokens"] = sum(state_value["token_counts"])
+            state_value["artifact_index"] = next(
+                (i for i in range(len(history) - 1, -1, -1)
+                 if history[i]["role"] == "assistant" and has_code_block(history[i]["content"])),
+                None)
+        return history
+
+    def history_tokens(self, state_value):
+        self._sync(state_value)
+        return state_value["history_tokens"]
+
+    def append_turn(self, state_value, user_content, assistant_content):
+        history = self._sync(state_value)
+        counts = state_value["token_counts"]
+
+        if has_code_block(assistant_content) and state_value["artifact_index"] is not None:
+            index = state_value["artifact_index"]
+            # a stored artifact already keeps its stub as content
+            compacted = history[index]["content"] if "artifact" in history[index] else compact_artifact(
+                history[index]["content"])
+            history[index] = {"role": history[index]["role"], "content": compacted}
+            state_value["history_tokens"] += estimate_tokens(compacted) - counts[index]
+            counts[index] = estimate_tokens(compacted)
+
+        for role, content in (("user", user_content), ("assistant", assistant_content)):
+            message = {"role": role, "content": content}
+            if role == "assistant" and self.store is not None and has_code_block(content):
+                message = {"role": role, "content": compact_artifact(content), "artifact": self.store.put(content)}
+            history.append(message)
+            counts.append(estimate_tokens(content))
+            state_value["history_tokens"] += counts[-1]
+        if has_code_block(assistant_content):
+            state_value["artifact_index"] = len(history) - 1
+
+        # drop the oldest exchanges, always keeping the latest one
+        while state_value["history_tokens"] > self.token_budget and len(history) > 2:
+            for _ in range(2):
+                history.pop(0)
+                state_value["history_tokens"] -= counts.pop(0)
+            if state_value["artifact_index"] is not None:
+                state_value["artifact_index"] -= 2
+                if state_value["artifact_index"] < 0:
+                    state_value["artifact_index"] = None
+
+    def clear(self, state_value):
+        state_value["history"] = []
+        state_value["token_counts"] = []
+        state_value["history_tokens"] = 0
+        state_value["artifact_index"] = None
@@ -0,0 +1,51 @@
+import re
+
+
+# Static scan of the import specifiers in generated JSX/TSX, used to send
+# the sandbox only the import map entries the artifact actually uses.
+
+SPECIFIER_PATTERN = re.compile(
+    r"""(?:\bimport\s*(?:[\w*{}\s,$]+?\s*from\s*)?|\bexport\s*[\w*{}\s,$]*?\s*from\s*|\bimport\s*\(\s*)(["'])([^"'\n]+)\1""")
+
+COMMENT_PATTERN = re.compile(r"/\*.*?\*/|(?:^|(?<=\s))//[^\n]*", re.DOTALL)
+
+# modules the sandbox wrapper and the JSX runtime always need
+BASE_MODULES = ["react", "react/", "react-dom", "react-dom/", "@tailwindcss/browser"]
+
+
+def find_import_specifiers(code):
+    code = COMMENT_PATTERN.sub("", code or "")
+    return list(dict.fromkeys(match.group(2) for match in SPECIFIER_PATTERN.finditer(code)))
+
+
+def is_bare_specifier(specifier):
+    return not (specifier.startswith((".", "/")) or re.match(r"^[a-z][a-z0-9+.-]*:", specifier))
+
+
+def resolve_specifier(specifier, imports):
+    # exact entries win, then the longest "prefix/" entry, like the browser
+    if specifier in imports:
+        return specifier
+    best = None
+    for key in imports:
+        if key.endswith("/") and specifier.startswith(key) and (best is None or len(key) > len(best)):
+            best = key
+    return best
+
+
+def prune_import_map(code, imports, base_modules=BASE_MODULES):
+    # Returns (minimal import map, specifiers missing from the map).
+    used = {key: imports[key] for key in base_modules if key in imports}
+    missing = []
+    for specifier in find_import_specifiers(code):
+        if not is_bare_specifier(specifier):
+            continue
+        key = resolve_specifier(specifier, imports)
+        if key is None:
+            missing.append(specifier)
+        else:
+            used[key] = imports[key]
+            # "three/examples/..." also needs the bare "three" entry
+            if key.endswith("/") and key[:-1] in imports:
+                used[key[:-1]] = imports[key[:-1]]
+    return used, missing
@@ -0,0 +1,159 @@
+import time
+import threading
+import collections
+
+
+# Spreads upstream requests over several API keys, so the deployment is not
+# capped by one key's rate limit and one exhausted key does not take every
+# session down. Each request leases the healthy key with the fewest
+# requests in flight (then the fewest recent 429s, then the most remaining
+# quota). A 429 quarantines the key for its Retry-After, or else for a
+# backoff that doubles each time the key is throttled again after a
+# quarantine, and a key the upstream rejects (401) is parked for longer.
+# Quota headers, when the upstream sends them, park a key whose quota is
+# used up until it resets. 402 (credits) and 403 (moderation) are about
+# the account or the prompt, not the key, so they leave it alone.
+
+THROTTLE_WINDOW = 60.0 # seconds 429s count against a key
+MAX_QUARANTINE = 600.0 # seconds
+REJECTED_STATUS = 401
+
+
+def parse_reset(value, now=None):
+    # X-RateLimit-Reset as epoch milliseconds, epoch seconds or seconds
+    # from now; returns an epoch time
+    now = time.time() if now is None else now
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    if reset > 1e12:
+        return reset / 1000
+    if reset > 1e9:
+        return reset
+    return now + reset
+
+
+class ApiKey:
+
+    def __init__(self, key, name):
+        self.key = key
+        self.name = name
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.recent_429s = collections.deque()
+        self.strikes = 0
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.quarantined_until = 0.0
+        self.last_used = 0.0
+
+    def available_in(self, now):
+        # seconds until the key may be used again, 0 if it is healthy
+        wait = max(0.0, self.quarantined_until - now)
+        if self.remaining == 0 and self.reset_at is not None:
+            wait = max(wait, self.reset_at - time.time())
+        return wait
+
+
+class KeyLease:
+
+    def __init__(self, pool, api_key):
+        self.pool = pool
+        self.api_key = api_key
+        self.key = api_key.key
+        self.released = False
+
+    def record(self, status_code, headers=None, retry_after=None):
+        self.pool._record(self.api_key, status_code, headers or {}, retry_after)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.pool._release(self.api_key)
+
+
+class KeyPool:
+
+    def __init__(self, keys, quarantine=30.0, rejected_quarantine=3600.0):
+        self.keys = [ApiKey(key, f"{i}:...{key[-4:]}") for i, key in enumerate(dict.fromkeys(keys))]
+        self.quarantine = quarantine
+        self.rejected_quarantine = rejected_quarantine
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        # Leases the least loaded healthy key. When every key is parked the
+        # one that recovers first is used anyway, and the upstream's 429
+        # and Retry-After drive the caller's backoff as with a single key.
+        if not self.keys:
+            raise RuntimeError("OPENROUTER_API_KEY environment variable is not set.")
+        with self._lock:
+            now = time.monotonic()
+            for api_key in self.keys:
+                while api_key.recent_429s and now - api_key.recent_429s[0] > THROTTLE_WINDOW:
+                    api_key.recent_429s.popleft()
+            api_key = min(self.keys, key=lambda k: (
+                k.available_in(now),
+                k.in_flight,
+                len(k.recent_429s),
+                -(k.remaining if k.remaining is not None else float("inf")),
+                k.last_used,
+            ))
+            api_key.in_flight += 1
+            api_key.requests += 1
+            # until the response says otherwise
+            if api_key.remaining:
+                api_key.remaining -= 1
+            api_key.last_used = now
+            return KeyLease(self, api_key)
+
+    def has_available(self):
+        now = time.monotonic()
+        with self._lock:
+            return any(k.available_in(now) == 0 for k in self.keys)
+
+    def _record(self, api_key, status_code, headers, retry_after):
+        with self._lock:
+            now = time.monotonic()
+            try:
+                remaining = int(headers.get("x-ratelimit-remaining"))
+            except (TypeError, ValueError):
+                pass
+            else:
+                api_key.remaining = max(0, remaining)
+                api_key.limit = int(headers.get("x-ratelimit-limit") or 0) or api_key.limit
+                api_key.reset_at = parse_reset(headers.get("x-ratelimit-reset"))
+            if status_code == 429:
+                api_key.throttled += 1
+                api_key.recent_429s.append(now)
+                # requests sent before the quarantine started are no new strike
+                if api_key.quarantined_until <= now:
+                    api_key.strikes += 1
+                duration = retry_after if retry_after is not None else self.quarantine * 2 ** (api_key.strikes - 1)
+                api_key.quarantined_until = max(api_key.quarantined_until, now + min(duration, MAX_QUARANTINE))
+            elif status_code == REJECTED_STATUS:
+                api_key.rejected += 1
+                api_key.quarantined_until = now + self.rejected_quarantine
+            elif status_code is not None and status_code < 400:
+                api_key.strikes = 0
+
+    def _release(self, api_key):
+        with self._lock:
+            api_key.in_flight -= 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "key": k.name,
+                "in_flight": k.in_flight,
+                "requests": k.requests,
+                "throttled": k.throttled,
+                "rejected": k.rejected,
+                "remaining": k.remaining,
+                "limit": k.limit,
+                "available_in": round(k.available_in(now), 1),
+            } for k in self.keys]
@@ -0,0 +1,303 @@
+import sys
+import json
+import time
+import random
+import itertools
+import collections
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Local stand-in for https://openrouter.ai/api/v1/chat/completions so the
+# app and its SSE parser can be exercised offline:
+#
+#   python mock_openrouter.py --port 8001
+#   OPENROUTER_ENDPOINT=http://127.0.0.1:8001/api/v1/chat/completions KEY=test python app.py
+
+CANNED_RESPONSE = """Here is your page:
+
+```html
+<!DOCTYPE html>
+<html>
+<head><title>Mock</title></head>
+<body style="background:#f5f3ff">
+  <h1>Hello from the mock OpenRouter server</h1>
+</body>
+</html>
+```
+"""
+
+CANNED_REACT_RESPONSE = """Here is your component:
+
+```jsx
+import React, { useState } from "react";
+
+export default function App() {
+  const [count, setCount] = useState(0);
+  return (
+    <div className="min-h-screen flex items-center justify-center bg-violet-50">
+      <button className="px-4 py-2 rounded bg-violet-600 text-white" onClick={() => setCount(count + 1)}>
+        Clicked {count} times
+      </button>
+    </div>
+  );
+}
+```
+"""
+
+CANNED_ARTIFACTS = {"html": CANNED_RESPONSE, "react": CANNED_REACT_RESPONSE}
+
+
+def pad_response(response, size):
+    # Grows the artifact to about `size` characters with comment lines
+    # inside its last code block, so the response size can be varied
+    # without changing what it renders.
+    fence = response.rfind("```")
+    if size <= len(response) or fence <= 0:
+        return response
+    line = "<!-- padding -->\n" if "```html" in response else "// padding\n"
+    padding = line * ((size - len(response)) // len(line) + 1)
+    return response[:fence] + padding + response[fence:]
+
+
+class MockOpenRouterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        options = self.server.options
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        payload = json.loads(body or b"{}")
+        responses = options["responses"]
+        content = responses[next(self.server.response_index) % len(responses)]
+
+        rate_headers = self._check_key(options)
+        if rate_headers is None or self._inject_fault(options):
+            return
+        time.sleep(options["model_latency"].get(payload.get("model"), options["latency"]))
+        usage = self._usage(payload, content)
+        if payload.get("stream"):
+            self._send_stream(payload, content, options, usage, rate_headers)
+        else:
+            self._send_json(200, {
+                "id": "gen-mock",
+                "model": payload.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }, rate_headers)
+
+    def _usage(self, payload, content):
+        # ~4 characters per token; a system prompt seen before counts as
+        # cached, like a provider-side prefix cache
+        messages = payload.get("messages") or []
+        prompt_tokens = len(json.dumps(messages)) // 4
+        cached_tokens = 0
+        if messages and messages[0].get("role") == "system":
+            system = json.dumps(messages[0].get("content"))
+            with self.server.lock:
+                if system in self.server.prefix_cache:
+                    cached_tokens = len(system) // 4
+                self.server.prefix_cache.add(system)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+
+    def _check_key(self, options):
+        # Per-key limits like OpenRouter's: keys outside valid_keys get a
+        # 401, and each key may send key_limit requests per key_window
+        # seconds. Returns the rate limit headers for the response, or None
+        # once the request has been rejected.
+        key = (self.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+        with self.server.lock:
+            self.server.key_requests[key] += 1
+            if options["valid_keys"] is not None and key not in options["valid_keys"]:
+                rejected = 401
+            else:
+                rejected = None
+                window = self.server.key_windows[key]
+                now = time.monotonic()
+                while window and now - window[0] >= options["key_window"]:
+                    window.popleft()
+                if options["key_limit"] and len(window) >= options["key_limit"]:
+                    rejected = 429
+                elif options["key_limit"]:
+                    window.append(now)
+        if rejected == 401:
+            self._send_json(401, {"error": {"code": 401, "message": "Invalid API key"}})
+            return None
+        if not options["key_limit"]:
+            return {}
+        reset = window[0] + options["key_window"] - now if window else options["key_window"]
+        headers = {
+            "X-RateLimit-Limit": str(options["key_limit"]),
+            "X-RateLimit-Remaining": str(max(0, options["key_limit"] - len(window))),
+            "X-RateLimit-Reset": str(int((time.time() + reset) * 1000)),
+        }
+        if rejected == 429:
+            self.server.key_throttled[key] += 1
+            headers["Retry-After"] = str(max(1, round(reset)))
+            self._send_json(429, {"error": {"code": 429, "message": "Rate limit exceeded"}}, headers)
+            return None
+        return headers
+
+    def _inject_fault(self, options):
+        with self.server.lock:
+            self.server.requests_seen += 1
+            fail = (self.server.requests_seen <= options["fail_first"]
+                    or random.random() < options["error_rate"])
+        if not fail:
+            return False
+        status = options["error_status"]
+        headers = {"Retry-After": str(options["retry_after"])} if options["retry_after"] is not None else {}
+        self._send_json(status, {"error": {"code": status, "message": "Injected failure"}}, headers)
+        return True
+
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, payload, content, options, usage, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+        self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+        size = options["chunk_size"]
+        for i in range(0, len(content), size):
+            chunk = {
+                "id": "gen-mock",
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + size]}}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(options["chunk_delay"])
+        if options["truncate"]:
+            # the connection drops before the end of the stream
+            return
+        if (payload.get("usage") or {}).get("include") or (payload.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "gen-mock", "model": payload.get("model"), "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class MockOpenRouterServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connections under benchmark load
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # clients hanging up mid-response (cancelled races, aborted
+        # streams) are expected and not worth a traceback
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_mock_server(host="127.0.0.1", port=0, response=CANNED_RESPONSE,
+                      latency=0.0, chunk_size=16, chunk_delay=0.0, model_latency=None,
+                      error_rate=0.0, error_status=503, retry_after=None, fail_first=0,
+                      response_size=0, key_limit=0, key_window=60.0, valid_keys=None, truncate=False):
+    # Starts the server on a background thread and returns (server, endpoint).
+    # Use port=0 to pick a free port; call server.shutdown() when done.
+    # `response` may be a list of responses, which are replayed in turn.
+    responses = [response] if isinstance(response, str) else list(response)
+    server = MockOpenRouterServer((host, port), MockOpenRouterHandler)
+    server.lock = threading.Lock()
+    server.requests_seen = 0
+    server.prefix_cache = set()
+    server.response_index = itertools.count()
+    # requests and 429s by API key
+    server.key_requests = collections.Counter()
+    server.key_throttled = collections.Counter()
+    server.key_windows = collections.defaultdict(collections.deque)
+    server.options = {
+        "responses": [pad_response(r, response_size) for r in responses],
+        "latency": latency,
+        "chunk_size": chunk_size,
+        "chunk_delay": chunk_delay,
+        # per-model overrides of latency, for racing several models
+        "model_latency": model_latency or {},
+        # fault injection: the first fail_first requests fail, then a
+        # random error_rate share of them
+        "error_rate": error_rate,
+        "error_status": error_status,
+        "retry_after": retry_after,
+        "fail_first": fail_first,
+        # and streams end without [DONE] if truncate is set
+        "truncate": truncate,
+        # per-key limits: key_limit requests per key_window seconds (0 =
+        # unlimited), and 401 for keys outside valid_keys if it is given
+        "key_limit": key_limit,
+        "key_window": key_window,
+        "valid_keys": set(valid_keys) if valid_keys is not None else None,
+    }
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoint = f"http://{host}:{server.server_address[1]}/api/v1/chat/completions"
+    return server, endpoint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before the first byte")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per SSE delta")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="seconds between SSE deltas")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="latency for one model, may be repeated")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="status code of injected failures")
+    parser.add_argument("--retry-after", type=float, help="Retry-After header sent with injected failures")
+    parser.add_argument("--response-file", action="append", default=[],
+                        help="file with a canned assistant response, may be repeated")
+    parser.add_argument("--artifacts", default="html", help="built-in responses to replay, e.g. html,react")
+    parser.add_argument("--response-size", type=int, default=0, help="pad responses to this many characters")
+    parser.add_argument("--truncate", action="store_true", help="close streams before data: [DONE]")
+    parser.add_argument("--key-limit", type=int, default=0, help="requests per key and window, 0 = unlimited")
+    parser.add_argument("--key-window", type=float, default=60.0, help="seconds of the per-key limit window")
+    parser.add_argument("--valid-key", action="append", dest="valid_keys",
+                        help="accept only these API keys, may be repeated")
+    args = parser.parse_args()
+
+    response = [CANNED_ARTIFACTS[name] for name in args.artifacts.split(",")]
+    if args.response_file:
+        response = []
+        for path in args.response_file:
+            with open(path, encoding="utf-8") as f:
+                response.append(f.read())
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, seconds = item.rpartition("=")
+        model_latency[model] = float(seconds)
+    server, endpoint = start_mock_server(args.host, args.port, response, args.latency,
+                                         args.chunk_size, args.chunk_delay, model_latency,
+                                         args.error_rate, args.error_status, args.retry_after,
+                                         response_size=args.response_size, key_limit=args.key_limit,
+                                         key_window=args.key_window, valid_keys=args.valid_keys,
+                                         truncate=args.truncate)
+    print(f"Mock OpenRouter listening on {endpoint}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
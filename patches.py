@@ -0,0 +1,118 @@
+import re
+
+
+# Follow-up turns ("make the button blue") ask the model for an edit to the
+# latest artifact instead of the whole file. Edits come back as
+# SEARCH/REPLACE blocks or unified diff hunks; both are turned into
+# (file, search, replace) triples and applied to the files returned by
+# get_generated_files.
+
+EDIT_BLOCK_PATTERN = re.compile(
+    r"^(?:(?P<file>[^\n<=>`]*\S)[ \t]*\n)?(?:```[^\n]*\n)?<{5,9} SEARCH[^\n]*\n"
+    r"(?P<search>.*?)^={5,9}[ \t]*\n(?P<replace>.*?)^>{5,9} REPLACE[^\n]*$", re.DOTALL | re.MULTILINE)
+HUNK_HEADER_PATTERN = re.compile(r"^@@[^@\n]*@@.*$", re.MULTILINE)
+
+
+class PatchError(ValueError):
+    pass
+
+
+def _filename(name):
+    if not name:
+        return None
+    name = name.strip().strip("`*:").strip()
+    for prefix in ("+++ ", "--- ", "a/", "b/", "./"):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+    return name or None
+
+
+def parse_search_replace(text):
+    return [(_filename(m.group("file")), m.group("search"), m.group("replace"))
+            for m in EDIT_BLOCK_PATTERN.finditer(text)]
+
+
+def parse_unified_diff(text):
+    edits = []
+    filename = None
+    search = replace = None
+    for line in text.splitlines(keepends=True):
+        if line.startswith("+++ "):
+            filename = _filename(line.split("\t")[0])
+        elif line.startswith("--- ") or line.startswith("diff ") or line.startswith("```"):
+            continue
+        elif HUNK_HEADER_PATTERN.match(line):
+            if search is not None:
+                edits.append((filename, "".join(search), "".join(replace)))
+            search, replace = [], []
+        elif search is not None:
+            body = line[1:] if line[:1] in (" ", "-", "+") else line
+            if line.startswith("\\"):
+                # "\ No newline at end of file"
+                continue
+            if not line.startswith("+"):
+                search.append(body)
+            if not line.startswith("-"):
+                replace.append(body)
+    if search is not None:
+        edits.append((filename, "".join(search), "".join(replace)))
+    return edits
+
+
+def parse_edits(text):
+    # Returns the edits found in a model response; empty if it holds none.
+    return parse_search_replace(text or "") or parse_unified_diff(text or "")
+
+
+def _resolve(filename, files):
+    if filename in files:
+        return filename
+    if len(files) == 1:
+        # the model rarely knows our canonical names (index.tsx vs App.jsx)
+        return next(iter(files))
+    basename = (filename or "").rsplit("/", 1)[-1]
+    for name in files:
+        if name.rsplit(".", 1)[-1] == basename.rsplit(".", 1)[-1]:
+            return name
+    raise PatchError(f"Edit targets unknown file {filename!r}")
+
+
+def _replace_lines(content, search, replace):
+    # Whitespace tolerant fallback: match the SEARCH lines with leading and
+    # trailing whitespace ignored and replace whole lines.
+    lines = content.splitlines(keepends=True)
+    wanted = [line.strip() for line in search.strip("\n").splitlines()]
+    if not wanted:
+        return None
+    matches = [i for i in range(len(lines) - len(wanted) + 1)
+               if [line.strip() for line in lines[i:i + len(wanted)]] == wanted]
+    if len(matches) != 1:
+        return None
+    start = matches[0]
+    end = start + len(wanted)
+    new = replace if replace.endswith("\n") or end == len(lines) else replace + "\n"
+    return "".join(lines[:start]) + new + "".join(lines[end:])
+
+
+def apply_edits(files, edits):
+    # Applies every edit or none: raises PatchError if a SEARCH text is
+    # missing or ambiguous, so the caller can fall back to regenerating.
+    if not edits:
+        raise PatchError("No edits found")
+    result = dict(files)
+    for filename, search, replace in edits:
+        name = _resolve(filename, result)
+        content = result[name]
+        if not search.strip():
+            raise PatchError(f"Empty SEARCH section for {name}")
+        count = content.count(search)
+        if count == 1:
+            result[name] = content.replace(search, replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(f"SEARCH text matches {count} places in {name}")
+        patched = _replace_lines(content, search, replace)
+        if patched is None:
+            raise PatchError(f"SEARCH text not found in {name}: {search.strip()[:80]!r}")
+        result[name] = patched
+    return result
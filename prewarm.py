@@ -0,0 +1,77 @@
+import time
+import asyncio
+import logging
+import threading
+import collections
+
+
+# Generates the answers to prompts we expect before anyone asks: the example
+# cards, plus the first prompts users send most often. Results land in the
+# response cache, so submitting one of them renders at once. The prewarmer
+# runs on its own thread and event loop, a few prompts at a time, and
+# repeats every `interval` seconds to replace entries the cache has expired.
+
+logger = logging.getLogger(__name__)
+
+
+class PromptLog:
+    # the most recent first-turn prompts, to find the frequent ones
+
+    def __init__(self, maxlen=1000):
+        self._prompts = collections.deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def record(self, prompt):
+        prompt = (prompt or "").strip()
+        if prompt:
+            with self._lock:
+                self._prompts.append(prompt)
+
+    def top(self, n, min_count=2):
+        with self._lock:
+            counts = collections.Counter(self._prompts)
+        return [prompt for prompt, count in counts.most_common(n) if count >= min_count]
+
+
+class Prewarmer:
+
+    def __init__(self, warm, prompts, concurrency=2, interval=6 * 3600):
+        # warm(prompt) is a coroutine that returns "cached" when there is
+        # nothing to do, or any other result label; prompts() lists the
+        # prompts to warm on each run
+        self.warm = warm
+        self.prompts = prompts
+        self.concurrency = concurrency
+        self.interval = interval
+        self.stats = collections.Counter()
+        self.last_run = None
+
+    async def run_once(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        start = time.perf_counter()
+
+        async def warm(prompt):
+            async with semaphore:
+                try:
+                    return await self.warm(prompt)
+                except Exception as e:
+                    logger.warning("Prewarming %r failed: %s", prompt[:80], e)
+                    return "error"
+
+        prompts = list(dict.fromkeys(self.prompts()))
+        results = collections.Counter(await asyncio.gather(*(warm(prompt) for prompt in prompts)))
+        self.stats.update(results)
+        self.last_run = time.time()
+        logger.info("Prewarmed %d prompts in %.1fs: %s", len(prompts), time.perf_counter() - start,
+                    ", ".join(f"{count} {result}" for result, count in sorted(results.items())))
+        return results
+
+    async def run_forever(self):
+        while True:
+            await self.run_once()
+            if self.interval <= 0:
+                return
+            await asyncio.sleep(self.interval)
+
+    def start_in_background(self):
+        threading.Thread(target=lambda: asyncio.run(self.run_forever()), name="prewarm", daemon=True).start()
@@ -0,0 +1,108 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+
+# Building blocks for calling a flaky, rate limited upstream: jittered
+# backoff that honours Retry-After, a circuit breaker that fails fast
+# while the upstream is down, and a token bucket shared by every session.
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0, retry_after=None):
+    # "full jitter" exponential backoff; Retry-After is a lower bound
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+class CircuitBreaker:
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def check(self):
+        # Raises CircuitOpenError while the circuit is open; returns True
+        # if the caller was let through as the half-open trial request.
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            # let a single trial request through once the timeout is over
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            remaining = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(f"Upstream is failing, not retrying for another {remaining:.0f}s.")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def abandon_trial(self):
+        # the trial request ended without an outcome (it was cancelled, or
+        # failed before reaching the upstream), so the next one may try
+        with self._lock:
+            self._trial_running = False
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=None):
+        # rate is in tokens per second; a rate of 0 disables limiting
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token and returns how long the caller has to wait before
+        # using it. Tokens may go negative, which queues callers fairly.
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
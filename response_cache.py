@@ -0,0 +1,102 @@
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+# Content-addressed cache of assistant responses. Identical requests
+# (same model, messages and temperature) are answered from memory, then
+# from an optional SQLite file that survives restarts.
+
+def cache_key(model, messages, temperature):
+    normalized = [{
+        "role": message.get("role"),
+        "content": (message.get("content") or "").replace("\r\n", "\n").strip(),
+    } for message in messages]
+    blob = json.dumps([model, normalized, temperature],
+                      ensure_ascii=False,
+                      separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries=256, ttl=24 * 3600, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                created REAL NOT NULL,
+                content BLOB NOT NULL)""")
+            self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, content = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return content
+                del self._entries[key]
+            if self._db is not None:
+                row = self._db.execute("SELECT created, content FROM responses WHERE key = ?",
+                                       (key, )).fetchone()
+                if row is not None and now - row[0] <= self.ttl:
+                    content = zlib.decompress(row[1]).decode("utf-8")
+                    self._remember(key, row[0], content)
+                    self.stats["disk_hits"] += 1
+                    return content
+            self.stats["misses"] += 1
+            return None
+
+    def contains(self, key):
+        # a fresh entry exists; unlike get(), not counted as a lookup
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                return True
+            if self._db is not None:
+                row = self._db.execute("SELECT created FROM responses WHERE key = ?", (key, )).fetchone()
+                return row is not None and now - row[0] <= self.ttl
+            return False
+
+    def set(self, key, content):
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, content)
+            self.stats["writes"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, content) VALUES (?, ?, ?)",
+                    (key, created, zlib.compress(content.encode("utf-8"))))
+                self._db.execute("DELETE FROM responses WHERE created < ?", (created - self.ttl, ))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def _remember(self, key, created, content):
+        self._entries[key] = (created, content)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
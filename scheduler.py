@@ -0,0 +1,148 @@
+import asyncio
+import itertools
+import threading
+
+
+# Admission control in front of the generation workers. Every session
+# gets a fair share of the upstream: requests are ordered by start-time
+# fair queuing, where a request's virtual finish tag grows with its
+# estimated cost (prompt tokens) divided by the session's weight. Short
+# requests from light sessions therefore overtake long multi-turn ones
+# instead of waiting behind them, and a session submitting many requests
+# only competes with its own backlog.
+
+class AdmissionError(RuntimeError):
+    pass
+
+
+class DuplicateSubmitError(AdmissionError):
+    pass
+
+
+class Ticket:
+
+    def __init__(self, scheduler, session, cost, key, start_tag, finish_tag, seq):
+        self.scheduler = scheduler
+        self.session = session
+        self.cost = cost
+        self.key = key
+        self.start_tag = start_tag
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.admitted = False
+        self.released = False
+        self._waiters = []
+
+    @property
+    def order(self):
+        return (self.finish_tag, self.seq)
+
+    def _wake(self):
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(None))
+        self._waiters = []
+
+
+class FairScheduler:
+
+    def __init__(self, concurrency=100, per_session=1, max_queued_per_session=2):
+        self.concurrency = concurrency
+        self.per_session = per_session
+        self.max_queued_per_session = max_queued_per_session
+        self.virtual_time = 0.0
+        self.queued = []
+        self.running = {}
+        self._last_finish = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def submit(self, session, cost, key=None, weight=1.0):
+        # Queues a request and returns its ticket. Raises
+        # DuplicateSubmitError if the same request (session and key) is
+        # already queued or running, and AdmissionError if the session has
+        # too many requests waiting.
+        with self._lock:
+            own = [t for t in self.queued if t.session == session]
+            active = own + self.running.get(session, [])
+            if key is not None and any(t.key == key for t in active):
+                raise DuplicateSubmitError("This request is already being generated.")
+            if len(own) >= self.max_queued_per_session:
+                raise AdmissionError("Too many requests waiting for this session, try again shortly.")
+            start_tag = max(self.virtual_time, self._last_finish.get(session, 0.0))
+            finish_tag = start_tag + max(1.0, cost) / weight
+            self._last_finish[session] = finish_tag
+            ticket = Ticket(self, session, cost, key, start_tag, finish_tag, next(self._seq))
+            self.queued.append(ticket)
+            self._dispatch()
+            return ticket
+
+    def _eligible(self):
+        return [t for t in self.queued if len(self.running.get(t.session, [])) < self.per_session]
+
+    def _dispatch(self):
+        # called with the lock held
+        while self.queued and sum(len(r) for r in self.running.values()) < self.concurrency:
+            eligible = self._eligible()
+            if not eligible:
+                return
+            ticket = min(eligible, key=lambda t: t.order)
+            self.queued.remove(ticket)
+            self.running.setdefault(ticket.session, []).append(ticket)
+            self.virtual_time = max(self.virtual_time, ticket.start_tag)
+            ticket.admitted = True
+            ticket._wake()
+
+    def position(self, ticket):
+        # 1-based place in line, counting only requests that are ahead of
+        # it; 0 once the ticket has been admitted
+        with self._lock:
+            if ticket.admitted:
+                return 0
+            return 1 + sum(1 for t in self.queued if t.order < ticket.order)
+
+    async def wait(self, ticket, timeout=None):
+        # Waits until the ticket is admitted or the timeout expires;
+        # returns True once admitted.
+        with self._lock:
+            if ticket.admitted:
+                return True
+            waiter = (asyncio.get_running_loop(), asyncio.get_running_loop().create_future())
+            ticket._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # a ticket polled with a timeout would otherwise collect one
+            # dead future per poll until it is admitted
+            with self._lock:
+                if waiter in ticket._waiters:
+                    ticket._waiters.remove(waiter)
+        return ticket.admitted
+
+    def release(self, ticket):
+        # Frees the ticket's slot, or drops it from the queue if it never
+        # started (e.g. the client went away while waiting).
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket in self.queued:
+                self.queued.remove(ticket)
+            running = self.running.get(ticket.session, [])
+            if ticket in running:
+                running.remove(ticket)
+                if not running:
+                    del self.running[ticket.session]
+            if ticket.session not in self.running and not any(t.session == ticket.session for t in self.queued):
+                # idle sessions start again from the current virtual time
+                self._last_finish.pop(ticket.session, None)
+            self._dispatch()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queued": len(self.queued),
+                "running": sum(len(r) for r in self.running.values()),
+                "sessions": len(self.running.keys() | {t.session for t in self.queued}),
+            }
@@ -0,0 +1,112 @@
+import re
+import zlib
+import threading
+import unicodedata
+
+import numpy as np
+
+
+# Near-duplicate lookup for first-turn prompts ("purple todo app" vs "todo
+# app purple", a reworded example card), which the exact response cache
+# misses. Prompts are embedded with signed feature hashing of words, word
+# bigrams and character trigrams, L2 normalized, and kept in a fixed-size
+# float32 matrix, so a lookup is a single matrix-vector product. Each entry
+# points at an artifact (e.g. an ArtifactStore ref); the least recently used
+# entry is replaced when the matrix is full.
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# words that say nothing about which page is wanted
+STOPWORDS = frozenset("""
+a an and app application are as at be build can create design for from generate give help html i in include into
+is it make me my of on or page please react show simple site some that the this to u use using want web webpage
+website with you
+""".split())
+FEATURE_WEIGHTS = {"word": 1.0, "bigram": 0.7, "trigram": 0.25}
+
+
+def _features(text):
+    text = unicodedata.normalize("NFKD", (text or "").lower()).encode("ascii", "ignore").decode("ascii")
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w
+             for w in TOKEN_PATTERN.findall(text) if w not in STOPWORDS]
+    for word in words:
+        yield "w:" + word, FEATURE_WEIGHTS["word"]
+        padded = f"^{word}$"
+        for i in range(len(padded) - 2):
+            yield "c:" + padded[i:i + 3], FEATURE_WEIGHTS["trigram"]
+    for first, second in zip(words, words[1:]):
+        yield f"b:{first} {second}", FEATURE_WEIGHTS["bigram"]
+
+
+def embed(text, dim):
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        # the sign bit keeps hash collisions from adding up
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticCache:
+
+    def __init__(self, max_entries=10000, dim=512, threshold=0.8):
+        self.max_entries = max_entries
+        self.dim = dim
+        self.threshold = threshold
+        self.matrix = np.zeros((max_entries, dim), dtype=np.float32)
+        self.groups = np.full(max_entries, -1, dtype=np.int64)
+        self.last_used = np.zeros(max_entries, dtype=np.int64)
+        self.entries = [None] * max_entries
+        self.size = 0
+        self._clock = 0
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group(namespace):
+        # entries only match prompts of the same namespace (system prompt)
+        return zlib.crc32((namespace or "").encode("utf-8"))
+
+    def add(self, prompt, value, namespace=""):
+        vector = embed(prompt, self.dim)
+        if not vector.any():
+            return
+        group = self.group(namespace)
+        key = (group, prompt.strip().lower())
+        with self._lock:
+            self._clock += 1
+            row = self._rows.get(key)
+            if row is None:
+                if self.size < self.max_entries:
+                    row = self.size
+                    self.size += 1
+                else:
+                    row = int(np.argmin(self.last_used))
+                    self._rows.pop(self.entries[row][0], None)
+                self._rows[key] = row
+            self.matrix[row] = vector
+            self.groups[row] = group
+            self.last_used[row] = self._clock
+            self.entries[row] = (key, prompt, value)
+
+    def lookup(self, prompt, namespace="", threshold=None):
+        # Returns (similarity, cached prompt, value) for the closest entry
+        # at or above the threshold, or None.
+        vector = embed(prompt, self.dim)
+        if not vector.any():
+            return None
+        threshold = self.threshold if threshold is None else threshold
+        group = self.group(namespace)
+        with self._lock:
+            if not self.size:
+                return None
+            scores = self.matrix[:self.size] @ vector
+            scores[self.groups[:self.size] != group] = -1.0
+            row = int(np.argmax(scores))
+            score = float(scores[row])
+            if score < threshold:
+                return None
+            self._clock += 1
+            self.last_used[row] = self._clock
+            _, cached_prompt, value = self.entries[row]
+            return score, cached_prompt, value
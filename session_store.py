@@ -0,0 +1,106 @@
+import abc
+import time
+import sqlite3
+import threading
+from collections import defaultdict
+
+
+# Durable conversation log keyed by session ID. Turns are only ever
+# appended, so a write costs the same however long the conversation is.
+# Any backend (e.g. Redis lists) can implement the SessionStore interface.
+
+class SessionStore(abc.ABC):
+
+    @abc.abstractmethod
+    def append(self, session_id, messages):
+        pass
+
+    @abc.abstractmethod
+    def history(self, session_id, limit=None):
+        # the latest `limit` messages in chronological order
+        pass
+
+    @abc.abstractmethod
+    def clear(self, session_id):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+
+    def __init__(self):
+        self._sessions = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def append(self, session_id, messages):
+        with self._lock:
+            self._sessions[session_id].extend(
+                {"role": m["role"], "content": m["content"]} for m in messages)
+
+    def history(self, session_id, limit=None):
+        with self._lock:
+            messages = self._sessions.get(session_id, [])
+            return list(messages[-limit:] if limit else messages)
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+
+    def __init__(self, path):
+        # the database is opened on first use, so importing the app does
+        # not create it
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # called with the lock held
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL lets several app processes read while one of them writes
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=5000")
+            db.execute("""CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def append(self, session_id, messages):
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.executemany(
+                "INSERT INTO messages (session_id, role, content, created) VALUES (?, ?, ?, ?)",
+                [(session_id, m["role"], m["content"], now) for m in messages])
+            db.commit()
+
+    def history(self, session_id, limit=None):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit or -1)).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def clear(self, session_id):
+        with self._lock:
+            db = self._connection()
+            db.execute("DELETE FROM messages WHERE session_id = ?", (session_id, ))
+            db.commit()
+
+
+def open_session_store(url):
+    # "memory://" or "sqlite:///path/to/sessions.sqlite3"
+    if url.startswith("memory://"):
+        return MemorySessionStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported session store: {url}")
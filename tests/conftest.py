@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_openrouter import start_mock_server  # noqa: E402
+
+
+@pytest.fixture
+def mock_openrouter():
+    # mock_openrouter(**options) starts a mock server and returns
+    # (server, endpoint), like start_mock_server; every server is shut
+    # down after the test
+    servers = []
+
+    def start(**options):
+        server, endpoint = start_mock_server(**options)
+        servers.append(server)
+        return server, endpoint
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,176 @@
+import asyncio
+import contextlib
+import functools
+import importlib
+
+import pytest
+
+import core
+from mock_openrouter import CANNED_RESPONSE
+
+
+@pytest.fixture(scope="module")
+def app():
+    # app reads its settings on import; keep it from touching the working
+    # directory or esm.sh
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("KEY", "test")
+        monkeypatch.setenv("SESSION_STORE", "memory://")
+        monkeypatch.setenv("SESSION_SECRET", "test")
+        monkeypatch.setenv("ESM_SELF_HOST", "0")
+        module = importlib.import_module("app")
+        module.demo
+        yield module
+
+
+def new_state():
+    return {"system_prompt": "", "history": []}
+
+
+def test_closing_at_the_first_update_releases_the_ticket(app):
+    async def close_early():
+        generation = app.GradioEvents.generate_code("A page nobody waits for", "", new_state())
+        await generation.__anext__()
+        assert app.scheduler.stats()["running"] + app.scheduler.stats()["queued"] == 1
+        await generation.aclose()
+
+    asyncio.run(close_early())
+    assert app.scheduler.stats() == {"queued": 0, "running": 0, "sessions": 0}
+
+
+@pytest.fixture
+def upstream(app, mock_openrouter, monkeypatch):
+    # start(**options) points the app's streams at a mock server
+    def start(**options):
+        server, endpoint = mock_openrouter(**options)
+        monkeypatch.setattr(app, "async_stream_openrouter_chat",
+                            functools.partial(core.async_stream_openrouter_chat, endpoint=endpoint, api_key="test"))
+        return server
+    return start
+
+
+def generate(app, prompt, state=None):
+    async def collect():
+        updates = [update async for update in app.GradioEvents.generate_code(prompt, "", state or new_state(),
+                                                                             force_regenerate=True)]
+        await core.aclose_async_clients()
+        return updates
+    return asyncio.run(collect())
+
+
+def download_ref(app, updates):
+    refs = [update[app.download_content]["value"] for update in updates if app.download_content in update]
+    return refs[-1] if refs else None
+
+
+def test_download_ref_is_set_for_code(app, upstream):
+    upstream(response=CANNED_RESPONSE)
+    ref = download_ref(app, generate(app, "A page with code"))
+    assert app.artifact_store.get(ref) == CANNED_RESPONSE
+
+
+def test_download_ref_is_cleared_for_text_only_replies(app, upstream):
+    upstream(response="Which colours would you like?")
+    assert download_ref(app, generate(app, "A page without code")) == ""
+
+
+def test_cancel_without_tasks_runs_callbacks_once(app):
+    cancellation = app.Cancellation()
+    calls = []
+    cancellation.callbacks.append(lambda: calls.append("finish"))
+    cancellation.cancel()
+    cancellation.cancel()
+    assert calls == ["finish"]
+
+    async def late():
+        await cancellation.run(asyncio.get_running_loop().create_future())
+
+    with pytest.raises(app.GenerationCancelled):
+        asyncio.run(late())
+
+
+def test_cancel_runs_callbacks_after_the_task_is_torn_down(app):
+    cancellation = app.Cancellation()
+    events = []
+    cancellation.callbacks.append(lambda: events.append("released"))
+
+    async def request():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            # closing a connection takes a few steps of the loop
+            await asyncio.sleep(0.01)
+            events.append("torn down")
+
+    async def main():
+        running = asyncio.ensure_future(cancellation.run(request()))
+        await asyncio.sleep(0.01)
+        cancellation.cancel()
+        assert events == []
+        with pytest.raises(app.GenerationCancelled):
+            await running
+
+    asyncio.run(main())
+    assert events == ["torn down", "released"]
+
+
+def test_cancelled_generation_releases_its_slot_after_the_upstream_request(app, upstream, monkeypatch):
+    upstream(response_size=20000, chunk_size=16, chunk_delay=0.01)
+    stream = app.async_stream_openrouter_chat
+    torn_down = []
+
+    async def tracked(**kwargs):
+        async with contextlib.aclosing(stream(**kwargs)) as deltas:
+            try:
+                async for delta in deltas:
+                    yield delta
+            finally:
+                torn_down.append(app.scheduler.stats()["running"])
+
+    monkeypatch.setattr(app, "async_stream_openrouter_chat", tracked)
+    state = new_state()
+
+    async def closed_tab():
+        generation = app.GradioEvents.generate_code("A long page", "", state, force_regenerate=True)
+        try:
+            async for update in generation:
+                if app.output in update and update[app.output]["value"]:
+                    break
+            # the tab is gone: Gradio stops pulling and only cancels
+            app.cancel_generations(id(state))
+            for _ in range(500):
+                if app.scheduler.stats()["running"] == 0:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await generation.aclose()
+            await core.aclose_async_clients()
+
+    asyncio.run(closed_tab())
+    # the slot was still held while the upstream stream was closed
+    assert torn_down == [1]
+    assert app.scheduler.stats() == {"queued": 0, "running": 0, "sessions": 0}
+    assert id(state) not in app._running_generations
+
+
+def test_prewarm_fills_the_cache_and_reports_metrics(app, mock_openrouter, monkeypatch):
+    server, endpoint = mock_openrouter(response=CANNED_RESPONSE)
+    monkeypatch.setattr(app, "async_call_openrouter_chat",
+                        functools.partial(core.async_call_openrouter_chat, endpoint=endpoint, api_key="test"))
+    monkeypatch.setattr(app, "response_cache", app.ResponseCache())
+    prewarmer = app.Prewarmer(app.prewarm_prompt, lambda: ["A prewarmed page"] * 2)
+    monkeypatch.setattr(app, "prewarmer", prewarmer)
+
+    async def twice():
+        try:
+            return [await prewarmer.run_once() for _ in range(2)]
+        finally:
+            await core.aclose_async_clients()
+
+    assert asyncio.run(twice()) == [{"generated": 1}, {"cached": 1}]
+    assert server.requests_seen == 1
+    messages = app.first_turn_messages("A prewarmed page")
+    assert app.response_cache.get(app.cache_key(core.MODEL, messages, app.TEMPERATURE)) == CANNED_RESPONSE
+    metrics = app.REGISTRY.render()
+    assert 'prewarm_prompts{result="cached"} 1' in metrics
+    assert f"prewarm_last_run_timestamp_seconds {prewarmer.last_run}" in metrics
@@ -0,0 +1,69 @@
+import zlib
+
+from artifact_store import ArtifactStore, artifact_ref
+from mock_openrouter import CANNED_RESPONSE
+
+
+def test_put_get_round_trip():
+    store = ArtifactStore()
+    text = CANNED_RESPONSE + "\nÜnïcode ✓"
+    ref = store.put(text)
+    assert ref == artifact_ref(text)
+    assert len(ref) == 64
+    assert store.get(ref) == text
+    assert store.get(artifact_ref("never stored")) is None
+    assert store.stats == {"hits": 1, "disk_hits": 0, "misses": 1, "writes": 1}
+
+
+def test_identical_artifacts_are_stored_once():
+    store = ArtifactStore()
+    refs = {store.put(CANNED_RESPONSE) for _ in range(3)}
+    assert refs == {artifact_ref(CANNED_RESPONSE)}
+    assert store.stats["writes"] == 1
+    assert len(store._entries) == 1
+    assert store.raw_size == len(CANNED_RESPONSE)
+    assert store.size == len(zlib.compress(CANNED_RESPONSE.encode("utf-8")))
+    assert store.size < store.raw_size
+
+
+def test_least_recently_used_artifacts_are_evicted_by_size():
+    texts = [f"<p>{n}</p>" * 50 for n in range(3)]
+    blob_size = len(zlib.compress(texts[0].encode("utf-8")))
+    store = ArtifactStore(max_bytes=blob_size * 2)
+    first, second = store.put(texts[0]), store.put(texts[1])
+    # touching the first one makes the second the oldest
+    assert store.put(texts[0]) == first
+    store.put(texts[2])
+    assert store.get(second) is None
+    assert store.get(first) == texts[0]
+    assert store.size <= store.max_bytes
+    assert store.raw_size == len(texts[0]) + len(texts[2])
+
+
+def test_newest_artifact_is_kept_even_over_the_limit():
+    store = ArtifactStore(max_bytes=1)
+    store.put("a")
+    ref = store.put(CANNED_RESPONSE)
+    assert list(store._entries) == [ref]
+    assert store.get(ref) == CANNED_RESPONSE
+
+
+def test_sqlite_keeps_compressed_artifacts_across_restarts(tmp_path):
+    path = str(tmp_path / "artifacts.sqlite3")
+    ref = ArtifactStore(path=path).put(CANNED_RESPONSE)
+    ArtifactStore(path=path).put(CANNED_RESPONSE)
+    store = ArtifactStore(path=path)
+    rows = store._db.execute("SELECT ref, content FROM artifacts").fetchall()
+    assert rows == [(ref, zlib.compress(CANNED_RESPONSE.encode("utf-8")))]
+    assert store.get(ref) == CANNED_RESPONSE
+    assert store.get(ref) == CANNED_RESPONSE
+    assert (store.stats["disk_hits"], store.stats["hits"]) == (1, 1)
+
+
+def test_sqlite_serves_artifacts_evicted_from_memory(tmp_path):
+    store = ArtifactStore(max_bytes=1, path=str(tmp_path / "artifacts.sqlite3"))
+    ref = store.put("first artifact")
+    store.put("second artifact")
+    assert ref not in store._entries
+    assert store.get(ref) == "first artifact"
+    assert store.stats["disk_hits"] == 1
@@ -0,0 +1,115 @@
+import json
+import os
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+import assets
+from assets import ESMCache
+
+
+IMPORTS = {
+    "react": "https://esm.sh/react@18.2.0",
+    "react/": "https://esm.sh/react@18.2.0/",
+    "clsx": "https://esm.sh/clsx@2.0.0?target=es2022",
+    "elsewhere": "https://cdn.example.com/lib.js",
+}
+
+MODULES = {
+    "/react@18.2.0": 'export * from "/react@18.2.0/es2022/react.mjs";',
+    "/react@18.2.0/es2022/react.mjs": 'import "/stable/scheduler@0.23.0/es2022/scheduler.mjs"; export default {};',
+    "/stable/scheduler@0.23.0/es2022/scheduler.mjs": "export default {};",
+    "/react@18.2.0/jsx-runtime": 'export * from "/react@18.2.0/es2022/jsx-runtime.mjs";',
+    "/react@18.2.0/es2022/jsx-runtime.mjs": "export const jsx = () => null;",
+    "/clsx@2.0.0?target=es2022": "export default () => '';",
+}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    # esm.sh stand-in; records the paths it was asked for
+    fetched = []
+
+    def get(url, **kwargs):
+        path = url[len(assets.ESM_ORIGIN):]
+        fetched.append(path)
+        request = httpx.Request("GET", url)
+        if path not in MODULES:
+            return httpx.Response(404, request=request)
+        return httpx.Response(200, text=MODULES[path], request=request,
+                              headers={"content-type": "application/javascript"})
+
+    monkeypatch.setattr(assets.httpx, "get", get)
+    return fetched
+
+
+def client_for(cache):
+    return TestClient(Starlette(routes=[cache.route()]))
+
+
+def test_serves_import_map_entries_and_their_imports(tmp_path, upstream):
+    client = client_for(ESMCache(str(tmp_path), IMPORTS))
+    resp = client.get("/esm/react@18.2.0")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == assets.IMMUTABLE
+    assert '"/esm/react@18.2.0/es2022/react.mjs"' in resp.text
+    assert client.get("/esm/react@18.2.0/es2022/react.mjs").status_code == 200
+    assert client.get("/esm/stable/scheduler@0.23.0/es2022/scheduler.mjs").status_code == 200
+    assert client.get("/esm/clsx@2.0.0?target=es2022").status_code == 200
+
+
+def test_files_under_prefix_entries_are_served(tmp_path, upstream):
+    client = client_for(ESMCache(str(tmp_path), IMPORTS))
+    assert client.get("/esm/react@18.2.0/jsx-runtime").status_code == 200
+    assert client.get("/esm/react@18.2.0/es2022/jsx-runtime.mjs").status_code == 200
+
+
+@pytest.mark.parametrize("path", [
+    "/esm/lodash@4.17.21",
+    "/esm/react@18.2.0?dev",
+    "/esm/react@18.2.0/jsx-runtime?bundle",
+    "/esm/clsx@2.0.0",
+    "/esm/stable/scheduler@0.23.0/es2022/scheduler.mjs",
+    "/esm/lib.js",
+])
+def test_other_paths_are_not_fetched(tmp_path, upstream, path):
+    client = client_for(ESMCache(str(tmp_path), IMPORTS))
+    assert client.get(path).status_code == 404
+    assert upstream == []
+    assert os.listdir(tmp_path) == []
+
+
+def test_recorded_imports_are_served_after_a_restart(tmp_path, upstream):
+    ESMCache(str(tmp_path), IMPORTS).prefetch(IMPORTS)
+    fetched = list(upstream)
+    assert "/stable/scheduler@0.23.0/es2022/scheduler.mjs" in fetched
+    # a fresh process, with the cache directory seeded by the first one
+    client = client_for(ESMCache(str(tmp_path), IMPORTS))
+    resp = client.get("/esm/stable/scheduler@0.23.0/es2022/scheduler.mjs")
+    assert resp.status_code == 200
+    assert upstream == fetched
+
+
+def test_upstream_errors_are_passed_on(tmp_path, upstream):
+    client = client_for(ESMCache(str(tmp_path), IMPORTS))
+    assert client.get("/esm/react@18.2.0/missing.mjs").status_code == 404
+    assert upstream == ["/react@18.2.0/missing.mjs"]
+    # failures are not cached
+    client.get("/esm/react@18.2.0/missing.mjs")
+    assert upstream == ["/react@18.2.0/missing.mjs"] * 2
+
+
+def test_preload_urls_come_from_the_cache(tmp_path, upstream):
+    cache = ESMCache(str(tmp_path), IMPORTS)
+    cache.prefetch(IMPORTS)
+    import_map = cache.import_map(IMPORTS, "http://app")
+    assert import_map["react"] == "http://app/esm/react@18.2.0"
+    assert import_map["elsewhere"] == IMPORTS["elsewhere"]
+    assert cache.preload_urls([import_map["react"]]) == [
+        "http://app/esm/react@18.2.0/es2022/react.mjs",
+        "http://app/esm/stable/scheduler@0.23.0/es2022/scheduler.mjs",
+    ]
+    with open(cache._paths("/react@18.2.0")[1], encoding="utf-8") as f:
+        assert json.load(f)["dependencies"] == ["/react@18.2.0/es2022/react.mjs"]
@@ -0,0 +1,87 @@
+import json
+import functools
+
+import pytest
+
+import batch
+import core
+from batch import Checkpoint, read_prompts, run_batch
+
+
+@pytest.fixture
+def upstream(mock_openrouter, monkeypatch):
+    server, endpoint = mock_openrouter()
+    monkeypatch.setattr(batch, "call_openrouter_chat",
+                        functools.partial(core.call_openrouter_chat, endpoint=endpoint, api_key="test"))
+    return server
+
+
+def write_jsonl(path, rows):
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def test_read_prompts_keeps_lines_without_a_prompt(tmp_path):
+    path = write_jsonl(tmp_path / "prompts.jsonl", ["A page", {"prompt": " "}, {"id": "x"}, {"prompt": "B"}])
+    assert list(read_prompts(path)) == [(0, {"prompt": "A page"}), (1, None), (2, None), (3, {"prompt": "B"})]
+
+
+def test_read_prompts_csv(tmp_path):
+    path = tmp_path / "prompts.csv"
+    path.write_text("id,prompt\nhome,A page\nempty,\n", encoding="utf-8")
+    assert list(read_prompts(str(path))) == [(0, {"id": "home", "prompt": "A page"}), (1, None)]
+
+
+def test_checkpoint_watermark(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    checkpoint = Checkpoint(path)
+    for index in (1, 3, 0):
+        checkpoint.mark(index)
+    assert (checkpoint.next, checkpoint.done) == (2, {3})
+    reloaded = Checkpoint(path)
+    assert [reloaded.is_done(i) for i in range(5)] == [True, True, False, True, False]
+
+
+def test_lines_without_a_prompt_move_the_watermark(tmp_path, upstream):
+    rows = ["A page", {"prompt": ""}, {"id": "no-prompt"}, {"id": "about", "prompt": "An about page"}]
+    path = write_jsonl(tmp_path / "prompts.jsonl", rows)
+    output = tmp_path / "sites"
+    stats = run_batch(path, str(output), concurrency=2)
+    assert (stats["done"], stats["failed"], stats["skipped"]) == (2, 0, 2)
+    assert json.loads((output / ".checkpoint.json").read_text()) == {"next": 4, "done": []}
+    assert (output / "about" / "index.html").exists()
+    assert (output / "000001" / "index.html").exists()
+    # a rerun has nothing left to do
+    stats = run_batch(path, str(output), concurrency=2)
+    assert (stats["done"], stats["skipped"]) == (0, 4)
+    assert upstream.requests_seen == 2
+
+
+def test_read_prompts_skips_unusable_lines(tmp_path, caplog):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('"A page"\n\n{"prompt": "B"\n[1, 2]\n{"prompt": 3}\n{"prompt": "C"}\n', encoding="utf-8")
+    assert list(read_prompts(str(path))) == [(0, {"prompt": "A page"}), (1, None), (2, None), (3, None),
+                                             (4, {"prompt": "C"})]
+    warnings = [record.getMessage() for record in caplog.records]
+    assert warnings[0].startswith("Skipping line 3, invalid JSON")
+    assert warnings[1:] == ["Skipping line 4, expected an object or a string, got list",
+                            "Skipping line 5 without a prompt"]
+
+
+def test_malformed_lines_do_not_stop_the_batch(tmp_path, upstream):
+    path = tmp_path / "prompts.jsonl"
+    path.write_text('{"id": "home", "prompt": "A page"}\n{oops\n42\n"Another page"\n', encoding="utf-8")
+    stats = run_batch(str(path), str(tmp_path / "sites"))
+    assert (stats["done"], stats["failed"], stats["skipped"]) == (2, 0, 2)
+    assert (tmp_path / "sites" / "home" / "index.html").exists()
+    assert (tmp_path / "sites" / "000004" / "index.html").exists()
+
+
+def test_repeated_ids_get_their_own_directory(tmp_path, upstream):
+    rows = [{"id": "home", "prompt": "A"}, {"id": "home", "prompt": "B"}, {"id": "home!", "prompt": "C"}]
+    path = write_jsonl(tmp_path / "prompts.jsonl", rows)
+    output = tmp_path / "sites"
+    assert run_batch(path, str(output))["done"] == 3
+    assert sorted(p.name for p in output.iterdir() if p.is_dir()) == ["home", "home-000002", "home-000003"]
+    # a rerun resolves the same names and finds nothing left to do
+    assert run_batch(path, str(output))["skipped"] == 3
@@ -0,0 +1,88 @@
+import io
+import zipfile
+
+import pytest
+from starlette.applications import Starlette
+from starlette.testclient import TestClient
+
+from artifact_store import ArtifactStore
+from downloads import code_files, download_route, package_artifact
+from mock_openrouter import CANNED_REACT_RESPONSE, CANNED_RESPONSE, pad_response
+
+
+@pytest.fixture
+def store():
+    return ArtifactStore()
+
+
+@pytest.fixture
+def client(store):
+    return TestClient(Starlette(routes=[download_route(store)]))
+
+
+def test_code_files_has_no_fallback():
+    assert code_files("Sorry, I can only help with web pages.") == {}
+    assert code_files("```python\nprint(1)\n```") == {}
+    assert list(code_files(CANNED_RESPONSE)) == ["index.html"]
+
+
+def test_html_artifact():
+    filename, media_type, body = package_artifact(CANNED_RESPONSE)
+    assert (filename, media_type) == ("index.html", "text/html; charset=utf-8")
+    assert body.decode("utf-8").startswith("<!DOCTYPE html>")
+
+
+def test_react_artifact_is_a_zip():
+    filename, media_type, body = package_artifact(CANNED_REACT_RESPONSE)
+    assert (filename, media_type) == ("app.zip", "application/zip")
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert sorted(archive.namelist()) == ["App.jsx", "index.html"]
+        assert '"react": "https://esm.sh/react@18.2.0"' in archive.read("index.html").decode("utf-8")
+
+
+def test_text_only_reply_has_no_artifact():
+    assert package_artifact("Which colours would you like?") is None
+
+
+def test_download(client, store):
+    ref = store.put(CANNED_RESPONSE)
+    resp = client.get(f"/download/{ref}")
+    assert resp.status_code == 200
+    assert resp.headers["etag"] == f'"{ref}"'
+    assert resp.headers["content-disposition"] == 'attachment; filename="index.html"'
+    assert resp.content == package_artifact(CANNED_RESPONSE)[2]
+
+
+def test_large_download_is_compressed(client, store):
+    text = pad_response(CANNED_RESPONSE, 20000)
+    ref = store.put(text)
+    resp = client.get(f"/download/{ref}", headers={"Accept-Encoding": "gzip"})
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["etag"] == f'"{ref}-gzip"'
+    assert resp.content == package_artifact(text)[2]
+    raw = client.get(f"/download/{ref}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in raw.headers
+    assert raw.headers["etag"] == f'"{ref}"'
+
+
+@pytest.mark.parametrize("suffix", ["", "-gzip", "-br"])
+def test_matching_etag_is_not_modified(client, store, suffix):
+    ref = store.put(CANNED_RESPONSE)
+    resp = client.get(f"/download/{ref}", headers={"If-None-Match": f'"other", W/"{ref}{suffix}"'})
+    assert resp.status_code == 304
+    assert resp.headers["etag"] == f'"{ref}{suffix}"'
+
+
+@pytest.mark.parametrize("tag", ['"{ref}0"', '"{ref}-deflate"', '"{ref}', "{ref}", '"{short}"'])
+def test_other_etags_are_not_a_match(client, store, tag):
+    ref = store.put(CANNED_RESPONSE)
+    resp = client.get(f"/download/{ref}", headers={"If-None-Match": tag.format(ref=ref, short=ref[:8])})
+    assert resp.status_code == 200
+
+
+def test_missing_and_text_only_refs_are_404(client, store):
+    assert client.get("/download/" + "0" * 32).status_code == 404
+    ref = store.put("Which colours would you like?")
+    resp = client.get(f"/download/{ref}")
+    assert resp.status_code == 404
+    assert "no code" in resp.text
@@ -0,0 +1,93 @@
+import time
+import asyncio
+
+import httpx
+import pytest
+
+import core
+from metrics import REGISTRY
+from mock_openrouter import CANNED_RESPONSE
+
+
+MESSAGES = [{"role": "user", "content": "Make a page"}]
+TRUNCATED = "Here is your page:\n\n```html\n<!DOCTYPE html>\n<html>\n<body><h1>Hi"
+
+
+@pytest.fixture(autouse=True)
+def latency_stats(monkeypatch):
+    stats = {}
+    monkeypatch.setattr(core, "model_latency_stats", stats)
+    return stats
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await core.aclose_async_clients()
+    return asyncio.run(main())
+
+
+def fanout(endpoint, mode, deadline=5.0):
+    start = time.perf_counter()
+    result = run(core.fanout_openrouter_chat(MESSAGES, models=["slow", "fast"], mode=mode,
+                                             deadline=deadline, endpoint=endpoint, api_key="test"))
+    return result, time.perf_counter() - start
+
+
+def test_score_artifact():
+    assert core.score_artifact("no code") == 0
+    assert core.score_artifact(TRUNCATED) == 1
+    assert core.score_artifact(CANNED_RESPONSE) == 2
+
+
+def test_first_complete_artifact_wins_and_losers_are_cancelled(mock_openrouter, latency_stats):
+    server, endpoint = mock_openrouter(model_latency={"fast": 0.05, "slow": 2.0})
+    result, elapsed = fanout(endpoint, "first")
+    assert result == ("fast", CANNED_RESPONSE)
+    assert elapsed < 1.0
+    assert server.requests_seen == 2
+    # the slow request was cancelled, not recorded as an answer or an error
+    assert "slow" not in latency_stats
+    assert latency_stats["fast"]["requests"] == 1
+
+
+def test_first_mode_waits_for_a_complete_artifact(mock_openrouter):
+    _, endpoint = mock_openrouter(response=TRUNCATED, model_latency={"fast": 0.05, "slow": 0.3})
+    result, elapsed = fanout(endpoint, "first")
+    # no answer scores 2, so every model is heard and the earliest best is kept
+    assert result == ("fast", TRUNCATED)
+    assert elapsed >= 0.3
+
+
+def test_best_mode_collects_until_every_model_answered(mock_openrouter, latency_stats):
+    _, endpoint = mock_openrouter(model_latency={"fast": 0.05, "slow": 0.3})
+    result, elapsed = fanout(endpoint, "best")
+    assert result == ("fast", CANNED_RESPONSE)
+    assert elapsed >= 0.3
+    assert latency_stats["slow"]["requests"] == latency_stats["fast"]["requests"] == 1
+
+
+def test_best_mode_stops_at_the_deadline(mock_openrouter, latency_stats):
+    _, endpoint = mock_openrouter(model_latency={"fast": 0.05, "slow": 2.0})
+    result, elapsed = fanout(endpoint, "best", deadline=0.3)
+    assert result == ("fast", CANNED_RESPONSE)
+    assert elapsed < 1.0
+    assert "slow" not in latency_stats
+
+
+def test_error_is_raised_when_no_model_answers(mock_openrouter, latency_stats):
+    _, endpoint = mock_openrouter(error_rate=1.0, error_status=400)
+    with pytest.raises(httpx.HTTPStatusError):
+        fanout(endpoint, "first")
+    assert latency_stats["fast"]["errors"] == latency_stats["slow"]["errors"] == 1
+
+
+def test_latency_is_exposed_in_metrics(mock_openrouter):
+    _, endpoint = mock_openrouter(model_latency={"fast": 0.05, "slow": 0.1})
+    fanout(endpoint, "best")
+    text = REGISTRY.render()
+    assert 'model_requests{model="fast",state="requests"} 1' in text
+    assert 'model_requests{model="slow",state="errors"} 0' in text
+    assert 'model_latency_seconds{model="slow",quantile="0.95"}' in text
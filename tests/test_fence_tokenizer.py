@@ -0,0 +1,78 @@
+import pytest
+
+import core
+from mock_openrouter import CANNED_ARTIFACTS
+
+
+HTML = "<!DOCTYPE html>\n<html>\n<body><h1>Hi</h1></body>\n</html>"
+RESPONSE = f"Here is your page:\n\n```html\n{HTML}\n```\n\nEnjoy!\n"
+
+
+def feed_in_chunks(text, size):
+    tokenizer = core.FenceTokenizer()
+    for i in range(0, len(text), size):
+        tokenizer.feed(text[i:i + size])
+    return tokenizer.finish().files()
+
+
+def test_single_block():
+    assert core.get_generated_files(RESPONSE) == {"index.html": HTML}
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_fences_split_across_deltas(size):
+    # every cut point, including inside the ``` and the language tag
+    assert feed_in_chunks(RESPONSE, size) == {"index.html": HTML}
+
+
+@pytest.mark.parametrize("name", sorted(CANNED_ARTIFACTS))
+def test_streamed_like_the_mock_server(name):
+    text = CANNED_ARTIFACTS[name]
+    assert feed_in_chunks(text, 16) == core.get_generated_files(text)
+
+
+def test_crlf_and_trailing_spaces():
+    text = RESPONSE.replace("```html\n", "```html  \n").replace("\n", "\r\n")
+    assert core.get_generated_files(text) == {"index.html": HTML.replace("\n", "\r\n")}
+
+
+def test_unclosed_final_block_is_kept():
+    text = "Here you go:\n```html\n<html>\n<body>cut off"
+    assert core.get_generated_files(text) == {"index.html": "<html>\n<body>cut off"}
+    assert feed_in_chunks(text, 4) == {"index.html": "<html>\n<body>cut off"}
+
+
+def test_unclosed_block_is_not_returned_before_finish():
+    tokenizer = core.FenceTokenizer().feed("```html\n<html>\n")
+    assert tokenizer.files() == {}
+    assert tokenizer.finish().files() == {"index.html": "<html>"}
+
+
+def test_nested_fence_inside_longer_fence():
+    # a ```` block may contain ``` lines, which do not close it
+    inner = "<pre>\n```js\nconsole.log(1)\n```\n</pre>"
+    text = f"````html\n{inner}\n````\n"
+    assert core.get_generated_files(text) == {"index.html": inner}
+    assert feed_in_chunks(text, 3) == {"index.html": inner}
+
+
+def test_inline_backticks_do_not_open_a_block():
+    text = "Use ```html blocks``` like this:\n```html\n<p>x</p>\n```\n"
+    assert core.get_generated_files(text) == {"index.html": "<p>x</p>"}
+
+
+def test_languages_map_to_canonical_files():
+    text = "```jsx\nexport default () => null\n```\n```javascript\nconsole.log(1)\n```\n```python\nprint(1)\n```\n"
+    assert core.get_generated_files(text) == {
+        "index.tsx": "export default () => null",
+        "index.js": "console.log(1)",
+    }
+
+
+def test_blocks_of_one_language_are_joined():
+    text = "```html\n<p>a</p>\n```\ntext\n```htm\n<p>b</p>\n```\n"
+    assert core.get_generated_files(text) == {"index.html": "<p>a</p>\n<p>b</p>"}
+
+
+def test_no_blocks_falls_back_to_the_whole_text():
+    assert core.get_generated_files("  <p>plain</p>\n") == {"index.html": "<p>plain</p>"}
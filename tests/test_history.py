@@ -0,0 +1,112 @@
+from artifact_store import ArtifactStore
+from history import HistoryManager, compact_artifact, estimate_tokens
+
+
+def artifact(n, lines=3):
+    body = "\n".join(f"<p>version {n} line {i}</p>" for i in range(lines))
+    return f"Version {n}:\n\n```html\n{body}\n```\n\nDone."
+
+
+def test_compact_artifact_stubs_every_block():
+    text = "a\n```js\nx()\ny()\n```\nb\n```\nplain\n```"
+    assert compact_artifact(text) == ("a\n```js\n// earlier version omitted (3 lines), see the latest artifact\n```\nb\n"
+                                      "```code\n// earlier version omitted (2 lines), see the latest artifact\n```")
+    assert compact_artifact("no code here") == "no code here"
+
+
+def test_only_the_newest_artifact_stays_inline():
+    manager = HistoryManager(token_budget=10_000)
+    state = {}
+    manager.append_turn(state, "make a page", artifact(1))
+    manager.append_turn(state, "thanks", "You're welcome.")
+    manager.append_turn(state, "make it blue", artifact(2))
+    history = state["history"]
+    assert history[1]["content"] == compact_artifact(artifact(1))
+    assert "version 1" not in history[1]["content"]
+    assert history[3]["content"] == "You're welcome."
+    assert history[5]["content"] == artifact(2)
+    assert manager.latest_artifact(state) == artifact(2)
+    assert state["token_counts"] == [estimate_tokens(m["content"]) for m in history]
+    assert manager.history_tokens(state) == sum(state["token_counts"])
+
+
+def test_reply_without_code_keeps_the_artifact():
+    manager = HistoryManager(token_budget=10_000)
+    state = {}
+    manager.append_turn(state, "make a page", artifact(1))
+    manager.append_turn(state, "what does it do?", "It shows a page.")
+    assert state["history"][1]["content"] == artifact(1)
+    assert state["artifact_index"] == 1
+
+
+def test_oldest_exchanges_are_dropped_over_budget():
+    manager = HistoryManager(token_budget=40)
+    state = {}
+    for n in range(5):
+        manager.append_turn(state, f"prompt {n}", f"reply {n} " + "x" * 40)
+    assert manager.history_tokens(state) <= 40
+    assert [m["content"] for m in state["history"]][-2:] == ["prompt 4", "reply 4 " + "x" * 40]
+    assert len(state["history"]) == len(state["token_counts"])
+    assert state["history_tokens"] == sum(state["token_counts"])
+
+
+def test_latest_exchange_is_kept_even_over_budget():
+    manager = HistoryManager(token_budget=5)
+    state = {}
+    manager.append_turn(state, "make a page", artifact(1, lines=50))
+    manager.append_turn(state, "again", artifact(2, lines=50))
+    assert len(state["history"]) == 2
+    assert manager.latest_artifact(state) == artifact(2, lines=50)
+
+
+def test_artifact_index_is_dropped_with_its_exchange():
+    manager = HistoryManager(token_budget=30)
+    state = {}
+    manager.append_turn(state, "make a page", artifact(1))
+    manager.append_turn(state, "now talk", "x" * 100)
+    assert state["artifact_index"] is None
+    assert manager.latest_artifact(state) is None
+
+
+def test_state_without_counts_is_rebuilt():
+    manager = HistoryManager(token_budget=10_000)
+    history = [{"role": "user", "content": "make a page"},
+               {"role": "assistant", "content": artifact(1)},
+               {"role": "user", "content": "thanks"},
+               {"role": "assistant", "content": "ok"}]
+    state = {"history": list(history)}
+    assert manager.history_tokens(state) == sum(estimate_tokens(m["content"]) for m in history)
+    assert manager.latest_artifact(state) == artifact(1)
+    manager.clear(state)
+    assert state == {"history": [], "token_counts": [], "history_tokens": 0, "artifact_index": None}
+
+
+def test_store_keeps_stubs_in_state_and_inlines_upstream():
+    store = ArtifactStore()
+    manager = HistoryManager(token_budget=10_000, store=store)
+    state = {}
+    manager.append_turn(state, "make a page", artifact(1))
+    manager.append_turn(state, "make it blue", artifact(2))
+    old, new = state["history"][1], state["history"][3]
+    assert "artifact" not in old
+    assert old["content"] == compact_artifact(artifact(1))
+    assert new["content"] == compact_artifact(artifact(2))
+    assert store.get(new["artifact"]) == artifact(2)
+    # the budget counts the full artifact, not its stub
+    assert state["token_counts"][3] == estimate_tokens(artifact(2))
+    assert manager.messages(state) == [
+        {"role": "user", "content": "make a page"},
+        {"role": "assistant", "content": compact_artifact(artifact(1))},
+        {"role": "user", "content": "make it blue"},
+        {"role": "assistant", "content": artifact(2)},
+    ]
+    assert manager.latest_artifact(state) == artifact(2)
+
+
+def test_evicted_artifact_falls_back_to_its_stub():
+    store = ArtifactStore(max_bytes=1)
+    manager = HistoryManager(token_budget=10_000, store=store)
+    state = {}
+    manager.append_turn(state, "make a page", artifact(1))
+    store.put("something else")
+    assert manager.latest_artifact(state) == compact_artifact(artifact(1))
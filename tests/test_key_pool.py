@@ -0,0 +1,183 @@
+import time
+import asyncio
+
+import pytest
+import requests
+
+import core
+from key_pool import KeyPool, parse_reset
+from mock_openrouter import CANNED_RESPONSE
+
+
+MESSAGES = [{"role": "user", "content": "Make a page"}]
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # pooled requests (api_key=None) use these keys
+    def use(*keys, **options):
+        key_pool = KeyPool(keys, **options)
+        monkeypatch.setattr(core, "key_pool", key_pool)
+        return key_pool
+    return use
+
+
+def key_stats(key_pool, key):
+    return key_pool.stats()[[k.key for k in key_pool.keys].index(key)]
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await core.aclose_async_clients()
+    return asyncio.run(main())
+
+
+def test_parse_reset():
+    assert parse_reset("1700000000000") == 1700000000
+    assert parse_reset("1700000000") == 1700000000
+    assert parse_reset("30", now=100) == 130
+    assert parse_reset(None) is None
+
+
+def test_no_keys():
+    with pytest.raises(RuntimeError):
+        KeyPool([]).acquire()
+
+
+def test_least_loaded_key_is_leased():
+    key_pool = KeyPool(["key-a", "key-b", "key-c"])
+    leases = [key_pool.acquire() for _ in range(3)]
+    assert sorted(lease.key for lease in leases) == ["key-a", "key-b", "key-c"]
+    leases[1].release()
+    assert key_pool.acquire().key == leases[1].key
+    # a second release is a no-op
+    leases[1].release()
+    assert [k["in_flight"] for k in key_pool.stats()] == [1, 1, 1]
+
+
+def test_remaining_quota_breaks_ties():
+    key_pool = KeyPool(["key-a", "key-b"])
+    for remaining in ("3", "9"):
+        lease = key_pool.acquire()
+        lease.record(200, {"x-ratelimit-remaining": remaining, "x-ratelimit-limit": "10"})
+        lease.release()
+    assert key_stats(key_pool, "key-a")["remaining"] == 3
+    assert key_pool.acquire().key == "key-b"
+
+
+def test_exhausted_quota_parks_the_key_until_reset():
+    key_pool = KeyPool(["key-a", "key-b"])
+    lease = key_pool.acquire()
+    lease.record(200, {"x-ratelimit-remaining": "0", "x-ratelimit-reset": "30"})
+    lease.release()
+    assert 29 < key_stats(key_pool, "key-a")["available_in"] <= 30
+    assert [key_pool.acquire().key for _ in range(2)] == ["key-b", "key-b"]
+
+
+def test_429_quarantines_for_retry_after():
+    key_pool = KeyPool(["key-a", "key-b"], quarantine=30)
+    lease = key_pool.acquire()
+    lease.record(429, {}, retry_after=5)
+    lease.release()
+    stats = key_stats(key_pool, lease.key)
+    assert stats["throttled"] == 1
+    assert 4 < stats["available_in"] <= 5
+    assert all(key_pool.acquire().key != lease.key for _ in range(3))
+
+
+def test_429_backoff_doubles_without_retry_after():
+    key_pool = KeyPool(["key-a"], quarantine=10)
+    api_key = key_pool.keys[0]
+    key_pool.acquire().record(429)
+    assert api_key.quarantined_until - time.monotonic() == pytest.approx(10, abs=0.5)
+    # a 429 for a request sent before the quarantine is no new strike
+    key_pool.acquire().record(429)
+    assert api_key.quarantined_until - time.monotonic() == pytest.approx(10, abs=0.5)
+    api_key.quarantined_until = 0
+    key_pool.acquire().record(429)
+    assert api_key.quarantined_until - time.monotonic() == pytest.approx(20, abs=0.5)
+    key_pool.acquire().record(200)
+    assert api_key.strikes == 0
+
+
+def test_throttled_key_is_quarantined_and_the_request_moves_on(mock_openrouter, pool):
+    server, endpoint = mock_openrouter(key_limit=1, key_window=60)
+    # key-a has used its quota before the pool knew about it
+    core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="key-a")
+    key_pool = pool("key-a", "key-b")
+    start = time.perf_counter()
+    data = core.call_openrouter_chat(MESSAGES, endpoint=endpoint)
+    assert data["choices"][0]["message"]["content"] == CANNED_RESPONSE
+    # the next key went at once instead of waiting out the Retry-After
+    assert time.perf_counter() - start < 1
+    assert server.key_throttled == {"key-a": 1}
+    assert server.key_requests == {"key-a": 2, "key-b": 1}
+    stats = key_stats(key_pool, "key-a")
+    assert stats["throttled"] == 1
+    assert stats["available_in"] > 50
+
+
+def test_rejected_key_is_parked(mock_openrouter, pool):
+    server, endpoint = mock_openrouter(valid_keys=["good-key"])
+    key_pool = pool("bad-key", "good-key")
+    for _ in range(3):
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint)
+    assert server.key_requests == {"bad-key": 1, "good-key": 3}
+    stats = key_stats(key_pool, "bad-key")
+    assert stats["rejected"] == 1
+    assert stats["available_in"] > 3500
+
+
+@pytest.mark.parametrize("status", [402, 403])
+def test_credit_and_moderation_errors_do_not_rotate_keys(mock_openrouter, pool, status):
+    server, endpoint = mock_openrouter(fail_first=1, error_status=status)
+    key_pool = pool("key-a", "key-b")
+    with pytest.raises(requests.HTTPError) as error:
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint)
+    assert error.value.response.status_code == status
+    assert server.requests_seen == 1
+    assert all(k["available_in"] == 0 and k["rejected"] == 0 and k["in_flight"] == 0 for k in key_pool.stats())
+
+
+def test_lease_is_held_until_the_stream_ends(mock_openrouter, pool):
+    _, endpoint = mock_openrouter(chunk_size=8)
+    key_pool = pool("key-a", "key-b")
+    stream = core.stream_openrouter_chat(MESSAGES, endpoint=endpoint)
+    first = next(stream)
+    assert sum(k["in_flight"] for k in key_pool.stats()) == 1
+    assert first + "".join(stream) == CANNED_RESPONSE
+    assert sum(k["in_flight"] for k in key_pool.stats()) == 0
+
+
+def test_lease_is_released_when_a_stream_is_closed(mock_openrouter, pool):
+    _, endpoint = mock_openrouter(chunk_size=8)
+    key_pool = pool("key-a")
+    stream = core.stream_openrouter_chat(MESSAGES, endpoint=endpoint)
+    next(stream)
+    stream.close()
+    assert key_pool.stats()[0]["in_flight"] == 0
+
+
+def test_lease_is_released_when_an_async_stream_is_cancelled(mock_openrouter, pool):
+    _, endpoint = mock_openrouter(chunk_size=8, chunk_delay=0.05)
+    key_pool = pool("key-a", "key-b")
+
+    async def cancel_mid_stream():
+        started = asyncio.Event()
+
+        async def consume():
+            async for _ in core.async_stream_openrouter_chat(MESSAGES, endpoint=endpoint):
+                started.set()
+
+        task = asyncio.ensure_future(consume())
+        await started.wait()
+        assert sum(k["in_flight"] for k in key_pool.stats()) == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run(cancel_mid_stream())
+    assert sum(k["in_flight"] for k in key_pool.stats()) == 0
@@ -0,0 +1,135 @@
+import pytest
+
+import core
+from patches import PatchError, _resolve, apply_edits, parse_edits, parse_search_replace, parse_unified_diff
+
+
+HTML = """<!DOCTYPE html>
+<html>
+<body>
+  <button class="red">Go</button>
+  <p>Hello</p>
+</body>
+</html>"""
+FILES = {"index.html": HTML}
+
+
+def search_replace(search, replace, filename="index.html"):
+    header = f"{filename}\n" if filename else ""
+    return f"{header}```html\n<<<<<<< SEARCH\n{search}=======\n{replace}>>>>>>> REPLACE\n```"
+
+
+def test_parse_search_replace_blocks():
+    text = ("Making it blue:\n\n" + search_replace('<button class="red">\n', '<button class="blue">\n') + "\n\n" +
+            search_replace("<p>Hello</p>\n", "<p>Hi</p>\n", filename="**./index.html:**"))
+    assert parse_search_replace(text) == [
+        ("index.html", '<button class="red">\n', '<button class="blue">\n'),
+        ("index.html", "<p>Hello</p>\n", "<p>Hi</p>\n"),
+    ]
+
+
+def test_parse_search_replace_without_filename_or_fence():
+    text = "<<<<<<< SEARCH\nold\n=======\nnew\n>>>>>>> REPLACE"
+    assert parse_search_replace(text) == [(None, "old\n", "new\n")]
+    assert parse_search_replace("no edits here") == []
+
+
+def test_parse_unified_diff_hunks():
+    text = """```diff
+--- a/index.html
++++ b/index.html
+@@ -3,3 +3,3 @@
+ <body>
+-  <button class="red">Go</button>
++  <button class="blue">Go</button>
+   <p>Hello</p>
+@@ -6,1 +6,2 @@ more
+ </html>
++<!-- end -->
+\\ No newline at end of file
+```"""
+    assert parse_unified_diff(text) == [
+        ("index.html", '<body>\n  <button class="red">Go</button>\n  <p>Hello</p>\n',
+         '<body>\n  <button class="blue">Go</button>\n  <p>Hello</p>\n'),
+        ("index.html", "</html>\n", "</html>\n<!-- end -->\n"),
+    ]
+
+
+def test_parse_edits_prefers_search_replace():
+    text = search_replace("<p>Hello</p>\n", "<p>Hi</p>\n") + "\n@@ -1 +1 @@\n-a\n+b\n"
+    assert parse_edits(text) == [("index.html", "<p>Hello</p>\n", "<p>Hi</p>\n")]
+    assert parse_edits("@@ -1 +1 @@\n-a\n+b\n") == [(None, "a\n", "b\n")]
+    assert parse_edits(None) == parse_edits("plain answer") == []
+
+
+@pytest.mark.parametrize("filename, expected", [
+    ("index.tsx", "index.tsx"),
+    ("src/App.tsx", "index.tsx"),
+    ("style.css", "style.css"),
+    ("./page.css", "style.css"),
+])
+def test_resolve_matches_names_then_extensions(filename, expected):
+    assert _resolve(filename, {"index.tsx": "", "style.css": ""}) == expected
+
+
+def test_resolve_single_file_and_unknown_names():
+    assert _resolve("App.jsx", FILES) == "index.html"
+    assert _resolve(None, FILES) == "index.html"
+    with pytest.raises(PatchError, match="unknown file"):
+        _resolve("main.py", {"index.tsx": "", "style.css": ""})
+
+
+def test_apply_exact_edit():
+    edits = parse_edits(search_replace('<button class="red">Go</button>\n', '<button class="blue">Go</button>\n'))
+    assert apply_edits(FILES, edits) == {"index.html": HTML.replace("red", "blue")}
+
+
+def test_apply_unified_diff():
+    text = "@@ -4,1 +4,1 @@\n-  <p>Hello</p>\n+  <p>Hi</p>\n"
+    assert apply_edits(FILES, parse_edits(text)) == {"index.html": HTML.replace("Hello", "Hi")}
+
+
+def test_whitespace_tolerant_fallback():
+    # the model re-indented the SEARCH lines and dropped a trailing space
+    edits = [("index.html", '<button class="red">Go</button>\n    <p>Hello</p>  \n', '  <p>Only</p>')]
+    assert apply_edits(FILES, edits)["index.html"] == HTML.replace(
+        '  <button class="red">Go</button>\n  <p>Hello</p>', "  <p>Only</p>")
+
+
+def test_whitespace_fallback_at_the_last_line():
+    edits = [(None, "  </html>\n", "</html>\n<!-- end -->")]
+    assert apply_edits(FILES, edits)["index.html"] == HTML + "\n<!-- end -->"
+
+
+def test_edits_apply_all_or_nothing():
+    files = dict(FILES)
+    edits = [(None, "Go", "Stop"), (None, "<p>Missing</p>", "<p>x</p>")]
+    with pytest.raises(PatchError, match="not found"):
+        apply_edits(files, edits)
+    assert files == FILES
+
+
+@pytest.mark.parametrize("edits, message", [
+    ([], "No edits"),
+    ([(None, " \n", "x")], "Empty SEARCH"),
+    ([(None, "<", "[")], "matches"),
+])
+def test_rejected_edits(edits, message):
+    with pytest.raises(PatchError, match=message):
+        apply_edits(FILES, edits)
+
+
+def test_ambiguous_fallback_is_rejected():
+    files = {"index.html": "<p>\n  a\n</p>\n<p>\n    a\n</p>\n"}
+    with pytest.raises(PatchError, match="not found"):
+        apply_edits(files, [(None, "<p>\na\n", "<p>\nb\n")])
+
+
+def test_apply_edit_response():
+    text = search_replace("<p>Hello</p>\n", "<p>Hi</p>\n")
+    patched = core.apply_edit_response(FILES, text)
+    assert patched.startswith("Applied 1 edit:")
+    assert core.get_generated_files(patched) == {"index.html": HTML.replace("Hello", "Hi")}
+    # a full answer is kept as is; an edit that does not apply falls back
+    assert core.apply_edit_response(FILES, "```html\n<html></html>\n```") == "```html\n<html></html>\n```"
+    assert core.apply_edit_response(FILES, search_replace("<p>Gone</p>\n", "")) is None
@@ -0,0 +1,60 @@
+import asyncio
+
+from prewarm import Prewarmer, PromptLog
+
+
+def test_prompt_log_top():
+    log = PromptLog(maxlen=5)
+    for prompt in ["old", "old", "old", " todo ", "todo", "", None, "blog", "todo"]:
+        log.record(prompt)
+    # "old" has scrolled out of the window; single prompts are not frequent
+    assert log.top(5) == ["todo"]
+    assert log.top(5, min_count=1) == ["todo", "old", "blog"]
+    assert log.top(1, min_count=1) == ["todo"]
+
+
+def test_run_once_warms_each_prompt_once_within_the_concurrency():
+    running = []
+    peak = []
+    seen = []
+
+    async def warm(prompt):
+        seen.append(prompt)
+        running.append(prompt)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(prompt)
+        return "cached" if prompt == "b" else "generated"
+
+    prewarmer = Prewarmer(warm, lambda: ["a", "b", "a", "c", "d"], concurrency=2)
+    assert prewarmer.last_run is None
+    results = asyncio.run(prewarmer.run_once())
+    assert results == {"generated": 3, "cached": 1}
+    assert sorted(seen) == ["a", "b", "c", "d"]
+    assert max(peak) == 2
+    assert prewarmer.last_run is not None
+
+
+def test_failures_are_counted_and_do_not_stop_the_run():
+    async def warm(prompt):
+        if prompt == "bad":
+            raise RuntimeError("upstream down")
+        return "generated"
+
+    prewarmer = Prewarmer(warm, lambda: ["good", "bad"])
+    assert asyncio.run(prewarmer.run_once()) == {"generated": 1, "error": 1}
+    # stats add up over runs
+    asyncio.run(prewarmer.run_once())
+    assert prewarmer.stats == {"generated": 2, "error": 2}
+
+
+def test_run_forever_without_interval_runs_once():
+    calls = []
+
+    async def warm(prompt):
+        calls.append(prompt)
+        return "generated"
+
+    prewarmer = Prewarmer(warm, lambda: ["a"], interval=0)
+    asyncio.run(asyncio.wait_for(prewarmer.run_forever(), 5))
+    assert calls == ["a"]
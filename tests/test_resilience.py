@@ -0,0 +1,223 @@
+import time
+import asyncio
+from email.utils import formatdate
+
+import pytest
+import requests
+
+import core
+import resilience
+from mock_openrouter import CANNED_RESPONSE
+from resilience import CircuitBreaker, CircuitOpenError, TokenBucket, backoff_delay, parse_retry_after
+
+
+MESSAGES = [{"role": "user", "content": "Make a page"}]
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await core.aclose_async_clients()
+    return asyncio.run(main())
+
+
+# ---------- backoff ----------
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("soon") is None
+    assert 55 <= parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_backoff_delay_honours_retry_after_up_to_the_cap():
+    for attempt in range(6):
+        assert 0 <= backoff_delay(attempt, base=0.5, cap=4) <= 4
+        assert backoff_delay(attempt, base=0.01, cap=20, retry_after=3) >= 3
+    assert backoff_delay(0, base=0.01, cap=5, retry_after=60) <= 5
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retry_waits_for_retry_after(mock_openrouter, status):
+    server, endpoint = mock_openrouter(fail_first=1, error_status=status, retry_after=1)
+    start = time.perf_counter()
+    data = core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    assert time.perf_counter() - start >= 1
+    assert data["choices"][0]["message"]["content"] == CANNED_RESPONSE
+    assert server.requests_seen == 2
+
+
+def test_gives_up_after_max_retries(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(core, "MAX_RETRIES", 2)
+    server, endpoint = mock_openrouter(fail_first=10, error_status=502, retry_after=0)
+    with pytest.raises(requests.HTTPError):
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    assert server.requests_seen == 3
+
+
+def test_client_errors_are_not_retried(mock_openrouter):
+    server, endpoint = mock_openrouter(fail_first=1, error_status=400)
+    with pytest.raises(requests.HTTPError):
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    assert server.requests_seen == 1
+
+
+# ---------- circuit breaker ----------
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        assert breaker.check() is False
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError, match="another 30s"):
+        breaker.check()
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_trial_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.check() is True
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.check() is False
+
+
+def test_failed_trial_opens_the_circuit_again(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.check() is True
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    clock.now += 1
+    assert breaker.check() is True
+
+
+def test_abandoned_trial_lets_the_next_request_try(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.check() is True
+    breaker.abandon_trial()
+    assert breaker.check() is True
+
+
+def test_breaker_opens_and_recovers_against_the_mock(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(core, "MAX_RETRIES", 0)
+    server, endpoint = mock_openrouter(fail_first=core.BREAKER_THRESHOLD, error_status=503)
+    breaker = core.get_circuit_breaker(endpoint)
+    monkeypatch.setattr(breaker, "reset_timeout", 0.2)
+    for _ in range(core.BREAKER_THRESHOLD):
+        with pytest.raises(requests.HTTPError):
+            core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    # fails fast without reaching the upstream
+    with pytest.raises(CircuitOpenError):
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    assert server.requests_seen == core.BREAKER_THRESHOLD
+    time.sleep(0.2)
+    assert breaker.state == "half_open"
+    core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    assert breaker.state == "closed"
+    assert server.requests_seen == core.BREAKER_THRESHOLD + 1
+
+
+def test_cancelled_trial_does_not_keep_the_circuit_open(mock_openrouter, monkeypatch):
+    server, endpoint = mock_openrouter(latency=0.5)
+    breaker = core.get_circuit_breaker(endpoint)
+    monkeypatch.setattr(breaker, "reset_timeout", 0.05)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    time.sleep(0.05)
+
+    async def cancel_the_trial():
+        trial = asyncio.ensure_future(core.async_call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test"))
+        await asyncio.sleep(0.2)
+        # the trial is waiting for the upstream, so other requests fail fast
+        with pytest.raises(CircuitOpenError):
+            await core.async_call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+        return await core.async_call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+
+    data = run(cancel_the_trial())
+    assert data["choices"][0]["message"]["content"] == CANNED_RESPONSE
+    assert breaker.state == "closed"
+
+
+# ---------- token bucket ----------
+
+def test_token_bucket_disabled():
+    bucket = TokenBucket(0)
+    assert all(bucket.reserve() == 0 for _ in range(100))
+
+
+def test_token_bucket_burst_then_queue(clock):
+    bucket = TokenBucket(10, capacity=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    # later callers wait their turn, one token interval apart
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+
+
+def test_token_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket(2)
+    assert bucket.capacity == 2
+    bucket.reserve()
+    bucket.reserve()
+    clock.now += 0.5
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.5)
+    clock.now += 60
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() > 0
+
+
+def test_rate_limit_spaces_requests(mock_openrouter, monkeypatch):
+    monkeypatch.setattr(core, "rate_limiter", TokenBucket(20, capacity=1))
+    _, endpoint = mock_openrouter()
+    start = time.perf_counter()
+    for _ in range(5):
+        core.call_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")
+    assert time.perf_counter() - start >= 4 / 20
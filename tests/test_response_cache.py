@@ -0,0 +1,108 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, cache_key
+
+
+MESSAGES = [{"role": "system", "content": "be brief"}, {"role": "user", "content": "make a page"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_key_is_stable_and_normalized():
+    key = cache_key("m", MESSAGES, 0.7)
+    assert key == cache_key("m", [dict(message) for message in MESSAGES], 0.7)
+    # line endings, surrounding whitespace and extra message fields don't matter
+    noisy = [{"role": "system", "content": "be brief\r\n"},
+             {"role": "user", "content": "  make a page", "name": "x"}]
+    assert cache_key("m", noisy, 0.7) == key
+    assert cache_key("m", [{"role": "user"}], 0.7) == cache_key("m", [{"role": "user", "content": None}], 0.7)
+
+
+@pytest.mark.parametrize("change", [
+    lambda: cache_key("other", MESSAGES, 0.7),
+    lambda: cache_key("m", MESSAGES, 0.2),
+    lambda: cache_key("m", MESSAGES[1:], 0.7),
+    lambda: cache_key("m", [MESSAGES[0], {"role": "assistant", "content": "make a page"}], 0.7),
+])
+def test_key_depends_on_model_messages_and_temperature(change):
+    assert change() != cache_key("m", MESSAGES, 0.7)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.get("a") == "A"
+    cache.set("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+    assert cache.stats == {"memory_hits": 3, "disk_hits": 0, "misses": 1, "writes": 3}
+
+
+def test_contains_refreshes_recency_without_counting():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert cache.contains("a")
+    cache.set("c", "C")
+    assert not cache.contains("b")
+    assert cache.contains("a")
+    assert cache.stats["memory_hits"] == cache.stats["misses"] == 0
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResponseCache(ttl=60)
+    cache.set("a", "A")
+    clock[0] += 60
+    assert cache.get("a") == "A"
+    clock[0] += 1
+    assert not cache.contains("a")
+    assert cache.get("a") is None
+    assert "a" not in cache._entries
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    ResponseCache(path=path).set("a", "Ünïcode ```html\n<p></p>\n```")
+    cache = ResponseCache(path=path)
+    assert cache.contains("a")
+    assert cache.get("a") == "Ünïcode ```html\n<p></p>\n```"
+    assert cache.get("a") == "Ünïcode ```html\n<p></p>\n```"
+    assert cache.stats["disk_hits"] == 1
+    assert cache.stats["memory_hits"] == 1
+
+
+def test_sqlite_tier_outlives_memory_eviction(tmp_path):
+    cache = ResponseCache(max_entries=1, path=str(tmp_path / "responses.sqlite3"))
+    cache.set("a", "A")
+    cache.set("b", "B")
+    assert "a" not in cache._entries
+    assert cache.get("a") == "A"
+    assert cache.stats["disk_hits"] == 1
+
+
+def test_sqlite_tier_expires_and_prunes(tmp_path, clock):
+    path = str(tmp_path / "responses.sqlite3")
+    cache = ResponseCache(ttl=60, path=path)
+    cache.set("old", "O")
+    clock[0] += 61
+    restarted = ResponseCache(ttl=60, path=path)
+    assert restarted.get("old") is None
+    restarted.set("new", "N")
+    rows = restarted._db.execute("SELECT key FROM responses").fetchall()
+    assert rows == [("new", )]
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "responses.sqlite3"))
+    cache.set("a", "A")
+    cache.clear()
+    assert cache.get("a") is None
+    assert ResponseCache(path=cache.path).get("a") is None
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+
+import pytest
+
+from scheduler import AdmissionError, DuplicateSubmitError, FairScheduler
+
+
+def drain(scheduler, running):
+    # releases the running ticket until the queue is empty and returns
+    # the sessions in the order they were admitted
+    order = []
+    while running:
+        scheduler.release(running)
+        running = next((t for r in scheduler.running.values() for t in r), None)
+        if running is not None:
+            order.append(running.session)
+    return order
+
+
+def test_sessions_interleave_instead_of_draining_in_turn():
+    scheduler = FairScheduler(concurrency=1, max_queued_per_session=3)
+    blocker = scheduler.submit("x", 1)
+    for session in ("a", "b"):
+        for _ in range(3):
+            scheduler.submit(session, 1)
+    assert drain(scheduler, blocker) == ["a", "b", "a", "b", "a", "b"]
+
+
+def test_short_request_overtakes_a_long_one():
+    scheduler = FairScheduler(concurrency=1)
+    blocker = scheduler.submit("x", 1)
+    scheduler.submit("long", 1000)
+    scheduler.submit("short", 10)
+    assert drain(scheduler, blocker) == ["short", "long"]
+
+
+def test_low_weight_requests_go_last():
+    scheduler = FairScheduler(concurrency=1)
+    blocker = scheduler.submit("x", 1)
+    scheduler.submit("prewarm", 100, weight=0.25)
+    scheduler.submit("live", 200)
+    assert drain(scheduler, blocker) == ["live", "prewarm"]
+
+
+def test_per_session_in_flight_cap():
+    scheduler = FairScheduler(concurrency=10, per_session=2, max_queued_per_session=5)
+    a = [scheduler.submit("a", 1) for _ in range(3)]
+    assert [t.admitted for t in a] == [True, True, False]
+    b = scheduler.submit("b", 1)
+    assert b.admitted
+    assert scheduler.stats() == {"queued": 1, "running": 3, "sessions": 2}
+    scheduler.release(a[0])
+    assert a[2].admitted
+    assert len(scheduler.running["a"]) == 2
+
+
+def test_queue_limit_and_duplicates():
+    scheduler = FairScheduler(concurrency=1, max_queued_per_session=2)
+    scheduler.submit("a", 1, key="first")
+    with pytest.raises(DuplicateSubmitError):
+        scheduler.submit("a", 1, key="first")
+    scheduler.submit("a", 1, key="second")
+    with pytest.raises(DuplicateSubmitError):
+        scheduler.submit("a", 1, key="second")
+    scheduler.submit("a", 1)
+    with pytest.raises(AdmissionError):
+        scheduler.submit("a", 1)
+    # the same key from another session is a different request
+    scheduler.submit("b", 1, key="first")
+
+
+def test_position_counts_only_requests_ahead():
+    scheduler = FairScheduler(concurrency=1)
+    blocker = scheduler.submit("x", 1)
+    long = scheduler.submit("long", 1000)
+    short = scheduler.submit("short", 10)
+    assert scheduler.position(blocker) == 0
+    assert scheduler.position(short) == 1
+    assert scheduler.position(long) == 2
+    scheduler.release(blocker)
+    assert scheduler.position(short) == 0
+    assert scheduler.position(long) == 1
+
+
+def test_releasing_a_queued_ticket_drops_it():
+    scheduler = FairScheduler(concurrency=1)
+    blocker = scheduler.submit("x", 1)
+    queued = scheduler.submit("a", 1)
+    scheduler.release(queued)
+    scheduler.release(queued)
+    assert scheduler.stats() == {"queued": 0, "running": 1, "sessions": 1}
+    scheduler.release(blocker)
+    assert not queued.admitted
+    assert scheduler.stats() == {"queued": 0, "running": 0, "sessions": 0}
+
+
+def test_timed_out_waits_leave_no_waiters():
+    scheduler = FairScheduler(concurrency=1)
+    blocker = scheduler.submit("x", 1)
+    ticket = scheduler.submit("a", 1)
+
+    async def main():
+        for _ in range(5):
+            assert not await scheduler.wait(ticket, 0.01)
+        assert ticket._waiters == []
+        # released from another thread, like a finished worker
+        threading.Timer(0.05, scheduler.release, (blocker, )).start()
+        assert await scheduler.wait(ticket, 5)
+        assert ticket._waiters == []
+        assert await scheduler.wait(ticket, 0)
+
+    asyncio.run(main())
+
+
+def test_cancelled_wait_leaves_no_waiters():
+    scheduler = FairScheduler(concurrency=1)
+    scheduler.submit("x", 1)
+    ticket = scheduler.submit("a", 1)
+
+    async def main():
+        task = asyncio.create_task(scheduler.wait(ticket))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert ticket._waiters == []
+
+    asyncio.run(main())
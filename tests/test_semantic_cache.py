@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from semantic_cache import SemanticCache, embed
+
+
+def test_embedding_is_normalized_and_ignores_filler():
+    vector = embed("Make a purple todo app", 512)
+    assert vector.dtype == np.float32
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    # stopwords, case, plurals and accents do not change the embedding
+    assert np.allclose(embed("please create a PURPLE Todo website", 512), embed("purple todos", 512))
+    assert np.allclose(embed("café menu", 512), embed("cafe menu", 512))
+    assert not embed("make me a simple page", 512).any()
+
+
+def test_reworded_prompt_hits_and_unrelated_misses():
+    cache = SemanticCache(max_entries=10)
+    cache.add("Make a purple todo app with dark mode", "todo")
+    cache.add("A landing page for a coffee shop", "coffee")
+    score, prompt, value = cache.lookup("todo app, dark mode, purple")
+    assert value == "todo"
+    assert prompt == "Make a purple todo app with dark mode"
+    assert score >= cache.threshold
+    assert cache.lookup("Snake game with a high score table") is None
+
+
+def test_threshold_boundary():
+    cache = SemanticCache(max_entries=10, threshold=0.0)
+    cache.add("purple todo app with dark mode", "todo")
+    score = cache.lookup("purple todo app")[0]
+    assert 0.0 < score < 1.0
+    assert cache.lookup("purple todo app", threshold=score)[2] == "todo"
+    assert cache.lookup("purple todo app", threshold=np.nextafter(np.float32(score), np.float32(2))) is None
+
+
+def test_namespaces_do_not_match_each_other():
+    cache = SemanticCache(max_entries=10)
+    cache.add("purple todo app", "html", namespace="html prompt")
+    assert cache.lookup("purple todo app", namespace="react prompt") is None
+    assert cache.lookup("purple todo app", namespace="html prompt")[2] == "html"
+
+
+def test_prompts_without_content_are_not_indexed():
+    cache = SemanticCache(max_entries=10)
+    cache.add("make me a page please", "nothing")
+    assert cache.size == 0
+    assert cache.lookup("make me a page please") is None
+
+
+def test_index_grows_until_full_then_replaces_the_least_recently_used():
+    cache = SemanticCache(max_entries=3, dim=64)
+    for n, prompt in enumerate(["todo list", "weather widget", "kanban board"]):
+        cache.add(prompt, n)
+        assert cache.size == n + 1
+    assert cache.matrix.shape == (3, 64)
+    assert np.allclose(np.linalg.norm(cache.matrix, axis=1), 1.0)
+    # a hit counts as a use, so "weather widget" is now the oldest
+    assert cache.lookup("todo list")[2] == 0
+    cache.add("music player", 3)
+    assert cache.size == 3
+    assert cache.lookup("weather widget", threshold=0.99) is None
+    assert [cache.lookup(p)[2] for p in ("todo list", "kanban board", "music player")] == [0, 2, 3]
+    assert len(cache._rows) == 3
+
+
+def test_same_prompt_replaces_its_entry():
+    cache = SemanticCache(max_entries=3)
+    cache.add("Purple todo app", "old")
+    cache.add("  purple TODO app ", "new")
+    assert cache.size == 1
+    assert cache.lookup("purple todo app")[2] == "new"
@@ -0,0 +1,69 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore, open_session_store
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return open_session_store("memory://")
+    return open_session_store(f"sqlite:///{tmp_path / 'sessions.sqlite3'}")
+
+
+def turn(n):
+    return [{"role": "user", "content": f"prompt {n}"}, {"role": "assistant", "content": f"reply {n}"}]
+
+
+def test_append_history_and_clear(store):
+    store.append("a", turn(1))
+    store.append("b", turn(9))
+    store.append("a", turn(2))
+    assert store.history("a") == turn(1) + turn(2)
+    assert store.history("a", limit=3) == (turn(1) + turn(2))[-3:]
+    store.clear("a")
+    assert store.history("a") == []
+    assert store.history("b") == turn(9)
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+    class Partial(SessionStore):
+        def append(self, session_id, messages):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert isinstance(MemorySessionStore(), SessionStore)
+
+
+def test_sqlite_store_is_created_on_first_use(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    store = SQLiteSessionStore(str(path))
+    assert not path.exists()
+    store.append("a", turn(1))
+    assert path.exists()
+    # a second process sees the turns
+    assert SQLiteSessionStore(str(path)).history("a") == turn(1)
+
+
+def test_unsupported_url():
+    with pytest.raises(ValueError):
+        open_session_store("redis://localhost")
+
+
+def test_importing_the_app_creates_no_files(tmp_path):
+    env = {**os.environ, "KEY": "test", "PYTHONPATH": ROOT}
+    for name in ("SESSION_STORE", "SESSION_SECRET", "SESSION_SECRET_FILE", "RESPONSE_CACHE_PATH",
+                 "ARTIFACT_STORE_PATH"):
+        env.pop(name, None)
+    subprocess.run([sys.executable, "-c", "import app"], cwd=tmp_path, env=env, check=True, timeout=120)
+    assert os.listdir(tmp_path) == []
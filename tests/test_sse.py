@@ -0,0 +1,142 @@
+import io
+import json
+import asyncio
+
+import httpx
+import pytest
+import requests
+
+import core
+from mock_openrouter import CANNED_RESPONSE
+
+
+MESSAGES = [{"role": "user", "content": "Make a page"}]
+
+
+def data(content=None, **chunk):
+    if content is not None:
+        chunk["choices"] = [{"index": 0, "delta": {"content": content}}]
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}"
+
+
+def run(coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await core.aclose_async_clients()
+    return asyncio.run(main())
+
+
+def test_keep_alive_and_blank_lines_carry_no_deltas():
+    assert core.parse_sse_line(": OPENROUTER PROCESSING") == []
+    assert core.parse_sse_line(b": OPENROUTER PROCESSING\r\n") == []
+    assert core.parse_sse_line("") == []
+    assert core.parse_sse_line("event: message") == []
+
+
+def test_deltas_stop_at_done():
+    lines = [
+        ": OPENROUTER PROCESSING",
+        "",
+        data("Hello"),
+        "",
+        ": OPENROUTER PROCESSING",
+        data(", world"),
+        "data: [DONE]",
+        data("after the end"),
+    ]
+    assert list(core.iter_sse_deltas(lines)) == ["Hello", ", world"]
+
+
+def test_usage_chunk_is_copied():
+    usage = {}
+    assert core.parse_sse_line(data(choices=[], usage={"prompt_tokens": 3}), usage) == []
+    assert usage == {"prompt_tokens": 3}
+
+
+def test_done_without_space_and_empty_deltas():
+    assert core.parse_sse_line("data:[DONE]") is None
+    assert core.parse_sse_line(data(choices=[{"index": 0, "delta": {"role": "assistant"}}])) == []
+
+
+def test_error_chunk_mid_stream_raises():
+    lines = [data("partial"), data(error={"code": 502, "message": "Provider returned error"}), data("never")]
+    deltas = core.iter_sse_deltas(lines)
+    assert next(deltas) == "partial"
+    with pytest.raises(RuntimeError, match="Provider returned error"):
+        next(deltas)
+
+
+def test_error_chunk_with_string_error():
+    with pytest.raises(RuntimeError, match="overloaded"):
+        core.parse_sse_line(data(error="overloaded"))
+
+
+def test_utf8_split_across_network_chunks():
+    # every character is several bytes and the body arrives a byte at a time
+    text = "héllo wörld ✓ 🎨"
+    body = f"{data(text)}\n\n{data('ü')}\n\ndata: [DONE]\n\n".encode("utf-8")
+    resp = requests.models.Response()
+    resp.status_code = 200
+    resp.raw = io.BytesIO(body)
+    assert "".join(core.iter_sse_deltas(resp.iter_lines(chunk_size=1))) == text + "ü"
+
+
+def test_utf8_split_across_network_chunks_async():
+    text = "héllo wörld ✓ 🎨"
+    body = f"{data(text)}\n\ndata: [DONE]\n\n".encode("utf-8")
+
+    async def bytewise():
+        for i in range(len(body)):
+            yield body[i:i + 1]
+
+    async def read():
+        resp = httpx.Response(200, content=bytewise())
+        deltas = []
+        async for line in resp.aiter_lines():
+            parsed = core.parse_sse_line(line)
+            if parsed is None:
+                break
+            deltas.extend(parsed)
+        return "".join(deltas)
+
+    assert asyncio.run(read()) == text
+
+
+def test_stream_from_mock_server(mock_openrouter):
+    _, endpoint = mock_openrouter(chunk_size=7)
+    assert "".join(core.stream_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")) == CANNED_RESPONSE
+
+
+def test_async_stream_from_mock_server(mock_openrouter):
+    _, endpoint = mock_openrouter(chunk_size=7)
+
+    async def collect():
+        return "".join([delta async for delta in
+                        core.async_stream_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test")])
+
+    assert run(collect()) == CANNED_RESPONSE
+
+
+def test_stream_reports_when_it_finished(mock_openrouter):
+    _, endpoint = mock_openrouter()
+    status = {}
+    assert "".join(core.stream_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test",
+                                               status=status)) == CANNED_RESPONSE
+    assert status == {"finished": True}
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_truncated_stream_is_not_finished(mock_openrouter, use_async):
+    _, endpoint = mock_openrouter(truncate=True)
+    status = {}
+    if use_async:
+        async def collect():
+            return "".join([delta async for delta in core.async_stream_openrouter_chat(
+                MESSAGES, endpoint=endpoint, api_key="test", status=status)])
+        content = run(collect())
+    else:
+        content = "".join(core.stream_openrouter_chat(MESSAGES, endpoint=endpoint, api_key="test", status=status))
+    assert content == CANNED_RESPONSE
+    assert status == {}
@@ -0,0 +1,85 @@
+import json
+
+from metrics import Histogram
+from ui_updates import SIZE_BUCKETS, UpdateFilter, digest, wire_size
+
+
+TRACKED = {"output": "output", "sandbox": "sandbox"}
+
+
+def update(value, **props):
+    return {"__type__": "update", "value": value, **props}
+
+
+def test_digest_ignores_key_order():
+    assert digest({"a": 1, "b": "x"}) == digest({"b": "x", "a": 1})
+    assert digest(update("x")) != digest(update("y"))
+
+
+def test_wire_size_counts_only_appended_text():
+    assert wire_size(update("héllo")) == len(json.dumps(update("héllo")).encode("utf-8"))
+    rest = len(json.dumps({"__type__": "update"}))
+    assert wire_size(update("héllo world"), "héllo") == len(" world") + rest
+    # a value that does not extend the previous one is sent in full
+    assert wire_size(update("other"), "héllo") == wire_size(update("other"))
+    assert wire_size("plain", "pla") == len(json.dumps("plain"))
+
+
+def test_unchanged_tracked_components_are_skipped():
+    digests = {}
+    updates = UpdateFilter(TRACKED, digests)
+    first = {"output": update("code"), "sandbox": update("<html>"), "spinner": update(True)}
+    assert updates.filter(first) == first
+    assert updates.filter({"output": update("code"), "sandbox": update("<html>"), "spinner": update(True)}) == {
+        "spinner": update(True)
+    }
+    assert updates.filter({"output": update("code 2"), "sandbox": update("<html>")}) == {"output": update("code 2")}
+    assert set(digests) == {"output", "sandbox"}
+
+
+def test_digests_carry_over_to_the_next_event():
+    digests = {}
+    UpdateFilter(TRACKED, digests).filter({"sandbox": update("<html>")})
+    # regenerating the same artifact does not send the sandbox again
+    assert UpdateFilter(TRACKED, digests).filter({"sandbox": update("<html>"), "tab": update("render")}) == {
+        "tab": update("render")
+    }
+
+
+def test_props_without_value_are_always_sent():
+    updates = UpdateFilter(TRACKED, {})
+    assert updates.filter({"output": {"__type__": "update", "visible": True}}) == {
+        "output": {"__type__": "update", "visible": True}
+    }
+    assert updates.filter({"output": {"__type__": "update", "visible": True}}) == {
+        "output": {"__type__": "update", "visible": True}
+    }
+
+
+def test_empty_update_becomes_a_no_op_and_close_repeats_nothing():
+    updates = UpdateFilter(TRACKED, {})
+    updates.filter({"output": update("code")})
+    assert updates.filter({"output": update("code")}) == {"output": {"__type__": "update"}}
+    assert updates.filter({}) == updates.close() == {"output": {"__type__": "update"}}
+
+
+def test_bytes_sent_counts_streamed_text_as_diffs():
+    histogram = Histogram("ui_update_bytes", "test", buckets=SIZE_BUCKETS)
+    updates = UpdateFilter(TRACKED, {}, histogram)
+    sizes = []
+    for text in ("a" * 100, "a" * 150, "a" * 150, "b" * 10):
+        before = updates.bytes_sent
+        updates.filter({"output": update(text), "spinner": update(True)})
+        sizes.append(updates.bytes_sent - before)
+    spinner = wire_size(update(True))
+    rest = len(json.dumps({"__type__": "update"}))
+    assert sizes == [wire_size(update("a" * 100)) + spinner, 50 + rest + spinner, spinner,
+                     wire_size(update("b" * 10)) + spinner]
+    # a component left out of an update is sent in full next time
+    before = updates.bytes_sent
+    updates.filter({"spinner": update(False)})
+    updates.filter({"output": update("b" * 20)})
+    assert updates.bytes_sent - before == wire_size(update(False)) + wire_size(update("b" * 20))
+    [(labels, (counts, total, value_sum))] = histogram._values.items()
+    assert total == 6
+    assert value_sum == updates.bytes_sent
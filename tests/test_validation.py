@@ -0,0 +1,135 @@
+import pytest
+
+import core
+from mock_openrouter import CANNED_ARTIFACTS
+from validation import validate_files, validate_html, validate_jsx
+
+
+COMPONENT = """import React, { useState } from "react";
+
+export default function App() {
+  const [count, setCount] = useState(0);
+  return (
+    <div className="p-4">
+      <button onClick={() => setCount(count + 1)}>Clicked {count} times</button>
+    </div>
+  );
+}
+"""
+
+
+@pytest.mark.parametrize("name", sorted(CANNED_ARTIFACTS))
+def test_canned_artifacts_pass(name):
+    files = core.get_generated_files(CANNED_ARTIFACTS[name])
+    assert validate_files(files)[0] == []
+
+
+# ---------- HTML ----------
+
+def test_optional_end_tags_may_stay_open():
+    html = "<!DOCTYPE html><html><head><title>t</title><body><ul><li>one<li>two</ul><p>text<table><tr><td>x</table>"
+    assert validate_html(html) == []
+
+
+def test_void_and_self_closing_elements():
+    assert validate_html('<div><img src="a.png"><br/><input type="text"></input><svg><path d="M0"/></svg></div>') == []
+
+
+@pytest.mark.parametrize("html, error", [
+    ("<div><span>text</div>", "<span> opened on line 1 is closed by </div> on line 1"),
+    ("<div>\n<section>", "<section> opened on line 2 is never closed"),
+    ("<div></span></div>", "</span> on line 1 has no matching opening tag"),
+    ('<body><div class="a', "The document ends inside a tag"),
+    ("<body><!-- unfinished", "The document ends inside a tag"),
+])
+def test_html_errors(html, error):
+    assert any(error in problem for problem in validate_html(html))
+
+
+def test_truncated_html_document():
+    html = "<!DOCTYPE html>\n<html>\n<body>\n<main>\n<div class=\"card\">\n<h1>Title</h1>\n</div>\n</main>\n</body>\n</html>"
+    for cut in range(html.index("<main>") + 1, html.index("</main>")):
+        assert validate_html(html[:cut]), html[:cut]
+
+
+# ---------- JSX / TSX ----------
+
+def test_component_passes():
+    assert validate_jsx(COMPONENT) == []
+
+
+@pytest.mark.parametrize("code", [
+    "const half = total / 2 / count;",
+    "const re = /[/)]+\\/(x)/gi; const y = a.replace(/</g, '&lt;');",
+    "if (/^\\d+$/.test(value)) { x = (a) / (b); }",
+    "const ok = items.filter((i) => i.n / 2 > 1).length / n;",
+])
+def test_regex_and_division(code):
+    assert validate_jsx(code) == []
+
+
+@pytest.mark.parametrize("code", [
+    "const id = <T,>(value: T): T => value;",
+    "const pick = <K extends keyof Props>(key: K) => props[key];",
+    "const list: Array<string> = []; const ok = a < b && c > d;",
+    "function useBox<T>(init: T) { return useState<T>(init); }",
+])
+def test_typescript_generics_and_comparisons(code):
+    assert validate_jsx(code) == []
+
+
+def test_fragments_and_nested_expressions():
+    code = """export default function List({ items }) {
+  return (
+    <>
+      {items.map((item) => (
+        <Item.Row key={item.id} label={`#${item.id} ${item.name}`} {...item}>
+          {item.done ? <span>done</span> : <em>todo</em>}
+        </Item.Row>
+      ))}
+    </>
+  );
+}"""
+    assert validate_jsx(code) == []
+
+
+@pytest.mark.parametrize("code, error", [
+    ("function f() { return [1, 2);", "'[' opened on line 1 is closed by ')' on line 1"),
+    ("function f() {\n  if (x) {\n    y();\n}", "'{' opened on line 1 is never closed"),
+    ("const a = 1; }", "Unexpected '}' on line 1"),
+    ("const s = 'unterminated;\n", "Unterminated string starting on line 1"),
+    ("const t = `open ${x}", "Unterminated template literal"),
+    ("/* no end", "Unterminated comment"),
+    ("const r = /abc\n", "Unterminated regular expression"),
+])
+def test_unbalanced_brackets_and_literals(code, error):
+    errors = validate_jsx(code)
+    # the scan stops at the first structural error
+    assert len(errors) == 1
+    assert errors[0].startswith(error)
+
+
+@pytest.mark.parametrize("code, error", [
+    ("const a = <div><span>x</div>;", "<span> opened on line 1 is closed by </div> on line 1"),
+    ("const a = (\n  <div>\n    <p>text", "<p> opened on line 3 is never closed"),
+    ('const a = <div className="x', "Unterminated string"),
+    ("const a = <Button onClick", "<Button> tag opened on line 1 is cut off"),
+    ("const a = <>\n  <b>x</b>\n", "<> opened on line 1 is never closed"),
+])
+def test_jsx_errors(code, error):
+    errors = validate_jsx(code)
+    assert len(errors) == 1
+    assert error in errors[0]
+
+
+def test_truncated_component():
+    for cut in range(COMPONENT.index("return"), len(COMPONENT) - 3, 7):
+        assert validate_jsx(COMPONENT[:cut]), COMPONENT[:cut]
+
+
+def test_validate_files_reports_missing_imports():
+    imports = {"react": "https://esm.sh/react"}
+    code = 'import confetti from "canvas-confetti";\n' + COMPONENT
+    errors, seconds = validate_files({"index.tsx": code, "notes.md": "<div>"}, imports)
+    assert errors == ["index.tsx: Imports modules that are not available: canvas-confetti"]
+    assert seconds >= 0
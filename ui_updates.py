@@ -0,0 +1,71 @@
+import json
+import hashlib
+
+
+# Trims the UI updates a generation yields before Gradio sends them.
+#
+# Gradio sends a yielded value in full unless the same component was in the
+# previous yield as well, in which case it sends a diff (only the appended
+# text, for the streamed Markdown). The final message of the event then
+# repeats the last yield in full. UpdateFilter
+#   - drops updates of the tracked components (the code view and the
+#     sandbox) that match what the browser already shows, by digest; the
+#     digests live in the session state, so regenerating an artifact that is
+#     already in the sandbox does not send it again,
+#   - estimates the bytes each update puts on the wire, and
+#   - ends the event with a no-op update, so the final message does not
+#     carry the artifact a second time.
+#
+# Gradio reads an empty dict as a single output value, so an update with
+# nothing left in it becomes a no-op update of a tracked component.
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def digest(props):
+    blob = json.dumps(props, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def wire_size(props, previous=None):
+    value = props.get("value") if isinstance(props, dict) else None
+    if isinstance(value, str) and isinstance(previous, str) and value.startswith(previous):
+        rest = {k: v for k, v in props.items() if k != "value"}
+        return len(value.encode("utf-8")) - len(previous.encode("utf-8")) + len(json.dumps(rest, default=str))
+    return len(json.dumps(props, default=str).encode("utf-8"))
+
+
+class UpdateFilter:
+
+    def __init__(self, tracked, digests, histogram=None):
+        # tracked: {component: name}; digests: {name: digest of what the
+        # browser shows}, kept by the caller across events
+        self.tracked = tracked
+        self.digests = digests
+        self.histogram = histogram
+        self.previous = {}
+        self.bytes_sent = 0
+
+    def filter(self, update):
+        filtered = {}
+        previous, self.previous = self.previous, {}
+        size = 0
+        for component, props in update.items():
+            name = self.tracked.get(component)
+            if name is not None and isinstance(props, dict) and "value" in props:
+                props_digest = digest(props)
+                if self.digests.get(name) == props_digest:
+                    continue
+                self.digests[name] = props_digest
+            if isinstance(props, dict) and "value" in props:
+                self.previous[component] = props["value"]
+            size += wire_size(props, previous.get(component))
+            filtered[component] = props
+        self.bytes_sent += size
+        if self.histogram is not None:
+            self.histogram.observe(size)
+        return filtered or self.close()
+
+    def close(self):
+        # the last update of the event, which Gradio sends again in full
+        return {next(iter(self.tracked)): {"__type__": "update"}}
@@ -0,0 +1,325 @@
+import re
+import time
+from html.parser import HTMLParser
+
+from import_map import prune_import_map
+
+
+# Fast local checks run on an artifact before it is rendered, so truncated
+# or broken code can be sent back for one repair instead of showing up as
+# a blank iframe. The checks are structural, not full parsers: they catch
+# truncation, unbalanced brackets and JSX tags, and imports the sandbox
+# cannot resolve, and err on the side of passing code a browser accepts.
+
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+}
+# elements whose end tag browsers infer; leaving them open is not an error
+OPTIONAL_END = {
+    "html", "head", "body", "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th", "thead", "tbody", "tfoot",
+    "colgroup", "caption", "rt", "rp",
+}
+MAX_ERRORS = 5
+
+
+class _HTMLChecker(HTMLParser):
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []
+        self.errors = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag not in VOID_ELEMENTS:
+            self.stack.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                unclosed = [t for t in self.stack[i + 1:] if t[0] not in OPTIONAL_END]
+                for name, line in unclosed:
+                    self.errors.append(f"<{name}> opened on line {line} is closed by </{tag}> on line {self.getpos()[0]}")
+                del self.stack[i:]
+                return
+        if tag not in OPTIONAL_END:
+            self.errors.append(f"</{tag}> on line {self.getpos()[0]} has no matching opening tag")
+
+
+def validate_html(code):
+    checker = _HTMLChecker()
+    checker.feed(code)
+    # whatever the parser could not consume is an unterminated tag or comment
+    rest = checker.rawdata
+    checker.close()
+    errors = checker.errors
+    if rest.lstrip().startswith("<"):
+        errors.append(f"The document ends inside a tag: {rest.strip()[:40]!r}")
+    for name, line in checker.stack:
+        if name not in OPTIONAL_END:
+            errors.append(f"<{name}> opened on line {line} is never closed")
+    return errors
+
+
+# ---------- JSX / TSX ----------
+IDENTIFIER_START = re.compile(r"[A-Za-z_$]")
+TAG_NAME = re.compile(r"[A-Za-z_$][\w$.:-]*")
+WORD = re.compile(r"[\w$]+")
+NUMBER = re.compile(r"[\w.]+")
+# a "<" after these starts JSX; after an identifier or ")" it is a
+# comparison or a generic type argument
+JSX_PRECEDERS = set("([{,;=:?!&|>}") | {"", "return", "=>", "yield", "default", "case", "await"}
+REGEX_PRECEDERS = set("([{,;=:?!&|+-*%~^<>}") | {"", "return", "typeof", "case", "yield", "await"}
+CLOSERS = {"(": ")", "[": "]", "{": "}"}
+TYPE_PARAMETERS = re.compile(r"\s*(?:,|extends\s)")
+CHILD_TEXT = re.compile(r"[{<]")
+
+
+class _ScanStopped(Exception):
+    pass
+
+
+class _JSXScanner:
+
+    def __init__(self, code):
+        self.code = code
+        self.pos = 0
+        self.errors = []
+        self.prev = ""  # previous significant token, for "<" and "/" decisions
+
+    def line(self, pos=None):
+        return self.code.count("\n", 0, self.pos if pos is None else pos) + 1
+
+    def error(self, message):
+        self.errors.append(message)
+        # one structural error usually causes the rest; stop here
+        raise _ScanStopped()
+
+    def run(self):
+        try:
+            self.scan_js(None)
+        except _ScanStopped:
+            pass
+        return self.errors
+
+    def skip_string(self, quote):
+        start = self.pos
+        self.pos += 1
+        while self.pos < len(self.code):
+            char = self.code[self.pos]
+            if char == "\\":
+                self.pos += 2
+                continue
+            if char == quote:
+                self.pos += 1
+                return
+            if char == "\n":
+                break
+            self.pos += 1
+        self.error(f"Unterminated string starting on line {self.line(start)}")
+
+    def skip_template(self):
+        start = self.pos
+        self.pos += 1
+        while self.pos < len(self.code):
+            char = self.code[self.pos]
+            if char == "\\":
+                self.pos += 2
+                continue
+            if char == "`":
+                self.pos += 1
+                return
+            if self.code.startswith("${", self.pos):
+                self.pos += 2
+                self.scan_js("}")
+                continue
+            self.pos += 1
+        self.error(f"Unterminated template literal starting on line {self.line(start)}")
+
+    def skip_comment(self):
+        if self.code.startswith("//", self.pos):
+            end = self.code.find("\n", self.pos)
+            self.pos = len(self.code) if end < 0 else end
+            return True
+        if self.code.startswith("/*", self.pos):
+            end = self.code.find("*/", self.pos + 2)
+            if end < 0:
+                self.error(f"Unterminated comment starting on line {self.line()}")
+            self.pos = end + 2
+            return True
+        return False
+
+    def skip_regex(self):
+        start = self.pos
+        self.pos += 1
+        in_class = False
+        while self.pos < len(self.code):
+            char = self.code[self.pos]
+            if char == "\\":
+                self.pos += 2
+                continue
+            if char == "\n":
+                break
+            if char == "[":
+                in_class = True
+            elif char == "]":
+                in_class = False
+            elif char == "/" and not in_class:
+                self.pos += 1
+                while self.pos < len(self.code) and self.code[self.pos].isalpha():
+                    self.pos += 1
+                return
+            self.pos += 1
+        self.error(f"Unterminated regular expression on line {self.line(start)}")
+
+    def scan_js(self, closer):
+        # Scans code until `closer` (or the end), checking bracket balance.
+        stack = []
+        code = self.code
+        while self.pos < len(code):
+            char = code[self.pos]
+            if char in " \t\r\n":
+                self.pos += 1
+                continue
+            if char == "/" and self.skip_comment():
+                continue
+            if char in "'\"":
+                self.skip_string(char)
+                self.prev = "str"
+            elif char == "`":
+                self.skip_template()
+                self.prev = "str"
+            elif char == "/" and self.prev in REGEX_PRECEDERS:
+                self.skip_regex()
+                self.prev = "str"
+            elif char in CLOSERS:
+                stack.append((char, self.pos))
+                self.pos += 1
+                self.prev = char
+            elif char in ")]}":
+                if not stack:
+                    if char == closer:
+                        self.pos += 1
+                        self.prev = char
+                        return
+                    self.error(f"Unexpected '{char}' on line {self.line()}")
+                opener, where = stack.pop()
+                if CLOSERS[opener] != char:
+                    self.error(f"'{opener}' opened on line {self.line(where)} is closed by '{char}' on line {self.line()}")
+                self.pos += 1
+                self.prev = char
+            elif char == "<" and self.prev in JSX_PRECEDERS and (
+                    code.startswith(">", self.pos + 1) or IDENTIFIER_START.match(code, self.pos + 1)):
+                self.scan_element()
+                self.prev = ")"
+            elif IDENTIFIER_START.match(char):
+                word = WORD.match(code, self.pos).group(0)
+                self.pos += len(word)
+                self.prev = word if word in JSX_PRECEDERS or word in REGEX_PRECEDERS else "id"
+            elif char.isdigit():
+                self.pos = NUMBER.match(code, self.pos).end()
+                self.prev = "id"
+            else:
+                two = code[self.pos:self.pos + 2]
+                if two in ("=>", "&&", "||", "?."):
+                    self.prev = "=>" if two == "=>" else two[0]
+                    self.pos += 2
+                else:
+                    self.prev = char
+                    self.pos += 1
+        if stack:
+            opener, where = stack[-1]
+            self.error(f"'{opener}' opened on line {self.line(where)} is never closed")
+        if closer is not None:
+            self.error(f"Missing '{closer}' at the end of the file")
+
+    def scan_element(self):
+        # at "<" of an opening tag or fragment
+        start = self.pos
+        self.pos += 1
+        match = TAG_NAME.match(self.code, self.pos)
+        name = match.group(0) if match else ""
+        self.pos = match.end() if match else self.pos
+        if name and TYPE_PARAMETERS.match(self.code, self.pos):
+            # TSX generic arrow function, "<T,>(x: T) => x"
+            end = self.code.find(">", self.pos)
+            self.pos = len(self.code) if end < 0 else end + 1
+            return
+        # attributes
+        while True:
+            self.skip_space()
+            if self.pos >= len(self.code):
+                self.error(f"<{name or ''}> tag opened on line {self.line(start)} is cut off")
+            char = self.code[self.pos]
+            if self.code.startswith("/>", self.pos):
+                self.pos += 2
+                return
+            if char == ">":
+                self.pos += 1
+                break
+            if char in "'\"":
+                self.skip_string(char)
+            elif char == "{":
+                self.pos += 1
+                self.prev = "{"
+                self.scan_js("}")
+            else:
+                self.pos += 1
+        self.scan_children(name, start)
+
+    def skip_space(self):
+        while self.pos < len(self.code) and self.code[self.pos] in " \t\r\n":
+            self.pos += 1
+
+    def scan_children(self, name, start):
+        code = self.code
+        while self.pos < len(code):
+            char = code[self.pos]
+            if char == "{":
+                self.pos += 1
+                self.prev = "{"
+                self.scan_js("}")
+            elif char == "<":
+                if code.startswith("</", self.pos):
+                    end = code.find(">", self.pos)
+                    if end < 0:
+                        break
+                    closing = code[self.pos + 2:end].strip()
+                    if closing != name:
+                        self.error(f"<{name or ''}> opened on line {self.line(start)} is closed by "
+                                   f"</{closing}> on line {self.line()}")
+                    self.pos = end + 1
+                    return
+                self.scan_element()
+            else:
+                match = CHILD_TEXT.search(code, self.pos)
+                self.pos = match.start() if match else len(code)
+        self.error(f"<{name or ''}> opened on line {self.line(start)} is never closed")
+
+
+def validate_jsx(code):
+    return _JSXScanner(code).run()
+
+
+def validate_files(files, imports=None):
+    # Returns (errors, seconds). imports is the import map the sandbox
+    # provides; bare imports outside it are reported.
+    start = time.perf_counter()
+    errors = []
+    for filename, code in files.items():
+        if filename.endswith(".html"):
+            problems = validate_html(code)
+        elif filename.endswith((".tsx", ".jsx", ".js", ".ts")):
+            problems = validate_jsx(code)
+            if imports is not None:
+                _, missing = prune_import_map(code, imports)
+                if missing:
+                    problems.append("Imports modules that are not available: " + ", ".join(missing))
+        else:
+            continue
+        errors.extend(f"{filename}: {problem}" for problem in problems)
+    return errors[:MAX_ERRORS], time.perf_counter() - start